@@ -0,0 +1,219 @@
+"""Command line entry point, installed as `agora` by `pip install -e .`.
+
+    agora migrate
+    agora generate --count 20 --concurrency 5
+    agora batch --count 1000 --output profiles.ndjson
+    agora create --count 3 --mode direct
+    agora enqueue --count 100
+    agora worker --concurrency 5 --stop-when-empty
+    agora stats --rebuild
+    agora startup
+
+`python agora.py ...` from the repository root works the same way.
+
+Heavy modules (LangGraph, the OpenAI client, SQLAlchemy) are only imported by
+the command that needs them, so --help and argument errors return instantly.
+"""
+import argparse
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Imports + LLM client + compiled graphs, without touching the network
+COLD_START_TARGET_SECONDS = float(os.getenv("COLD_START_TARGET_SECONDS", "2.5"))
+
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, got {value}")
+    return number
+
+
+def generate(args):
+    from profile_utils.batch import generate_profiles
+    from profile_utils.multi_profile import profile_pool
+
+    if args.per_call:
+        profile_pool.per_call = args.per_call
+    results = generate_profiles(args.count, concurrency=args.concurrency, bulk=args.bulk)
+    return 0 if all(r["ok"] for r in results) else 1
+
+
+def batch(args):
+    """Headless run that appends every result to an NDJSON file; rerun it to resume."""
+    from profile_utils.multi_profile import profile_pool
+    from profile_utils.runner import run_batch
+
+    if args.per_call:
+        profile_pool.per_call = args.per_call
+    counts = run_batch(args.output, args.count, concurrency=args.concurrency, bulk=args.bulk, quiet=not args.verbose)
+    return 0 if not counts["failed"] else 1
+
+
+def create(args):
+    """Runs create_profile.py (supervisor or direct) `count` times and reports routing calls."""
+    from create_profile import PROFILE_PIPELINE_MODE, generate_profile
+
+    args.mode = args.mode or PROFILE_PIPELINE_MODE
+    counters = [generate_profile(args.mode) for _ in range(args.count)]
+    total = sum(c.total for c in counters)
+    routing = sum(c.routing for c in counters)
+    print(
+        f"---{args.count} PERFILES ({args.mode}): {total / args.count:.1f} llamadas al LLM por perfil, "
+        f"{routing / args.count:.1f} de enrutamiento por perfil (las que ahorra el modo direct)---"
+    )
+    return 0
+
+
+def enqueue(args):
+    from supabase_utils.jobs import JOB_MAX_ATTEMPTS, ensure_jobs_table, enqueue_jobs, job_counts
+
+    ensure_jobs_table()
+    ids = enqueue_jobs(args.count, max_attempts=args.max_attempts or JOB_MAX_ATTEMPTS)
+    print(f"---{len(ids)} JOBS ENCOLADOS ({ids[0]}-{ids[-1]})---" if ids else "---NINGÚN JOB ENCOLADO---")
+    print(job_counts())
+    return 0
+
+
+def worker(args):
+    """Claims generation jobs until stopped; run one per process or machine."""
+    from profile_utils.worker import JOB_LEASE_SECONDS, run_worker
+
+    stats = run_worker(worker_id=args.worker_id, concurrency=args.concurrency,
+                       lease_seconds=args.lease or JOB_LEASE_SECONDS, stop_when_empty=args.stop_when_empty)
+    return 0 if not stats["failed"] else 1
+
+
+def jobs(args):
+    from supabase_utils.jobs import ensure_jobs_table, job_counts
+
+    ensure_jobs_table()
+    print(job_counts())
+    return 0
+
+
+def cache(args):
+    """Shows the LLM response cache, or empties it with --clear."""
+    from llm_utils.cache import get_response_cache
+
+    response_cache = get_response_cache()
+    if args.clear:
+        response_cache.clear()
+    print(response_cache.summary())
+    return 0
+
+
+def stats(args):
+    """Prints the profile_stats summary the analysis step reads; --rebuild recomputes it from agents."""
+    from supabase_utils.profile_stats import ensure_profile_stats_table, profile_stats_summary, rebuild_profile_stats
+
+    if args.rebuild:
+        print(f"---profile_stats RECONSTRUIDA: {rebuild_profile_stats()} perfiles---")
+    else:
+        ensure_profile_stats_table()
+    print(profile_stats_summary() or "profile_stats está vacía")
+    return 0
+
+
+def migrate(args):
+    """Schema changes the pipeline expects; run once per database before generating."""
+    from supabase_utils.agents_table import migrate_fingerprint_column
+    from supabase_utils.profile_stats import ensure_profile_stats_table
+
+    migrate_fingerprint_column()
+    ensure_profile_stats_table()
+    print("---MIGRACIÓN COMPLETADA---")
+    return 0
+
+
+def startup(args):
+    """Times every lazy initialization step of a worker and checks the target."""
+    timings = []
+    start = time.perf_counter()
+
+    def step(name, func):
+        step_start = time.perf_counter()
+        func()
+        timings.append((name, time.perf_counter() - step_start))
+
+    step("import", lambda: __import__("profile_utils.batch"))
+    import test2
+    step("llm", test2.get_llm)
+    step("graphs", lambda: (test2.get_app(), test2.get_app(use_async=True)))
+    total = time.perf_counter() - start
+
+    for name, elapsed in timings:
+        print(f"{name:<10} {elapsed * 1000:>8.1f} ms")
+    print(f"{'total':<10} {total * 1000:>8.1f} ms (objetivo {COLD_START_TARGET_SECONDS * 1000:.0f} ms)")
+    return 0 if total <= COLD_START_TARGET_SECONDS else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="agora", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = commands.add_parser("generate", help="generate and insert profiles")
+    generate_parser.add_argument("--count", "-n", type=positive_int, default=1, help="profiles to generate")
+    generate_parser.add_argument("--concurrency", "-c", type=positive_int, default=5, help="graphs in flight")
+    generate_parser.add_argument("--bulk", action="store_true", help="buffer inserts into multi-row batches")
+    generate_parser.add_argument("--per-call", "-k", type=positive_int, default=None,
+                                 help="profiles per LLM call, defaults to PROFILES_PER_CALL")
+    generate_parser.set_defaults(func=generate)
+
+    batch_parser = commands.add_parser("batch", help="generate profiles into a resumable NDJSON results file")
+    batch_parser.add_argument("--count", "-n", type=positive_int, required=True, help="profiles the run must produce")
+    batch_parser.add_argument("--output", "-o", required=True, help="NDJSON file; rerunning with it skips finished profiles")
+    batch_parser.add_argument("--concurrency", "-c", type=positive_int, default=5, help="graphs in flight")
+    batch_parser.add_argument("--bulk", action="store_true", help="buffer inserts into multi-row batches")
+    batch_parser.add_argument("--per-call", "-k", type=positive_int, default=None,
+                              help="profiles per LLM call, defaults to PROFILES_PER_CALL")
+    batch_parser.add_argument("--verbose", "-v", action="store_true", help="keep the pipeline output on stdout")
+    batch_parser.set_defaults(func=batch)
+
+    create_parser = commands.add_parser("create", help="run the create_profile.py pipeline")
+    create_parser.add_argument("--count", "-n", type=positive_int, default=1, help="profiles to generate")
+    create_parser.add_argument("--mode", choices=["supervisor", "direct"], default=None,
+                               help="defaults to PROFILE_PIPELINE_MODE")
+    create_parser.set_defaults(func=create)
+
+    enqueue_parser = commands.add_parser("enqueue", help="queue profile generation jobs in Postgres")
+    enqueue_parser.add_argument("--count", "-n", type=positive_int, default=1, help="jobs (profiles) to queue")
+    enqueue_parser.add_argument("--max-attempts", type=positive_int, default=None, help="defaults to JOB_MAX_ATTEMPTS")
+    enqueue_parser.set_defaults(func=enqueue)
+
+    worker_parser = commands.add_parser("worker", help="claim and run queued generation jobs")
+    worker_parser.add_argument("--concurrency", "-c", type=positive_int, default=5, help="jobs in flight")
+    worker_parser.add_argument("--lease", type=float, default=None, help="lease seconds, defaults to JOB_LEASE_SECONDS")
+    worker_parser.add_argument("--worker-id", default=None, help="defaults to host-pid-random")
+    worker_parser.add_argument("--stop-when-empty", action="store_true", help="exit once no job is pending")
+    worker_parser.set_defaults(func=worker)
+
+    jobs_parser = commands.add_parser("jobs", help="show generation job counts by status")
+    jobs_parser.set_defaults(func=jobs)
+
+    cache_parser = commands.add_parser("cache", help="LLM response cache (LLM_CACHE_PATH) stats")
+    cache_parser.add_argument("--clear", action="store_true", help="delete every cached response")
+    cache_parser.set_defaults(func=cache)
+
+    stats_parser = commands.add_parser("stats", help="show the incrementally maintained profile_stats table")
+    stats_parser.add_argument("--rebuild", action="store_true", help="recompute it from the whole agents table")
+    stats_parser.set_defaults(func=stats)
+
+    migrate_parser = commands.add_parser("migrate", help="add agents.fingerprint and create profile_stats")
+    migrate_parser.set_defaults(func=migrate)
+
+    startup_parser = commands.add_parser("startup", help="measure cold start against COLD_START_TARGET_SECONDS")
+    startup_parser.set_defaults(func=startup)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+import asyncio
+import itertools
+import json
+import random
+import re
+import time
+from datetime import date, timedelta
+from typing import Any, Iterator, AsyncIterator
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+from pydantic import PrivateAttr
+
+FIRST_NAMES = ["Amara", "Bao", "Carmen", "Dmitri", "Emeka", "Farah", "Goran", "Hana", "Iker", "Jia",
+               "Kofi", "Lucía", "Mateus", "Nadia", "Oskar", "Priya", "Quentin", "Rania", "Sven", "Tala"]
+LAST_NAMES = ["Okafor", "Nguyen", "Ruiz", "Ivanov", "Haddad", "Kowalski", "Tanaka", "Mensah", "Silva",
+              "Larsen", "Khan", "Moreau", "Abebe", "Costa", "Yilmaz", "Park", "Ortega", "Novak", "Ali", "Reyes"]
+CITIES = ["Lagos, Nigeria", "Hanoi, Vietnam", "Valparaíso, Chile", "Tbilisi, Georgia", "Tromsø, Norway",
+          "Oaxaca, Mexico", "Kraków, Poland", "Kigali, Rwanda", "Porto, Portugal", "Busan, South Korea"]
+LANGUAGES = ["English", "Spanish", "Portuguese", "French", "Vietnamese", "Polish", "Korean", "Yoruba",
+             "Georgian", "Norwegian", "Kinyarwanda", "Zapotec"]
+WORDS = ("restores builds studies teaches maps brews records repairs designs curates collects translates "
+         "mentors photographs composes analyzes forages sails archives sketches climbs harvests weaves "
+         "vintage coastal urban rural acoustic botanical nocturnal analog tidal alpine volcanic medieval "
+         "radios bicycles ferments manuscripts lichens synthesizers lighthouses textiles dialects orchards "
+         "glaciers kites ceramics murals beehives typewriters observatories canals folk tales fossils").split()
+
+# Marker of the AGENT_CHECK_DB prompt
+_ANALYSIS_MARKER = "social network analyst"
+# CREATE_PROFILES_USER_PROMPT asks for several profiles at once
+_COUNT_RE = re.compile(r"JSON array of exactly (\d+)")
+
+_ANALYSIS = (
+    "**A. Comprehensive Profile Analysis & Market Summary**\n"
+    "Most profiles are 25-35 year old software professionals in large Western cities. "
+    "English and Spanish dominate; few profiles list African or Asian languages.\n\n"
+    "**B. Strategic Instructions for Distinctive Profile Creation**\n"
+    "Prefer under-represented regions, crafts and trades, ages above 45 and uncommon language pairs. "
+    "Avoid tech-startup biographies and generic 'passionate traveler' personalities."
+)
+
+
+class FakeChatModel(BaseChatModel):
+    """Deterministic ChatOpenAI stand-in for offline benchmarks.
+
+    Returns the analysis text for AGENT_CHECK_DB prompts and a new valid
+    profile JSON otherwise (an array when several are requested), sleeping
+    `ttft` before the first token and `latency` in total per profile.
+    Profiles have roughly `completion_tokens` tokens. `prefill` adds that many
+    seconds per 1000 input tokens before the first token, so shorter prompts
+    answer sooner as they would with a real model. `noise` is the share of
+    profile answers wrapped in markdown fences or prose, as real models
+    sometimes do; structured output is always clean.
+    """
+
+    model_name: str = "fake-gpt"
+    latency: float = 0.5
+    ttft: float = 0.1
+    completion_tokens: int = 300
+    prefill: float = 0.0
+    noise: float = 0.0
+    seed: int = 0
+    _counter: Any = PrivateAttr(default_factory=itertools.count)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def bind_tools(self, tools, **kwargs):
+        # Never calls tools: the SQL agent answers straight away
+        return self
+
+    def _prefill(self, messages) -> float:
+        return self.prefill * sum(len(str(m.content)) for m in messages) / 4 / 1000
+
+    def _respond(self, messages):
+        """Response text and the seconds it takes to generate."""
+        last = str(messages[-1].content) if messages else ""
+        prefill = self._prefill(messages)
+        if _ANALYSIS_MARKER in last:
+            return _ANALYSIS, prefill + self.latency
+        match = _COUNT_RE.search(last)
+        if match is None:
+            n = next(self._counter)
+            return self._noisy(json.dumps(self._profile(n), ensure_ascii=False), n), prefill + self.latency
+        count = int(match.group(1))
+        first = next(self._counter)
+        profiles = [self._profile(first)] + [self._profile(next(self._counter)) for _ in range(count - 1)]
+        # Only the decoding part grows with the number of profiles
+        text = self._noisy(json.dumps(profiles, ensure_ascii=False), first)
+        return text, prefill + self.ttft + (self.latency - self.ttft) * count
+
+    def _noisy(self, text: str, n: int) -> str:
+        rng = random.Random(self.seed * 7_919 + n)
+        if rng.random() >= self.noise:
+            return text
+        return rng.choice([
+            "```json\n{}\n```",
+            "Here is the profile:\n\n{}",
+            "```\n{}\n```\nLet me know if you need any changes.",
+        ]).format(text)
+
+    def with_structured_output(self, schema, *, include_raw=False, **kwargs):
+        """Parses the answer into the pydantic `schema`, like OpenAI's structured outputs."""
+        clean = self.model_copy(update={"noise": 0.0})
+
+        def parse(message):
+            parsed, error = None, None
+            try:
+                data = json.loads(message.content)
+                if isinstance(data, list):
+                    # AgentProfiles wraps the array in an object
+                    data = {"profiles": data}
+                parsed = schema.model_validate(data)
+            except Exception as e:
+                error = e
+            if include_raw:
+                return {"raw": message, "parsed": parsed, "parsing_error": error}
+            if error is not None:
+                raise error
+            return parsed
+
+        return clean | RunnableLambda(parse)
+
+    def _profile(self, n: int) -> dict:
+        rng = random.Random(self.seed * 1_000_003 + n)
+        birth = date(1950, 1, 1) + timedelta(days=rng.randrange(365 * 55))
+        profile = {
+            "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {n}",
+            "age": (date(2025, 1, 1) - birth).days // 365,
+            "gender": rng.choice(["female", "male", "non-binary"]),
+            "biography": "",
+            "location": rng.choice(CITIES),
+            "language": rng.choice(LANGUAGES),
+            "languages_known": rng.sample(LANGUAGES, 3),
+            "occupation": rng.choice(WORDS) + " specialist",
+            "education": f"Degree in {rng.choice(WORDS)} studies",
+            "date_of_birth": birth.isoformat(),
+            "personality": " ".join(rng.choices(WORDS, k=12)),
+        }
+        # ~4 characters per token, the biography absorbs the rest of the budget
+        remaining = max(10, self.completion_tokens * 4 - len(json.dumps(profile)))
+        words = []
+        while sum(len(w) + 1 for w in words) < remaining:
+            words.append(rng.choice(WORDS))
+        profile["biography"] = " ".join(words)
+        return profile
+
+    def _usage(self, messages, text):
+        prompt_tokens = sum(len(str(m.content)) for m in messages) // 4
+        completion_tokens = len(text) // 4
+        return {
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        text, duration = self._respond(messages)
+        time.sleep(duration)
+        message = AIMessage(content=text, usage_metadata=self._usage(messages, text))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        text, duration = self._respond(messages)
+        await asyncio.sleep(duration)
+        message = AIMessage(content=text, usage_metadata=self._usage(messages, text))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _chunks(self, text):
+        size = max(1, len(text) // max(1, self.completion_tokens))
+        return [text[i:i + size] for i in range(0, len(text), size)]
+
+    def _pauses(self, count, duration):
+        # Sleeping once per token overshoots on coarse timers, so tokens are
+        # released in up to 20 evenly spaced bursts after the first one
+        steps = min(20, count)
+        delay = max(0.0, duration - self.ttft) / steps
+        return [delay if (i + 1) * steps // count != i * steps // count else 0.0 for i in range(count)]
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        text, duration = self._respond(messages)
+        chunks = self._chunks(text)
+        prefill = self._prefill(messages)
+        time.sleep(prefill + self.ttft)
+        for i, (piece, pause) in enumerate(zip(chunks, self._pauses(len(chunks), duration - prefill))):
+            usage = self._usage(messages, text) if i == len(chunks) - 1 else None
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece, usage_metadata=usage))
+            if pause:
+                time.sleep(pause)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        text, duration = self._respond(messages)
+        chunks = self._chunks(text)
+        prefill = self._prefill(messages)
+        await asyncio.sleep(prefill + self.ttft)
+        for i, (piece, pause) in enumerate(zip(chunks, self._pauses(len(chunks), duration - prefill))):
+            usage = self._usage(messages, text) if i == len(chunks) - 1 else None
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece, usage_metadata=usage))
+            if pause:
+                await asyncio.sleep(pause)
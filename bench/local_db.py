@@ -0,0 +1,241 @@
+import json
+import re
+import sqlite3
+import threading
+from datetime import date
+
+import psycopg2.extensions
+from psycopg2 import sql
+
+from supabase_utils.schema import Column
+
+# Mirrors the Supabase agents table after `agora migrate`
+AGENTS_DDL = """
+CREATE TABLE IF NOT EXISTS agents (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    name TEXT NOT NULL,
+    age INTEGER,
+    gender TEXT,
+    biography TEXT,
+    location TEXT,
+    language TEXT,
+    languages_known TEXT,
+    occupation TEXT,
+    education TEXT,
+    date_of_birth TEXT,
+    personality TEXT,
+    fingerprint TEXT
+)
+"""
+
+FINGERPRINT_INDEX_DDL = "CREATE UNIQUE INDEX IF NOT EXISTS agents_fingerprint_key ON agents (fingerprint)"
+
+# Same schema as supabase_utils.profile_stats.STATS_DDL
+PROFILE_STATS_DDL = """
+CREATE TABLE IF NOT EXISTS profile_stats (
+    field TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (field, bucket)
+)
+"""
+
+# information_schema as Postgres would report it for the table above
+AGENTS_COLUMNS = {
+    column.name: column
+    for column in (
+        Column("id", "bigint", "int8", False, True, None),
+        Column("created_at", "timestamp with time zone", "timestamptz", False, True, None),
+        Column("name", "text", "text", False, False, None),
+        Column("age", "integer", "int4", True, False, None),
+        Column("gender", "text", "text", True, False, None),
+        Column("biography", "text", "text", True, False, None),
+        Column("location", "text", "text", True, False, None),
+        Column("language", "text", "text", True, False, None),
+        Column("languages_known", "ARRAY", "_text", True, False, None),
+        Column("occupation", "text", "text", True, False, None),
+        Column("education", "text", "text", True, False, None),
+        Column("date_of_birth", "date", "date", True, False, None),
+        Column("personality", "text", "text", True, False, None),
+        Column("fingerprint", "text", "text", True, False, None),
+    )
+}
+
+# Attached to every connection so supabase_utils.schema reads the columns above
+INFORMATION_SCHEMA_DDL = """
+CREATE TABLE information_schema.columns (
+    table_schema TEXT,
+    table_name TEXT,
+    column_name TEXT,
+    ordinal_position INTEGER,
+    data_type TEXT,
+    udt_name TEXT,
+    is_nullable TEXT,
+    column_default TEXT,
+    is_identity TEXT,
+    is_generated TEXT,
+    character_maximum_length INTEGER
+)
+"""
+
+_REGCLASS_RE = re.compile(r"SELECT to_regclass\('(\w+)'\)")
+
+
+def _adapt(value):
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, date):
+        return value.isoformat()
+    if hasattr(value, "adapted"):
+        # psycopg2.extras.Json
+        return json.dumps(value.adapted, ensure_ascii=False)
+    return value
+
+
+def _quote_ident(name, scope, _quote_ident=psycopg2.extensions.quote_ident):
+    # The C version only accepts real psycopg2 connections and cursors
+    if isinstance(scope, (LocalConnection, LocalCursor)):
+        return '"' + name.replace('"', '""') + '"'
+    return _quote_ident(name, scope)
+
+
+class LocalCursor:
+    """psycopg2-style cursor over sqlite3.
+
+    Takes %s placeholders, psycopg2.sql objects and `with`, and supports
+    psycopg2.extras.execute_values: mogrify keeps the values and the next
+    execute binds them as parameters instead of inlining them.
+    """
+
+    def __init__(self, connection, cursor):
+        self.connection = connection
+        self.db = connection.db
+        self._cursor = cursor
+        self._mogrified = []
+
+    def mogrify(self, query, params=()):
+        self._mogrified.extend(params)
+        return query
+
+    def execute(self, query, params=None):
+        self.db.count_round_trip()
+        if isinstance(query, sql.Composable):
+            query = query.as_string(self)
+        elif isinstance(query, bytes):
+            query = query.decode()
+        if params is None:
+            params, self._mogrified = self._mogrified, []
+        regclass = _REGCLASS_RE.fullmatch(query)
+        if regclass:
+            # Postgres catalog lookup -> sqlite_master, NULL when the relation is missing
+            query, params = "SELECT (SELECT name FROM sqlite_master WHERE name = %s)", regclass.groups()
+        self._cursor.execute(query.replace("%s", "?"), tuple(_adapt(v) for v in params or ()))
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+
+class LocalConnection:
+    """What get_db_connection returns: a pooled psycopg2 connection look-alike."""
+
+    encoding = "UTF8"
+
+    def __init__(self, db):
+        self.db = db
+        self._connection = sqlite3.connect(db.path, timeout=30, check_same_thread=False)
+        self._connection.create_function("current_schema", 0, lambda: "public")
+        self._connection.execute("ATTACH DATABASE ':memory:' AS information_schema")
+        self._connection.execute(INFORMATION_SCHEMA_DDL)
+        self._connection.executemany(
+            "INSERT INTO information_schema.columns VALUES ('public', 'agents', ?, ?, ?, ?, ?, ?, 'NO', 'NEVER', ?)",
+            [
+                (c.name, i, c.data_type, c.udt_name, "YES" if c.nullable else "NO",
+                 "default" if c.has_default else None, c.max_length)
+                for i, c in enumerate(AGENTS_COLUMNS.values(), 1)
+            ],
+        )
+
+    def cursor(self):
+        return LocalCursor(self, self._connection.cursor())
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def close(self):
+        self._connection.close()
+
+
+class LocalAgentsDB:
+    """SQLite file standing in for the Supabase agents table.
+
+    Counts every statement sent to it so benchmarks can report DB round trips.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.round_trips = 0
+        self._lock = threading.Lock()
+        connection = sqlite3.connect(path)
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(AGENTS_DDL)
+            connection.execute(FINGERPRINT_INDEX_DDL)
+            connection.execute(PROFILE_STATS_DDL)
+            connection.commit()
+        finally:
+            connection.close()
+
+    def count_round_trip(self):
+        with self._lock:
+            self.round_trips += 1
+
+    def connect(self):
+        return LocalConnection(self)
+
+    def row_count(self):
+        connection = sqlite3.connect(self.path)
+        try:
+            return connection.execute("SELECT count(*) FROM agents").fetchone()[0]
+        finally:
+            connection.close()
+
+    def stats_total(self):
+        """Profiles counted by profile_stats, to check it against row_count()."""
+        connection = sqlite3.connect(self.path)
+        try:
+            row = connection.execute("SELECT count FROM profile_stats WHERE field = '_total'").fetchone()
+            return row[0] if row else 0
+        finally:
+            connection.close()
+
+
+def install_local_backend(db, llm):
+    """Points the pipelines at `db` and `llm` instead of Supabase and OpenAI.
+
+    Goes through supabase_utils.connection.use_backend and
+    llm_utils.clients.set_chat_model, so the insert, bulk-writer, schema,
+    novelty and cache code runs unchanged against SQLite. Must be called
+    before the first profile is generated.
+    """
+    from sqlalchemy import create_engine
+
+    from llm_utils.clients import set_chat_model
+    from supabase_utils.connection import use_backend
+
+    # psycopg2.sql renders identifiers through it; let it quote for LocalCursor
+    psycopg2.extensions.quote_ident = _quote_ident
+    use_backend(db.connect, create_engine(f"sqlite:///{db.path}"))
+    set_chat_model(llm)
@@ -0,0 +1,87 @@
+import asyncio
+import itertools
+import json
+import time
+
+import httpx
+
+
+class _Bucket:
+    def __init__(self, per_minute: float, burst_seconds: float):
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait(self, amount):
+        return max(0.0, (min(amount, self.capacity) - self.level) / self.rate)
+
+
+class StubOpenAI(httpx.AsyncBaseTransport):
+    """In-process OpenAI chat completions endpoint that enforces RPM/TPM like the real API.
+
+    Limits are replenished continuously and only `burst_seconds` worth can be
+    spent at once. Over the limit it answers 429 with retry-after-ms and the
+    x-ratelimit-* headers, so clients are judged on how they react to them.
+    """
+
+    def __init__(self, rpm: int, tpm: int, latency: float = 0.3, completion_tokens: int = 100,
+                 burst_seconds: float = 1.0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.latency = latency
+        self.completion_tokens = completion_tokens
+        self.requests = _Bucket(rpm, burst_seconds)
+        self.tokens = _Bucket(tpm, burst_seconds)
+        self.accepted = 0
+        self.rejected = 0
+        self._ids = itertools.count(1)
+
+    def _headers(self):
+        return {
+            "x-ratelimit-limit-requests": str(self.rpm),
+            "x-ratelimit-remaining-requests": str(int(self.requests.level)),
+            "x-ratelimit-limit-tokens": str(self.tpm),
+            "x-ratelimit-remaining-tokens": str(int(self.tokens.level)),
+        }
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(await request.aread())
+        # Like the API, max_tokens counts against TPM at admission
+        cost = len(json.dumps(body["messages"])) // 4 + (body.get("max_tokens") or self.completion_tokens)
+        now = time.monotonic()
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        wait = max(self.requests.wait(1), self.tokens.wait(cost))
+        if wait > 0:
+            self.rejected += 1
+            return httpx.Response(
+                429,
+                headers={**self._headers(), "retry-after-ms": str(int(wait * 1000) + 1)},
+                json={"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+            )
+        self.requests.level -= 1
+        self.tokens.level -= cost
+        self.accepted += 1
+        headers = self._headers()
+        await asyncio.sleep(self.latency)
+        return httpx.Response(200, headers=headers, json={
+            "id": f"chatcmpl-stub-{next(self._ids)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "ok"},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": cost - self.completion_tokens,
+                "completion_tokens": self.completion_tokens,
+                "total_tokens": cost,
+            },
+        })
@@ -0,0 +1,139 @@
+"""Token counts and offline evaluation of the prompt variants in PROMPT_REGISTRY.
+
+Prints the size of every registered variant, then runs the test2 pipeline
+(through bench.run, each configuration in its own process) once per
+PROMPT_VARIANTS selection and compares it with the v1 prompts: schema
+validity (valid profiles per generation attempt), input tokens and latency.
+
+The fake model answers the same whatever the prompt says, so offline runs
+measure tokens and the prefill part of the latency (--prefill seconds per
+1000 input tokens); run with --live MODEL to measure validity for real.
+
+    python -m bench.prompts --count 20 --concurrency 5 --prefill 0.2
+    python -m bench.prompts --variants create_profile=v2 agent_check_db=v2
+    python -m bench.prompts --live gpt-4.1 --count 5
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from bench.run import RESULTS_DIR, run_isolated
+
+# Prompts the profile pipeline sends; generate_prompts only gets token counts
+PIPELINE_PROMPTS = ("agent_check_db", "create_profile")
+
+
+def token_table(model: str = "gpt-4o") -> list:
+    from llm_utils.tokens import count_tokens
+    from prompts.prompt_agent import PROMPT_REGISTRY
+
+    rows = []
+    for name, variants in PROMPT_REGISTRY.items():
+        original = count_tokens(variants["v1"].text, model)
+        for variant in variants.values():
+            tokens = count_tokens(variant.text, model)
+            rows.append({
+                "prompt": name, "version": variant.version, "tokens": tokens,
+                "saved": 1 - tokens / original if original else 0.0, "description": variant.description,
+            })
+    return rows
+
+
+def default_selections() -> list:
+    """v1 everywhere, each compressed pipeline prompt on its own, then all of them together."""
+    from prompts.prompt_agent import PROMPT_REGISTRY
+
+    single = [f"{name}={version}" for name in PIPELINE_PROMPTS for version in PROMPT_REGISTRY[name] if version != "v1"]
+    return [""] + single + ([",".join(single)] if len(single) > 1 else [])
+
+
+def _stage(run: dict, prefix: str) -> dict:
+    stages = [stats for name, stats in run["stages"].items() if name.startswith(prefix)]
+    return max(stages, key=lambda stats: stats["count"]) if stages else {"p50_ms": 0.0, "p95_ms": 0.0}
+
+
+def evaluate(run: dict) -> dict:
+    profiles = max(1, run["ok"])
+    llm, profile = _stage(run, "llm:"), _stage(run, "profile:")
+    return {
+        "variants": run["params"]["prompt_variants"] or "v1",
+        "validity": run["ok"] / run["attempts"] if run["attempts"] else 0.0,
+        "ok": run["ok"],
+        "prompt_tokens_per_profile": run["prompt_tokens"] / profiles,
+        "llm_p50_ms": llm["p50_ms"],
+        "llm_p95_ms": llm["p95_ms"],
+        "profile_p50_ms": profile["p50_ms"],
+        "profile_p95_ms": profile["p95_ms"],
+        "profiles_per_sec": run["profiles_per_sec"],
+    }
+
+
+def print_report(tokens: list, evaluations: list, estimated: bool):
+    print(f"{'prompt':<18} {'version':<8} {'tokens':>7} {'ahorro':>7}  descripción"
+          f"{'  (tokens estimados, tiktoken no disponible)' if estimated else ''}")
+    for row in tokens:
+        print(f"{row['prompt']:<18} {row['version']:<8} {row['tokens']:>7} {row['saved']:>7.0%}  {row['description']}")
+    if not evaluations:
+        return
+    print()
+    print(f"{'variants':<44} {'válidos':>8} {'in tok/p':>9} {'llm p50':>8} {'llm p95':>8} "
+          f"{'perf p50':>9} {'perf p95':>9} {'prof/s':>7}")
+    base = evaluations[0]
+    for row in evaluations:
+        change = (row["prompt_tokens_per_profile"] / base["prompt_tokens_per_profile"] - 1
+                  if base["prompt_tokens_per_profile"] else 0.0)
+        print(
+            f"{row['variants']:<44} {row['validity']:>8.0%} {row['prompt_tokens_per_profile']:>9.0f} "
+            f"{row['llm_p50_ms']:>8.0f} {row['llm_p95_ms']:>8.0f} {row['profile_p50_ms']:>9.0f} "
+            f"{row['profile_p95_ms']:>9.0f} {row['profiles_per_sec']:>7.2f}"
+            f"{f'  ({change:+.0%} tokens)' if row is not base else ''}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--variants", nargs="*", default=None,
+                        help="PROMPT_VARIANTS values to run after v1; defaults to every compressed variant")
+    parser.add_argument("--count", type=int, default=20, help="profiles per run")
+    parser.add_argument("--concurrency", type=int, default=5, help="graphs in flight")
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per fake LLM call")
+    parser.add_argument("--ttft", type=float, default=0.1, help="seconds to the first streamed token")
+    parser.add_argument("--prefill", type=float, default=0.2, help="fake seconds per 1000 input tokens")
+    parser.add_argument("--tokens", type=int, default=300, help="completion tokens per profile")
+    parser.add_argument("--model", default="gpt-4o", help="tokenizer used for the token counts")
+    parser.add_argument("--live", default=None, metavar="MODEL", help="use this OpenAI model instead of the fake one")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tokens-only", action="store_true", help="only print the token counts")
+    parser.add_argument("--output", default=None, help="where to save the results JSON")
+    args = parser.parse_args(argv)
+
+    from llm_utils.tokens import get_encoding
+
+    tokens = token_table(args.model)
+    evaluations = []
+    if not args.tokens_only:
+        selections = default_selections() if args.variants is None else [""] + args.variants
+        for selection in selections:
+            params = {
+                "count": args.count, "concurrency": args.concurrency, "bulk": False, "streaming": False,
+                "per_call": 1, "latency": args.latency, "ttft": args.ttft, "tokens": args.tokens,
+                "prefill": args.prefill, "seed": args.seed, "prompt_variants": selection, "model": args.live,
+            }
+            print(f"---EVALUANDO PROMPTS {selection or 'v1'}---", file=sys.stderr)
+            evaluations.append(evaluate(run_isolated(params)))
+
+    print_report(tokens, evaluations, estimated=get_encoding(args.model) is None)
+
+    if evaluations:
+        output = args.output or os.path.join(RESULTS_DIR, time.strftime("prompts-%Y%m%d-%H%M%S.json"))
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump({"created_at": time.time(), "tokens": tokens, "evaluations": evaluations}, f, indent=2)
+        print(f"Resultados guardados en {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
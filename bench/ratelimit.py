@@ -0,0 +1,92 @@
+"""Throughput of ChatOpenAI against a rate-limited OpenAI stub, with and without the scheduler.
+
+"sdk" relies on the OpenAI client's own retries (it honors retry-after too);
+"scheduler" sends requests through llm_utils.ratelimit. Both fire the same
+number of concurrent calls at bench.openai_stub.StubOpenAI.
+
+    python -m bench.ratelimit --requests 200 --rpm 600 --tpm 60000 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+from bench.openai_stub import StubOpenAI
+from llm_utils.ratelimit import AsyncRateLimitedTransport, RateLimitScheduler
+
+MODEL = "gpt-4.1"
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(q / 100 * (len(ordered) - 1)))] if ordered else 0.0
+
+
+async def run_mode(mode: str, args) -> dict:
+    from langchain_openai import ChatOpenAI
+
+    stub = StubOpenAI(args.rpm, args.tpm, latency=args.latency, completion_tokens=args.max_tokens)
+    scheduler = None
+    transport = stub
+    if mode == "scheduler":
+        scheduler = RateLimitScheduler(limits={MODEL: (args.rpm, args.tpm)})
+        transport = AsyncRateLimitedTransport(scheduler, stub)
+    llm = ChatOpenAI(
+        model=MODEL,
+        api_key=os.getenv("OPENAI_API_KEY", "offline-benchmark"),
+        base_url="http://stub.local/v1",
+        max_tokens=args.max_tokens,
+        max_retries=args.sdk_retries,
+        http_async_client=httpx.AsyncClient(transport=transport),
+    )
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, failures = [], 0
+
+    async def call(i):
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await llm.ainvoke(f"Perfil {i}: escribe una biografía breve.")
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(call(i) for i in range(args.requests)))
+    elapsed = time.perf_counter() - start
+    result = {
+        "mode": mode,
+        "ok": len(latencies),
+        "failed": failures,
+        "http_429": stub.rejected,
+        "elapsed_s": round(elapsed, 2),
+        "calls_per_min": round(len(latencies) / elapsed * 60, 1),
+        "p95_s": round(_percentile(latencies, 95), 2),
+    }
+    if scheduler is not None:
+        result["final_concurrency"] = scheduler.stats()[MODEL]["concurrency"]
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50, help="calls the application keeps in flight")
+    parser.add_argument("--rpm", type=int, default=600)
+    parser.add_argument("--tpm", type=int, default=60000)
+    parser.add_argument("--latency", type=float, default=0.3, help="stub seconds per accepted call")
+    parser.add_argument("--max-tokens", type=int, default=100)
+    parser.add_argument("--sdk-retries", type=int, default=6, help="OpenAI client max_retries in both modes")
+    parser.add_argument("--mode", choices=["sdk", "scheduler", "both"], default="both")
+    args = parser.parse_args(argv)
+
+    modes = ["sdk", "scheduler"] if args.mode == "both" else [args.mode]
+    for mode in modes:
+        print(asyncio.run(run_mode(mode, args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""Offline throughput benchmark of the profile pipelines.
+
+Runs the real test2 graph (or create_profile.run_direct with --pipeline
+direct), validation, novelty and insert code against a fake chat model and a
+local SQLite agents table, so no OpenAI or Supabase credentials are needed. Each configuration runs in its own process so memory and caches
+do not leak between runs.
+
+    python -m bench.run --counts 20 100 --concurrency 1 5 20 --latency 0.5
+    python -m bench.run --compare bench/results/<older>.json
+    python -m bench.run --noise 0.3 --structured both
+    python -m bench.run --pipeline both --concurrency 5
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import itertools
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+# Metrics where a higher value is better; every other compared metric is a latency
+_HIGHER_IS_BETTER = {"profiles_per_sec"}
+# Latency changes smaller than this are timer noise, whatever the percentage
+_MIN_LATENCY_DELTA_MS = 5.0
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_one(params: dict) -> dict:
+    """Runs one configuration in this process and returns its metrics."""
+    os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+    os.environ["PROFILE_STREAMING"] = "true" if params["streaming"] else "false"
+    os.environ["INSTRUCTIONS_CACHE_PATH"] = ""
+    os.environ["PROMPT_VARIANTS"] = params.get("prompt_variants", "")
+    os.environ["PROFILE_STRUCTURED_OUTPUT"] = params.get("structured") or "off"
+
+    from bench.fake_llm import FakeChatModel
+    from bench.local_db import LocalAgentsDB, install_local_backend
+    from llm_utils.tracing import enable_tracing
+    from profile_utils.batch import agenerate_profiles
+    from profile_utils.multi_profile import profile_pool
+    from profile_utils.structured import parse_stats
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = LocalAgentsDB(os.path.join(tmp, "agents.sqlite3"))
+        if params.get("model"):
+            from llm_utils.clients import get_chat_model
+            llm = get_chat_model(params["model"], temperature=0)
+        else:
+            llm = FakeChatModel(
+                latency=params["latency"],
+                ttft=params["ttft"],
+                completion_tokens=params["tokens"],
+                prefill=params.get("prefill", 0.0),
+                noise=params.get("noise", 0.0),
+                seed=params["seed"],
+            )
+        install_local_backend(db, llm)
+        profile_pool.per_call = params.get("per_call", 1)
+        tracer = enable_tracing(os.path.join(tmp, "trace.jsonl"))
+
+        start = time.perf_counter()
+        # The pipeline is chatty; keep only the benchmark output
+        with contextlib.redirect_stdout(io.StringIO()):
+            if params.get("pipeline") == "direct":
+                results = _run_direct(params["count"], params["concurrency"])
+            else:
+                results = asyncio.run(
+                    agenerate_profiles(params["count"], concurrency=params["concurrency"], bulk=params["bulk"])
+                )
+        elapsed = time.perf_counter() - start
+
+        summary = tracer.summary()
+        if params.get("pipeline") == "direct":
+            # run_direct only returns the final message; every attempt is a create_profile tool call
+            attempts = [row["count"] for row in summary if (row["kind"], row["name"]) == ("tool", "create_profile")]
+            results[0]["attempts"] = sum(attempts)
+        llm_rows = [row for row in summary if row["kind"] == "llm"]
+        stages = {
+            f"{row['kind']}:{row['name']}": {key: row[key] for key in ("count", "p50_ms", "p95_ms", "p99_ms")}
+            for row in summary
+        }
+        return {
+            "params": params,
+            "elapsed": elapsed,
+            "profiles_per_sec": params["count"] / elapsed if elapsed else 0.0,
+            "ok": sum(1 for r in results if r["ok"]),
+            "failed": sum(1 for r in results if not r["ok"]),
+            "attempts": sum(r["attempts"] for r in results),
+            "rows": db.row_count(),
+            "stats_rows": db.stats_total(),
+            "db_round_trips": db.round_trips,
+            "llm_calls": sum(row["count"] for row in llm_rows),
+            "prompt_tokens": int(sum(row.get("prompt_tokens", 0) for row in llm_rows)),
+            "parse": dict(parse_stats),
+            "peak_rss_mb": _peak_rss_mb(),
+            "stages": stages,
+        }
+
+
+def _run_direct(count: int, concurrency: int) -> list:
+    """create_profile.run_direct `count` times on `concurrency` threads."""
+    from create_profile import run_direct
+    from profile_utils.messages import PROFILE_INSERTED_MESSAGE
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        messages = list(executor.map(lambda _: run_direct(), range(count)))
+    return [{"ok": message == PROFILE_INSERTED_MESSAGE, "attempts": 0} for message in messages]
+
+
+def run_isolated(params: dict) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-m", "bench.run", "_one", json.dumps(params)],
+        check=True,
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _key(params: dict) -> str:
+    key = (f"n={params['count']} c={params['concurrency']} bulk={params['bulk']} "
+           f"stream={params['streaming']} k={params.get('per_call', 1)}")
+    if params.get("pipeline"):
+        key += f" {params['pipeline']}"
+    if params.get("noise"):
+        key += f" noise={params['noise']:g}"
+    if params.get("structured"):
+        key += f" so={params['structured']}"
+    return key
+
+
+def compare(current: list, baseline: list, tolerance: float) -> list:
+    """Lists the metrics of `current` that are more than `tolerance` worse than `baseline`."""
+    # Only runs with the exact same parameters are comparable
+    previous = {json.dumps(run["params"], sort_keys=True): run for run in baseline}
+    regressions = []
+    for run in current:
+        old = previous.get(json.dumps(run["params"], sort_keys=True))
+        if old is None:
+            continue
+        metrics = [("profiles_per_sec", run["profiles_per_sec"], old["profiles_per_sec"])]
+        for stage, stats in run["stages"].items():
+            if stage in old["stages"]:
+                metrics.append((f"{stage} p95_ms", stats["p95_ms"], old["stages"][stage]["p95_ms"]))
+        for name, new_value, old_value in metrics:
+            if not old_value:
+                continue
+            if name not in _HIGHER_IS_BETTER and abs(new_value - old_value) < _MIN_LATENCY_DELTA_MS:
+                continue
+            change = (new_value - old_value) / old_value
+            worse = -change if name in _HIGHER_IS_BETTER else change
+            if worse > tolerance:
+                regressions.append(f"{_key(run['params'])}: {name} {old_value:.3f} -> {new_value:.3f} ({change:+.0%})")
+    return regressions
+
+
+def print_report(runs: list):
+    print(f"{'config':<44} {'prof/s':>8} {'ok':>5} {'rows':>5} {'db rt':>6} {'llm/p':>6} {'gen/p':>6} "
+          f"{'in tok/p':>9} {'rss MB':>7}")
+    for run in runs:
+        profiles = max(1, run["ok"])
+        print(
+            f"{_key(run['params']):<44} {run['profiles_per_sec']:>8.2f} {run['ok']:>5} "
+            f"{run['rows']:>5} {run['db_round_trips']:>6} {run.get('llm_calls', 0) / profiles:>6.2f} "
+            f"{run.get('attempts', 0) / profiles:>6.2f} "
+            f"{run.get('prompt_tokens', 0) / profiles:>9.0f} {run['peak_rss_mb']:>7.1f}"
+        )
+        parse = run.get("parse")
+        if parse and any(parse.values()):
+            print(f"    parse: {parse['parsed']} directos, {parse['repaired']} reparados, {parse['failed']} fallidos, "
+                  f"{parse['structured']} estructurados, {parse['structured_failed']} estructurados fallidos")
+        for stage, stats in sorted(run["stages"].items()):
+            print(f"    {stage:<36} n={stats['count']:<5} p50={stats['p50_ms']:.1f}ms "
+                  f"p95={stats['p95_ms']:.1f}ms p99={stats['p99_ms']:.1f}ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--counts", type=int, nargs="+", default=[20], help="profiles per run")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 5], help="graphs in flight")
+    parser.add_argument("--bulk", choices=["on", "off", "both"], default="off", help="BulkProfileWriter inserts")
+    parser.add_argument("--pipeline", choices=["graph", "direct", "both"], default="graph",
+                        help="test2 graph or create_profile.run_direct (threads; --bulk and --per-call do not apply)")
+    parser.add_argument("--streaming", choices=["on", "off", "both"], default="off", help="PROFILE_STREAMING")
+    parser.add_argument("--per-call", type=int, nargs="+", default=[1], help="profiles per LLM call (PROFILES_PER_CALL)")
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per fake LLM call")
+    parser.add_argument("--ttft", type=float, default=0.1, help="seconds to the first streamed token")
+    parser.add_argument("--tokens", type=int, default=300, help="completion tokens per profile")
+    parser.add_argument("--noise", type=float, default=0.0, help="share of fake answers wrapped in fences or prose")
+    parser.add_argument("--structured", choices=["off", "json_schema", "function_calling", "both"], default="off",
+                        help="PROFILE_STRUCTURED_OUTPUT; both runs off and json_schema")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="where to save the results JSON")
+    parser.add_argument("--compare", default=None, help="results JSON of an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before failing")
+    args = parser.parse_args(argv)
+
+    switch = {"on": [True], "off": [False], "both": [False, True]}
+    structured = {"off": [None], "both": [None, "json_schema"]}.get(args.structured, [args.structured])
+    pipelines = {"graph": [None], "direct": ["direct"], "both": [None, "direct"]}[args.pipeline]
+    runs = []
+    for count, concurrency, bulk, streaming, per_call, mode, pipeline in itertools.product(
+        args.counts, args.concurrency, switch[args.bulk], switch[args.streaming], args.per_call, structured, pipelines
+    ):
+        if pipeline and (bulk or per_call > 1):
+            continue
+        params = {
+            "count": count, "concurrency": concurrency, "bulk": bulk, "streaming": streaming, "per_call": per_call,
+            "latency": args.latency, "ttft": args.ttft, "tokens": args.tokens, "seed": args.seed,
+        }
+        # Only set when used, so results stay comparable with older runs
+        if args.noise:
+            params["noise"] = args.noise
+        if mode:
+            params["structured"] = mode
+        if pipeline:
+            params["pipeline"] = pipeline
+        print(f"---BENCHMARK {_key(params)}---", file=sys.stderr)
+        runs.append(run_isolated(params))
+
+    print_report(runs)
+
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S.json"))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"created_at": time.time(), "runs": runs}, f, indent=2)
+    print(f"Resultados guardados en {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["runs"]
+        regressions = compare(runs, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESIÓN {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "_one":
+        print(json.dumps(run_one(json.loads(sys.argv[2]))))
+    else:
+        sys.exit(main())
@@ -1,133 +1,215 @@
-from langchain_openai import ChatOpenAI
+from langchain_core.tools import tool
 from langgraph.prebuilt import create_react_agent
-from langgraph_supervisor import create_supervisor
-from supabase_utils.connection import get_db_connection
-from supabase_utils.db_pool import db as langchain_db
-from prompts.prompt_agent import create_profile_prompt, AGENT_CHECK_DB
+from supabase_utils.agents_table import insert_profile, DuplicateProfileError
+from supabase_utils.db_pool import get_db
+from supabase_utils.profile_stats import profile_stats_summary
+from prompts.prompt_agent import build_create_profile_messages, build_analysis_prompt
+from llm_utils.clients import get_chat_model
+from llm_utils.tracing import LLMCallCounter, get_callbacks, print_summary
+from profile_utils.instructions_cache import instructions_cache
+from profile_utils.validation import parse_profile, ProfileValidationError
+from profile_utils.messages import (
+    DUPLICATE_PROFILE_MESSAGE, INVALID_PROFILE_MESSAGE, MAX_PROFILE_ATTEMPTS, PARSE_ERROR_MESSAGE,
+    PROFILE_INSERTED_MESSAGE, REJECTED_PROFILE_PREFIXES,
+)
+from profile_utils.novelty import check_novelty, record_novelty
+from profile_utils.streaming import stream_profile
+from profile_utils.structured import PROFILE_STRUCTURED_OUTPUT, generate_structured, print_parse_summary
 from dotenv import load_dotenv
-from langchain_core.prompts import ChatPromptTemplate
-import json
+import functools
 import os
 
 load_dotenv()
 
-llm = ChatOpenAI(
-    model="gpt-4o",
-    openai_api_key=os.environ.get("OPENAI_API_KEY"),
-    temperature=0.8
-)
+LLM_MODEL = "gpt-4o"
+
+def get_llm():
+    """Shared ChatOpenAI client, created on first use."""
+    return get_chat_model(LLM_MODEL, temperature=0.8)
+
+# Stream create_profile output and cancel it as soon as it breaks the schema
+PROFILE_STREAMING = os.getenv("PROFILE_STREAMING", "false").lower() in ("1", "true", "yes")
+
+# "supervisor" lets the LLM route the three steps; "direct" calls them in order
+PROFILE_PIPELINE_MODE = os.getenv("PROFILE_PIPELINE_MODE", "supervisor")
 
+def analyze_db():
+    """Runs the SQL ReAct agent over the agents table, starting from the profile_stats summary."""
+    agent_executor = create_react_agent(get_llm(), [get_db().run])
+    initial_input = build_analysis_prompt(profile_stats_summary())
+    response = agent_executor.invoke({"messages": [("user", initial_input)]})
+    return response['messages'][-1].content
+
+@tool
 def get_instructions_from_db():
     """Gets instructions from the database on how to create a distinctive profile."""
     print("---OBTENIENDO INSTRUCCIONES DE LA DB---")
-    agent_executor = create_react_agent(llm, [langchain_db.run])
-    initial_input = AGENT_CHECK_DB
-    response = agent_executor.invoke({"messages": [("user", initial_input)]})
-    instructions = response['messages'][-1].content
+    instructions = instructions_cache.get(analyze_db)
     print(f"Instrucciones generadas")
     return instructions
 
-def create_profile(instructions: str) -> str:
-    """Crea un perfil de usuario en formato JSON según las instrucciones"""
+@tool
+def create_profile(instructions: str, feedback: str = "") -> str:
+    """Crea un perfil de usuario en formato JSON según las instrucciones; `feedback` explica por qué se rechazó el anterior"""
     print("---CREANDO PERFIL---")
-    user_prompt = (
-        "Create a strategically unique and authentic profile as a single JSON object based on the provided schema. "
-        "The JSON keys MUST be in snake_case. "
-        "Ensure the profile is distinctive, culturally coherent, and professionally believable. "
-        "Only output the JSON object itself, with no additional text or markdown. "
-        "Following the comprehensive instructions: " + instructions
-    )
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", create_profile_prompt),
-        ("user", user_prompt)
-    ])
-    response = llm.invoke(prompt.format_messages(last_instruction=instructions))
-    profile_json = response.content
+    # Same messages as test2, so both pipelines share the prompt and its cached prefix
+    messages = build_create_profile_messages(instructions, model=LLM_MODEL, feedback=feedback)
+    if PROFILE_STRUCTURED_OUTPUT:
+        profile_json, error = generate_structured(get_llm(), messages)
+        if error:
+            return f"{INVALID_PROFILE_MESSAGE}: {error}. Vuelve a llamar a 'create_profile'."
+    elif PROFILE_STREAMING:
+        streamed = stream_profile(get_llm(), messages)
+        if streamed["error"]:
+            return f"{INVALID_PROFILE_MESSAGE}: {streamed['error']}. Vuelve a llamar a 'create_profile'."
+        profile_json = streamed["profile"]
+    else:
+        profile_json = get_llm().invoke(messages).content
     print(f"Generated profile: {profile_json}")
     return profile_json
 
+@tool
 def add_profile_db(profile: str):
     """Inserta el perfil en la base de datos usando psycopg2."""
     print("---AÑADIENDO PERFIL A LA DB CON PSYCOPG2---")
     try:
-        profile_data = json.loads(profile)
+        sanitized_data = parse_profile(profile)
+    except ProfileValidationError as e:
+        error_message = f"{INVALID_PROFILE_MESSAGE}: {e}. Corrige el perfil con 'create_profile'."
+        print(error_message)
+        return error_message
     except Exception as e:
-        error_message = f"Error al parsear el perfil JSON: {e}. Perfil recibido: {profile}"
+        error_message = f"{PARSE_ERROR_MESSAGE}: {e}. Perfil recibido: {profile}"
         print(error_message)
         return error_message
 
-    # Sanitize keys from the dictionary to be valid column names
-    # e.g. "Languages Known" -> "languages_known"
-    sanitized_data = {k.lower().replace(" ", "_"): v for k, v in profile_data.items()}
+    rejection = check_novelty(sanitized_data)
+    if rejection:
+        rejection += " Crea un perfil diferente con 'create_profile'."
+        print(rejection)
+        return rejection
 
-    connection = None
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-
-        keys = ', '.join(sanitized_data.keys())
-        placeholders = ', '.join(['%s'] * len(sanitized_data))
-        values = tuple(sanitized_data.values())
-
-        insert_query = f"INSERT INTO agents ({keys}) VALUES ({placeholders})"
-        
-        print(f"Executing query: {insert_query}")
-        print(f"With values: {values}")
-
-        cursor.execute(insert_query, values)
-        connection.commit()
-        
-        message = "Perfil insertado correctamente en la base de datos."
+        print(f"Inserting columns: {', '.join(sanitized_data.keys())}")
+        agent_id = insert_profile(sanitized_data)
+        instructions_cache.record_insert()
+        record_novelty(sanitized_data, agent_id)
+
+        message = PROFILE_INSERTED_MESSAGE
         print(message)
         return message
 
+    except DuplicateProfileError:
+        error_message = (
+            f"{DUPLICATE_PROFILE_MESSAGE}: ya existe un perfil con el mismo nombre, fecha de nacimiento "
+            "y ubicación. Crea un perfil diferente con 'create_profile'."
+        )
+        print(error_message)
+        return error_message
     except Exception as e:
         error_message = f"ERROR EN BASE DE DATOS: {e}"
         print(error_message)
-        if connection:
-            connection.rollback()
         return error_message
-    finally:
-        if connection:
-            cursor.close()
-            connection.close()
-
-add_profile_agent = create_react_agent(
-    name="add_profile_agent",
-    model=llm,
-    prompt=(
-        "You are a specialist in creating high-quality social media profiles. "
-        "Your process is meticulous and follows these exact steps: "
-        "1) FIRST: Use 'get_instructions_from_db' to obtain a detailed analysis of existing profiles and strategic guidelines. "
-        "2) SECOND: With those detailed instructions, use 'create_profile' to generate a unique and authentic profile that stands out from common patterns. "
-        "3) THIRD: Use 'add_profile_db' to insert the validated profile into the database. "
-        "Focus on creating profiles that are distinctive, culturally coherent, and professionally credible. "
-        "Never generate generic profiles or ones filled with common clichés."
-    ),
-    tools=[get_instructions_from_db, create_profile, add_profile_db],
-)
 
-supervisor = create_supervisor(
-    agents=[add_profile_agent],
-    model=llm,
-    prompt=(
-        "You are the supervisor of an advanced social media profile creation system. "
-        "Your goal is to ensure that unique, authentic, and strategically differentiated profiles are generated. "
-        "Coordinate the agent to follow the full process: DB analysis → strategic creation → validated insertion. "
-        "Demand exceptional quality in every profile generated."
+@functools.lru_cache(maxsize=None)
+def get_supervisor():
+    """Compiled supervisor graph, built on first use."""
+    # Only needed here; the tools above stay importable without it
+    from langgraph_supervisor import create_supervisor
+
+    add_profile_agent = create_react_agent(
+        name="add_profile_agent",
+        model=get_llm(),
+        prompt=(
+            "You are a specialist in creating high-quality social media profiles. "
+            "Your process is meticulous and follows these exact steps: "
+            "1) FIRST: Use 'get_instructions_from_db' to obtain a detailed analysis of existing profiles and strategic guidelines. "
+            "2) SECOND: With those detailed instructions, use 'create_profile' to generate a unique and authentic profile that stands out from common patterns. "
+            "3) THIRD: Use 'add_profile_db' to insert the validated profile into the database. "
+            "Focus on creating profiles that are distinctive, culturally coherent, and professionally credible. "
+            "Never generate generic profiles or ones filled with common clichés."
+        ),
+        tools=[get_instructions_from_db, create_profile, add_profile_db],
     )
-).compile()
 
-print("Create a high-quality, strategically unique profile that stands out from existing patterns")
-
-create = "Create A Profile"
-
-result = supervisor.invoke({
-    "messages": [{"role": "user", "content": create}]
-})
-
-if "messages" in result:
-    for msg in result["messages"]:
-        role = getattr(msg, "role", type(msg).__name__)
-        content = getattr(msg, "content", str(msg))
-        print(f"🧠 [{role}] {content}")
\ No newline at end of file
+    return create_supervisor(
+        agents=[add_profile_agent],
+        model=get_llm(),
+        prompt=(
+            "You are the supervisor of an advanced social media profile creation system. "
+            "Your goal is to ensure that unique, authentic, and strategically differentiated profiles are generated. "
+            "Coordinate the agent to follow the full process: DB analysis → strategic creation → validated insertion. "
+            "Demand exceptional quality in every profile generated."
+        )
+    ).compile()
+
+def run_supervisor(create: str = "Create A Profile", callbacks=None):
+    """Asks the supervisor for one profile and prints the conversation."""
+    result = get_supervisor().invoke({
+        "messages": [{"role": "user", "content": create}]
+    }, config={"callbacks": get_callbacks() if callbacks is None else callbacks})
+
+    if "messages" in result:
+        for msg in result["messages"]:
+            role = getattr(msg, "role", type(msg).__name__)
+            content = getattr(msg, "content", str(msg))
+            print(f"🧠 [{role}] {content}")
+    return result
+
+def run_direct(callbacks=None):
+    """Runs get_instructions_from_db -> create_profile -> add_profile_db in order.
+
+    Same tools as the supervisor but without routing LLM turns; a rejected
+    profile is regenerated up to MAX_PROFILE_ATTEMPTS times.
+    """
+    config = {"callbacks": get_callbacks() if callbacks is None else callbacks}
+    instructions = get_instructions_from_db.invoke({}, config=config)
+    final_message = ""
+    for attempt in range(MAX_PROFILE_ATTEMPTS):
+        feedback = ""
+        if attempt:
+            print("---PERFIL RECHAZADO, REGENERANDO---")
+            feedback = f"The previous profile was rejected: {final_message}"
+        profile = create_profile.invoke({"instructions": instructions, "feedback": feedback}, config=config)
+        if profile.startswith(REJECTED_PROFILE_PREFIXES):
+            final_message = profile
+        else:
+            final_message = add_profile_db.invoke({"profile": profile}, config=config)
+        if not final_message.startswith(REJECTED_PROFILE_PREFIXES):
+            break
+    print(final_message)
+    return final_message
+
+def generate_profile(mode: str = PROFILE_PIPELINE_MODE):
+    """Creates one profile with the supervisor or the direct pipeline and reports its LLM calls.
+
+    Every routing call the supervisor makes is a call the direct mode saves.
+    """
+    if mode not in ("supervisor", "direct"):
+        raise ValueError(f"unknown pipeline mode {mode!r}")
+    counter = LLMCallCounter()
+    callbacks = get_callbacks() + [counter]
+    if mode == "direct":
+        run_direct(callbacks)
+    else:
+        run_supervisor(callbacks=callbacks)
+
+    print(
+        f"---LLAMADAS AL LLM ({mode}): {counter.total}, {counter.in_tools} en herramientas, "
+        f"{counter.routing} de enrutamiento---"
+    )
+    return counter
+
+def __getattr__(name):
+    # Backwards compatible `from create_profile import supervisor, llm`
+    if name == "supervisor":
+        return get_supervisor()
+    if name == "llm":
+        return get_llm()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+if __name__ == "__main__":
+    print("Create a high-quality, strategically unique profile that stands out from existing patterns")
+    generate_profile()
+    print_summary()
+    print_parse_summary()
@@ -0,0 +1,157 @@
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import warnings
+from typing import Any, Optional
+
+from dotenv import load_dotenv
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core._api import LangChainBetaWarning
+from langchain_core.load import dumps, loads
+
+load_dotenv()
+
+# Opt-in: clients built with get_chat_model(..., cache=True) replay identical calls from disk
+LLM_CACHE = os.getenv("LLM_CACHE", "false").lower() in ("1", "true", "yes")
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.db")
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "256"))
+
+# loads() warns on every hit
+warnings.filterwarnings("ignore", category=LangChainBetaWarning, module=__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used);
+"""
+
+# Fields that change between otherwise identical conversations
+_VOLATILE_FIELDS = ("id", "response_metadata", "usage_metadata")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """The serialized messages without ids and response metadata, in a stable key order."""
+    try:
+        messages = json.loads(prompt)
+    except ValueError:
+        return prompt
+    normalized = []
+    for message in messages if isinstance(messages, list) else [messages]:
+        if isinstance(message, dict) and "kwargs" in message:
+            kwargs = {k: v for k, v in message["kwargs"].items() if k not in _VOLATILE_FIELDS}
+            message = {"type": message.get("id", [""])[-1], "kwargs": kwargs}
+        normalized.append(message)
+    return json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+
+
+def cache_key(prompt: str, llm_string: str) -> str:
+    """sha256 of the model and its parameters (incl. bound tools) plus the normalized messages."""
+    return hashlib.sha256(f"{llm_string}\0{normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+
+
+class SqliteLLMCache(BaseCache):
+    """LangChain response cache in SQLite with size-based LRU eviction.
+
+    Hits return the stored generations without usage metadata, so traces do
+    not count their tokens as spent again.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_mb: float = LLM_CACHE_MAX_MB):
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(SCHEMA)
+        self._bytes = self._connection.execute("SELECT coalesce(sum(size), 0) FROM llm_cache").fetchone()[0]
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = cache_key(prompt, llm_string)
+        with self._lock, self._connection:
+            row = self._connection.execute("SELECT value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._connection.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+        generations = loads(row[0])
+        for generation in generations:
+            message = getattr(generation, "message", None)
+            if message is not None:
+                message.usage_metadata = None
+                message.response_metadata = {**message.response_metadata, "cache_hit": True}
+        return generations
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = cache_key(prompt, llm_string)
+        value = dumps(return_val)
+        size = len(value.encode("utf-8"))
+        now = time.time()
+        with self._lock, self._connection:
+            old = self._connection.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            self._connection.execute(
+                "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?, ?)", (key, value, size, now, now)
+            )
+            self._bytes += size - (old[0] if old else 0)
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Other processes may share the file: recount before deleting
+        self._bytes = self._connection.execute("SELECT coalesce(sum(size), 0) FROM llm_cache").fetchone()[0]
+        # Free down to 90% so a full cache does not evict on every insert
+        excess = self._bytes - int(self.max_bytes * 0.9)
+        if excess <= 0:
+            return
+        stale, freed = [], 0
+        for key, size in self._connection.execute("SELECT key, size FROM llm_cache ORDER BY last_used"):
+            if freed >= excess:
+                break
+            stale.append((key,))
+            freed += size
+        self._connection.executemany("DELETE FROM llm_cache WHERE key = ?", stale)
+        self._bytes -= freed
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM llm_cache")
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._connection.execute("SELECT count(*) FROM llm_cache").fetchone()[0]
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": entries,
+                "mb": self._bytes / (1024 * 1024),
+            }
+
+    def summary(self) -> str:
+        s = self.stats()
+        return (
+            f"---CACHE LLM: {s['hits']} aciertos, {s['misses']} fallos ({s['hit_rate']:.0%}), "
+            f"{s['entries']} respuestas, {s['mb']:.1f}/{self.max_bytes / (1024 * 1024):.0f} MB---"
+        )
+
+
+@functools.lru_cache(maxsize=None)
+def get_response_cache() -> SqliteLLMCache:
+    return SqliteLLMCache()
+
+
+def print_cache_summary():
+    if get_response_cache.cache_info().currsize:
+        print(get_response_cache().summary())
@@ -0,0 +1,61 @@
+import functools
+import os
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Every request goes through llm_utils.ratelimit (RPM/TPM budgets, 429 retries);
+# LLM_RATE_LIMIT=false opts out
+LLM_RATE_LIMIT = os.getenv("LLM_RATE_LIMIT", "true").lower() in ("1", "true", "yes")
+
+
+# Served by get_chat_model for every model when set (offline runs and benchmarks)
+_chat_model = None
+
+
+def set_chat_model(model):
+    """Makes get_chat_model return `model` for every name; None goes back to ChatOpenAI."""
+    global _chat_model
+    _chat_model = model
+
+
+def http_client_kwargs() -> dict:
+    """http_client/http_async_client arguments for OpenAI and ChatOpenAI clients."""
+    if not LLM_RATE_LIMIT:
+        return {}
+    from llm_utils.ratelimit import get_http_clients
+
+    http_client, http_async_client = get_http_clients()
+    return {"http_client": http_client, "http_async_client": http_async_client}
+
+
+def get_chat_model(model: str, temperature: Optional[float] = 0, cache: bool = False):
+    """ChatOpenAI client for `model`, built on first use and shared afterwards.
+
+    langchain_openai is imported here because it dominates import time.
+    temperature=None leaves the API default. cache=True replays identical
+    calls from llm_utils.cache when LLM_CACHE is on; only use it for
+    deterministic call sites.
+    """
+    if _chat_model is not None:
+        return _chat_model
+    return _build_chat_model(model, temperature, cache)
+
+
+@functools.lru_cache(maxsize=None)
+def _build_chat_model(model: str, temperature: Optional[float], cache: bool):
+    from langchain_openai import ChatOpenAI
+
+    from llm_utils.cache import LLM_CACHE, get_response_cache
+
+    return ChatOpenAI(
+        model=model,
+        openai_api_key=os.environ.get("OPENAI_API_KEY"),
+        temperature=temperature,
+        cache=get_response_cache() if cache and LLM_CACHE else False,
+        # Usage chunk at the end of every stream, so streamed calls are costed too
+        stream_usage=True,
+        **http_client_kwargs(),
+    )
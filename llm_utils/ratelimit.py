@@ -0,0 +1,339 @@
+import asyncio
+import functools
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+import httpx
+from dotenv import load_dotenv
+
+from llm_utils.tokens import count_tokens
+from llm_utils.tracing import get_tracer
+
+load_dotenv()
+
+# Requests and tokens per minute budgeted before the first response; no cap
+# by default, the x-ratelimit-* headers of every response set the account's
+# real limits. e.g. LLM_RATE_LIMITS="gpt-4o=5000:800000,gpt-4.1=5000:2000000"
+MODEL_RATE_LIMITS = {}
+for _item in filter(None, os.getenv("LLM_RATE_LIMITS", "").split(",")):
+    _model, _limits = _item.split("=")
+    _rpm, _tpm = _limits.split(":")
+    MODEL_RATE_LIMITS[_model.strip()] = (int(_rpm), int(_tpm))
+
+# In-flight requests per model: starts low, grows by one per window without
+# 429s and halves on every 429 (AIMD)
+LLM_INITIAL_CONCURRENCY = int(os.getenv("LLM_INITIAL_CONCURRENCY", "4"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_RATE_LIMIT_RETRIES = int(os.getenv("LLM_RATE_LIMIT_RETRIES", "6"))
+# Completion tokens reserved when a request sets no max_tokens
+LLM_EXPECTED_COMPLETION_TOKENS = int(os.getenv("LLM_EXPECTED_COMPLETION_TOKENS", "600"))
+
+_COMPLETION_PATHS = ("/chat/completions", "/completions", "/responses")
+_POLL_SECONDS = 0.02
+
+
+class TokenBucket:
+    """`per_minute` units refilled continuously, bursting up to a minute's worth."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self._refill(now)
+        # A request larger than the bucket waits for a full bucket and runs into debt
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing * 60 / self.capacity)
+
+    def take(self, amount: float):
+        self.level -= amount
+
+    def sync(self, limit: Optional[float], remaining: Optional[float], now: float):
+        self._refill(now)
+        if limit:
+            self.capacity = limit
+        if remaining is not None:
+            self.level = min(self.level, remaining)
+
+
+class ModelLimiter:
+    def __init__(self, rpm=None, tpm=None, concurrency=LLM_INITIAL_CONCURRENCY):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.limit = float(concurrency)
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.last_decrease = 0.0
+        self.sent = 0
+        self.throttled = 0
+        self.waited = 0.0
+
+
+def _header_float(headers, name) -> Optional[float]:
+    try:
+        return float(headers[name])
+    except (KeyError, ValueError):
+        return None
+
+
+def _sync_bucket(bucket, headers, kind, now) -> Optional[TokenBucket]:
+    """Applies x-ratelimit-limit-{kind} / x-ratelimit-remaining-{kind}; creates the bucket if needed."""
+    limit = _header_float(headers, f"x-ratelimit-limit-{kind}")
+    if bucket is None:
+        if not limit:
+            return None
+        bucket = TokenBucket(limit)
+    bucket.sync(limit, _header_float(headers, f"x-ratelimit-remaining-{kind}"), now)
+    return bucket
+
+
+def retry_after(headers) -> Optional[float]:
+    """Seconds the server asked to wait, from retry-after-ms or retry-after."""
+    milliseconds = _header_float(headers, "retry-after-ms")
+    if milliseconds is not None:
+        return milliseconds / 1000
+    return _header_float(headers, "retry-after")
+
+
+class RateLimitScheduler:
+    """Admits OpenAI requests under per-model RPM/TPM budgets and an AIMD concurrency limit.
+
+    Tokens are estimated before sending (prompt plus max_tokens). A 429 pauses
+    the model for retry-after, halves its concurrency and is retried, so
+    callers see one slower response instead of an error.
+    """
+
+    def __init__(
+        self,
+        limits: Optional[dict] = None,
+        initial_concurrency: int = LLM_INITIAL_CONCURRENCY,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        max_retries: int = LLM_RATE_LIMIT_RETRIES,
+        expected_completion_tokens: int = LLM_EXPECTED_COMPLETION_TOKENS,
+    ):
+        self.limits = MODEL_RATE_LIMITS if limits is None else limits
+        self.initial_concurrency = initial_concurrency
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.expected_completion_tokens = expected_completion_tokens
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _model(self, model: str) -> ModelLimiter:
+        limiter = self._models.get(model)
+        if limiter is None:
+            # Longest prefix wins, so dated snapshots share their family's budget
+            names = sorted((name for name in self.limits if model.startswith(name)), key=len, reverse=True)
+            rpm, tpm = self.limits[names[0]] if names else (None, None)
+            limiter = self._models[model] = ModelLimiter(rpm, tpm, self.initial_concurrency)
+        return limiter
+
+    def request_cost(self, request: httpx.Request):
+        """(model, estimated tokens) of a completion request, (None, 0) for anything else."""
+        if request.method != "POST" or not request.url.path.endswith(_COMPLETION_PATHS):
+            return None, 0
+        try:
+            body = json.loads(request.content)
+        except (httpx.RequestNotRead, ValueError):
+            return None, 0
+        model = body.get("model")
+        if not model:
+            return None, 0
+        messages = body.get("messages") or body.get("input") or []
+        if isinstance(messages, str):
+            text = messages
+        else:
+            text = " ".join(
+                m.get("content") if isinstance(m.get("content"), str) else json.dumps(m.get("content"))
+                for m in messages if isinstance(m, dict)
+            )
+        if body.get("tools"):
+            text += json.dumps(body["tools"])
+        completion = (body.get("max_completion_tokens") or body.get("max_tokens")
+                      or body.get("max_output_tokens") or self.expected_completion_tokens)
+        return model, count_tokens(text, model) + completion * body.get("n", 1)
+
+    def try_acquire(self, model: str, tokens: int) -> float:
+        """0 when the request may be sent now, otherwise seconds to wait before asking again."""
+        now = time.monotonic()
+        with self._lock:
+            limiter = self._model(model)
+            if now < limiter.blocked_until:
+                return limiter.blocked_until - now
+            if limiter.in_flight >= int(limiter.limit):
+                return _POLL_SECONDS
+            wait = max(
+                limiter.requests.wait_time(1, now) if limiter.requests else 0.0,
+                limiter.tokens.wait_time(tokens, now) if limiter.tokens else 0.0,
+            )
+            if wait > 0:
+                return wait
+            if limiter.requests:
+                limiter.requests.take(1)
+            if limiter.tokens:
+                limiter.tokens.take(tokens)
+            limiter.in_flight += 1
+            limiter.sent += 1
+            return 0.0
+
+    def acquire(self, model: str, tokens: int) -> float:
+        start = time.monotonic()
+        while wait := self.try_acquire(model, tokens):
+            time.sleep(wait)
+        return self._waited(model, time.monotonic() - start)
+
+    async def aacquire(self, model: str, tokens: int) -> float:
+        start = time.monotonic()
+        while wait := self.try_acquire(model, tokens):
+            await asyncio.sleep(wait)
+        return self._waited(model, time.monotonic() - start)
+
+    def _waited(self, model, seconds):
+        with self._lock:
+            self._model(model).waited += seconds
+        return seconds
+
+    def release(self, model: str, sent_at: float, response: Optional[httpx.Response], attempt: int = 0):
+        """Updates the model's budgets from the response; returns the retry delay for a 429, else None."""
+        now = time.monotonic()
+        with self._lock:
+            limiter = self._model(model)
+            limiter.in_flight -= 1
+            if response is None:
+                return None
+            headers = response.headers
+            limiter.requests = _sync_bucket(limiter.requests, headers, "requests", now)
+            limiter.tokens = _sync_bucket(limiter.tokens, headers, "tokens", now)
+
+            if response.status_code != 429:
+                limiter.limit = min(self.max_concurrency, limiter.limit + 1 / limiter.limit)
+                return None
+            limiter.throttled += 1
+            # Out of credit is a 429 too, but waiting will not fix it
+            if b"insufficient_quota" in response.content:
+                return None
+            delay = retry_after(headers) or min(60.0, 2 ** attempt)
+            limiter.blocked_until = max(limiter.blocked_until, now + delay)
+            # Only the first 429 of a burst counts: the rest were sent before the decrease
+            if sent_at > limiter.last_decrease:
+                limiter.limit = max(1.0, limiter.limit / 2)
+                limiter.last_decrease = now
+            return delay
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                model: {"requests": m.sent, "throttled": m.throttled, "waited_s": round(m.waited, 3),
+                        "concurrency": int(m.limit)}
+                for model, m in self._models.items()
+            }
+
+    def summary(self) -> str:
+        return "\n".join(
+            f"---{model}: {s['requests']} solicitudes, {s['throttled']} respuestas 429, "
+            f"{s['waited_s']:.1f}s de espera, concurrencia {s['concurrency']}---"
+            for model, s in self.stats().items()
+        )
+
+
+def _record(model, waited, attempt, status):
+    tracer = get_tracer()
+    if tracer is not None:
+        tracer.record("ratelimit", model, waited, retries=attempt or None, status=status)
+
+
+class RateLimitedTransport(httpx.BaseTransport):
+    """httpx transport that sends completion requests through a RateLimitScheduler."""
+
+    def __init__(self, scheduler: RateLimitScheduler, transport: Optional[httpx.BaseTransport] = None):
+        self.scheduler = scheduler
+        self.transport = transport or httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        model, tokens = self.scheduler.request_cost(request)
+        if model is None:
+            return self.transport.handle_request(request)
+        waited = 0.0
+        for attempt in range(self.scheduler.max_retries + 1):
+            waited += self.scheduler.acquire(model, tokens)
+            sent_at = time.monotonic()
+            try:
+                response = self.transport.handle_request(request)
+            except BaseException:
+                self.scheduler.release(model, sent_at, None)
+                raise
+            if response.status_code == 429:
+                response.read()
+            delay = self.scheduler.release(model, sent_at, response, attempt)
+            if delay is None or attempt == self.scheduler.max_retries:
+                _record(model, waited, attempt, response.status_code)
+                return response
+            response.close()
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncRateLimitedTransport(httpx.AsyncBaseTransport):
+    """Async version of RateLimitedTransport."""
+
+    def __init__(self, scheduler: RateLimitScheduler, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.scheduler = scheduler
+        self.transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        model, tokens = self.scheduler.request_cost(request)
+        if model is None:
+            return await self.transport.handle_async_request(request)
+        waited = 0.0
+        for attempt in range(self.scheduler.max_retries + 1):
+            waited += await self.scheduler.aacquire(model, tokens)
+            sent_at = time.monotonic()
+            try:
+                response = await self.transport.handle_async_request(request)
+            except BaseException:
+                self.scheduler.release(model, sent_at, None)
+                raise
+            if response.status_code == 429:
+                await response.aread()
+            delay = self.scheduler.release(model, sent_at, response, attempt)
+            if delay is None or attempt == self.scheduler.max_retries:
+                _record(model, waited, attempt, response.status_code)
+                return response
+            await response.aclose()
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+@functools.lru_cache(maxsize=None)
+def get_scheduler() -> RateLimitScheduler:
+    """Process-wide scheduler shared by every client from get_http_clients."""
+    return RateLimitScheduler()
+
+
+@functools.lru_cache(maxsize=None)
+def get_http_clients():
+    """(sync, async) httpx clients for OpenAI/ChatOpenAI that go through get_scheduler()."""
+    from openai import DefaultAsyncHttpxClient, DefaultHttpxClient
+
+    scheduler = get_scheduler()
+    return (
+        DefaultHttpxClient(transport=RateLimitedTransport(scheduler)),
+        DefaultAsyncHttpxClient(transport=AsyncRateLimitedTransport(scheduler)),
+    )
+
+
+def print_rate_limit_summary():
+    if get_scheduler.cache_info().currsize:
+        summary = get_scheduler().summary()
+        if summary:
+            print(summary)
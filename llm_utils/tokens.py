@@ -0,0 +1,24 @@
+import functools
+
+import tiktoken
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model: str):
+    """tiktoken encoding of `model`, or None when its tables cannot be loaded."""
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # tiktoken downloads its tables on first use; count approximately when offline
+        print(f"tiktoken no disponible ({e}), se estiman los tokens")
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    encoding = get_encoding(model)
+    if encoding is None:
+        return len(text) // 4
+    return len(encoding.encode(text))
@@ -0,0 +1,370 @@
+import asyncio
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+from langchain_core.callbacks import BaseCallbackHandler
+
+from llm_utils.tokens import count_tokens
+
+load_dotenv()
+
+# Set TRACE_PATH to write a JSONL trace of every node, tool, LLM call and DB operation
+TRACE_PATH = os.getenv("TRACE_PATH")
+
+# USD per 1M tokens (input, output)
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1": (2.00, 8.00),
+}
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def llm_cost(model, prompt_tokens, completion_tokens):
+    for name, (input_price, output_price) in MODEL_PRICES.items():
+        if model and model.startswith(name):
+            return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+    return None
+
+
+class Tracer:
+    """Collects timing records, appends them to a JSONL file and summarizes them."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8") if path else None
+        self._lock = threading.Lock()
+        self._durations = defaultdict(list)
+        self._totals = defaultdict(lambda: defaultdict(float))
+
+    def record(self, kind, name, duration, **attrs):
+        record = {"ts": time.time(), "kind": kind, "name": name, "duration_ms": round(duration * 1000, 3)}
+        record.update({k: v for k, v in attrs.items() if v is not None})
+        key = (kind, name)
+        with self._lock:
+            self._durations[key].append(duration)
+            for field in ("prompt_tokens", "completion_tokens", "cost_usd", "retries", "ttft_ms"):
+                if isinstance(record.get(field), (int, float)):
+                    self._totals[key][field] += record[field]
+            if record.get("error"):
+                self._totals[key]["errors"] += 1
+            if self._file:
+                self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                self._file.flush()
+
+    def summary(self):
+        """p50/p95/p99 wall time and token totals for every (kind, name)."""
+        with self._lock:
+            items = [(key, list(values), dict(self._totals[key])) for key, values in self._durations.items()]
+        rows = []
+        for (kind, name), durations, totals in sorted(items, key=lambda item: -sum(item[1])):
+            rows.append({
+                "kind": kind,
+                "name": name,
+                "count": len(durations),
+                "total_s": sum(durations),
+                "p50_ms": _percentile(durations, 50) * 1000,
+                "p95_ms": _percentile(durations, 95) * 1000,
+                "p99_ms": _percentile(durations, 99) * 1000,
+                **totals,
+            })
+        return rows
+
+    def print_summary(self):
+        rows = self.summary()
+        if not rows:
+            return
+        print("\n=== Resumen de trazas ===")
+        print(f"{'kind':<8} {'name':<32} {'n':>5} {'total s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'in tok':>8} {'out tok':>8} {'USD':>8}")
+        for row in rows:
+            print(
+                f"{row['kind']:<8} {row['name'][:32]:<32} {row['count']:>5} {row['total_s']:>9.2f} "
+                f"{row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f} "
+                f"{int(row.get('prompt_tokens', 0)):>8} {int(row.get('completion_tokens', 0)):>8} "
+                f"{row.get('cost_usd', 0):>8.4f}"
+            )
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """LangChain callbacks that time graph nodes, tool calls and LLM calls."""
+
+    run_inline = True
+
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+        self._runs = {}
+
+    def _start(self, run_id, kind, name, **attrs):
+        self._runs[run_id] = {"kind": kind, "name": name, "start": time.perf_counter(), "retries": 0, **attrs}
+
+    def _end(self, run_id, parent_run_id, error=None, **attrs):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        start = run.pop("start")
+        kind, name = run.pop("kind"), run.pop("name")
+        first_token = run.pop("first_token", None)
+        run.pop("prompt", None)
+        if not run.get("retries"):
+            run.pop("retries")
+        self.tracer.record(
+            kind,
+            name,
+            time.perf_counter() - start,
+            run_id=str(run_id),
+            parent_id=str(parent_run_id) if parent_run_id else None,
+            ttft_ms=round((first_token - start) * 1000, 3) if first_token else None,
+            error=f"{type(error).__name__}: {error}" if error else None,
+            **run,
+            **attrs,
+        )
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, tags=None, metadata=None, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name", "chain")
+        # Only graph nodes and top-level runs; skip LangGraph's internal plumbing
+        if parent_run_id is None:
+            self._start(run_id, "graph", name)
+        elif metadata and metadata.get("langgraph_node") == name:
+            self._start(run_id, "node", name)
+
+    def on_chain_end(self, outputs, *, run_id, parent_run_id=None, **kwargs):
+        self._end(run_id, parent_run_id)
+
+    def on_chain_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        self._end(run_id, parent_run_id, error=error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        self._start(run_id, "tool", kwargs.get("name") or (serialized or {}).get("name", "tool"))
+
+    def on_tool_end(self, output, *, run_id, parent_run_id=None, **kwargs):
+        self._end(run_id, parent_run_id)
+
+    def on_tool_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        self._end(run_id, parent_run_id, error=error)
+
+    def _llm_start(self, serialized, run_id, kwargs, prompt):
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model_name") or params.get("model") or (serialized or {}).get("name", "llm")
+        # Kept to estimate the prompt tokens when the API reports no usage
+        self._start(run_id, "llm", model, prompt=prompt)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        prompt = "\n".join(str(message.content) for batch in messages for message in batch)
+        self._llm_start(serialized, run_id, kwargs, prompt)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        self._llm_start(serialized, run_id, kwargs, "\n".join(prompts))
+
+    def _estimate(self, run, text):
+        return count_tokens(text, run.get("name") or "gpt-4o")
+
+    def on_llm_new_token(self, token, *, run_id, parent_run_id=None, **kwargs):
+        run = self._runs.get(run_id)
+        if run is not None and "first_token" not in run:
+            run["first_token"] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, parent_run_id=None, **kwargs):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = usage.get("prompt_tokens")
+        completion_tokens = usage.get("completion_tokens")
+        if prompt_tokens is None:
+            try:
+                metadata = response.generations[0][0].message.usage_metadata or {}
+                prompt_tokens = metadata.get("input_tokens")
+                completion_tokens = metadata.get("output_tokens")
+            except (AttributeError, IndexError):
+                pass
+        run = self._runs.get(run_id, {})
+        estimated = None
+        if prompt_tokens is None and "prompt" in run:
+            # e.g. a stream that ended without its usage chunk
+            prompt_tokens, estimated = self._estimate(run, run["prompt"]), True
+        cost = None
+        if prompt_tokens is not None:
+            cost = llm_cost(run.get("name"), prompt_tokens, completion_tokens or 0)
+        self._end(
+            run_id,
+            parent_run_id,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            cost_usd=cost,
+            tokens_estimated=estimated,
+        )
+
+    def on_llm_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        run = self._runs.get(run_id)
+        if run is None or "prompt" not in run:
+            self._end(run_id, parent_run_id, error=error)
+            return
+        # A stream cancelled early (stream_profile) still paid for its prompt and
+        # the tokens produced so far, but the usage chunk never arrived
+        prompt_tokens = self._estimate(run, run["prompt"])
+        response = kwargs.get("response")
+        partial = "".join(
+            generation.text for generations in (response.generations if response else []) for generation in generations
+        )
+        completion_tokens = self._estimate(run, partial) if partial else 0
+        self._end(
+            run_id,
+            parent_run_id,
+            error=error,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            cost_usd=llm_cost(run.get("name"), prompt_tokens, completion_tokens),
+            tokens_estimated=True,
+        )
+
+    def on_retry(self, retry_state, *, run_id, parent_run_id=None, **kwargs):
+        run = self._runs.get(run_id)
+        if run is not None:
+            run["retries"] += 1
+
+
+class LLMCallCounter(BaseCallbackHandler):
+    """Counts LLM calls, telling routing turns apart from calls made inside tools.
+
+    A call is routing when no tool run is among its ancestors, e.g. a
+    supervisor or ReAct agent deciding which tool to call next.
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        self.total = 0
+        self.in_tools = 0
+        self._parents = {}
+        self._tools = set()
+
+    @property
+    def routing(self):
+        return self.total - self.in_tools
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        self._parents[run_id] = parent_run_id
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        self._parents[run_id] = parent_run_id
+        self._tools.add(run_id)
+
+    def _count(self, parent_run_id):
+        self.total += 1
+        while parent_run_id is not None:
+            if parent_run_id in self._tools:
+                self.in_tools += 1
+                return
+            parent_run_id = self._parents.get(parent_run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        self._count(parent_run_id)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        self._count(parent_run_id)
+
+
+# The TRACE_PATH tracer is created on first use, so importing this module opens no file
+_tracer = None
+_tracer_resolved = False
+_tracer_lock = threading.Lock()
+
+
+def enable_tracing(path=None) -> Tracer:
+    """Turns tracing on; without a path records are only kept for the summary."""
+    global _tracer, _tracer_resolved
+    with _tracer_lock:
+        if _tracer is not None:
+            _tracer.close()
+        _tracer = Tracer(path)
+        _tracer_resolved = True
+    return _tracer
+
+
+def disable_tracing():
+    global _tracer, _tracer_resolved
+    with _tracer_lock:
+        if _tracer is not None:
+            _tracer.close()
+        _tracer = None
+        _tracer_resolved = True
+
+
+def get_tracer():
+    """Active tracer, opening TRACE_PATH on the first call; None when tracing is off."""
+    global _tracer, _tracer_resolved
+    if not _tracer_resolved:
+        with _tracer_lock:
+            if not _tracer_resolved:
+                _tracer = Tracer(TRACE_PATH) if TRACE_PATH else None
+                _tracer_resolved = True
+    return _tracer
+
+
+def get_callbacks():
+    """Callbacks to pass in the config of graph/supervisor invocations; empty when disabled."""
+    tracer = get_tracer()
+    if tracer is None:
+        return []
+    return [TracingCallbackHandler(tracer)]
+
+
+def print_summary():
+    tracer = get_tracer()
+    if tracer is not None:
+        tracer.print_summary()
+
+
+@contextmanager
+def span(kind, name, **attrs):
+    """Times a block of code; costs a single None check when tracing is off."""
+    tracer = get_tracer()
+    if tracer is None:
+        yield attrs
+        return
+    start = time.perf_counter()
+    try:
+        yield attrs
+    except BaseException as e:
+        tracer.record(kind, name, time.perf_counter() - start, error=f"{type(e).__name__}: {e}", **attrs)
+        raise
+    tracer.record(kind, name, time.perf_counter() - start, **attrs)
+
+
+def traced(kind, name=None):
+    """Decorator version of span for sync and async functions."""
+    def decorator(func):
+        span_name = name or func.__name__
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if get_tracer() is None:
+                    return await func(*args, **kwargs)
+                with span(kind, span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if get_tracer() is None:
+                return func(*args, **kwargs)
+            with span(kind, span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+atexit.register(lambda: _tracer and _tracer.close())
@@ -0,0 +1,146 @@
+import asyncio
+import time
+from typing import Callable, Iterable, Optional, TypedDict
+
+from llm_utils.cache import print_cache_summary
+from llm_utils.ratelimit import print_rate_limit_summary
+from llm_utils.tracing import get_callbacks, get_tracer, print_summary
+from profile_utils.multi_profile import print_pool_summary, profile_pool
+from profile_utils.structured import print_parse_summary
+from supabase_utils.agents_table import BulkProfileWriter, BULK_INSERT_BATCH_SIZE
+from test2 import get_app, initial_state, PROFILE_INSERTED_MESSAGE
+
+
+class ProfileResult(TypedDict):
+    index: int
+    ok: bool
+    final_message: str
+    profile: str
+    error: Optional[str]
+    attempts: int
+    elapsed: float
+
+
+async def _run_one(index: int, on_result: Optional[Callable], config: dict):
+    start = time.perf_counter()
+    try:
+        state = await get_app(use_async=True).ainvoke(dict(initial_state), config)
+        final_message = state.get("final_message", "")
+        ok = final_message == PROFILE_INSERTED_MESSAGE
+        result = ProfileResult(
+            index=index,
+            ok=ok,
+            final_message=final_message,
+            profile=state.get("profile", ""),
+            error=None if ok else final_message,
+            attempts=state.get("attempts", 0),
+            elapsed=time.perf_counter() - start,
+        )
+    except Exception as e:
+        # One failed profile must never stop the rest of the batch
+        result = ProfileResult(
+            index=index,
+            ok=False,
+            final_message="",
+            profile="",
+            error=f"{type(e).__name__}: {e}",
+            attempts=0,
+            elapsed=time.perf_counter() - start,
+        )
+
+    tracer = get_tracer()
+    if tracer is not None:
+        tracer.record("profile", "profile", result["elapsed"], index=index, ok=result["ok"],
+                      attempts=result["attempts"], error=result["error"])
+
+    status = "OK" if result["ok"] else f"ERROR ({result['error']})"
+    print(f"---PERFIL {index + 1}: {status} en {result['elapsed']:.1f}s---")
+    if on_result is not None:
+        on_result(result)
+    return result
+
+
+async def arun_profiles(indices: Iterable[int], concurrency: int = 5, on_result: Optional[Callable] = None,
+                        bulk: bool = False, expected: Optional[int] = None) -> dict:
+    """Runs the graph once per index with `concurrency` workers pulling from `indices`.
+
+    Results are handed to on_result as they finish and not kept, so memory
+    does not grow with the number of profiles. `expected` is how many indices
+    there are, when known. Returns the ok/failed counts and the generation
+    attempts they took.
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be >= 1")
+
+    config = {"recursion_limit": 10, "configurable": {}, "callbacks": get_callbacks()}
+    bulk_writer = None
+    if bulk:
+        # A batch never fills beyond the number of graphs in flight
+        bulk_writer = BulkProfileWriter(max_batch_size=min(concurrency, BULK_INSERT_BATCH_SIZE))
+        config["configurable"]["bulk_writer"] = bulk_writer
+
+    counts = {"ok": 0, "failed": 0, "attempts": 0}
+    pending = iter(indices)
+
+    async def worker():
+        # Every worker takes the next index from the same iterator
+        for index in pending:
+            result = await _run_one(index, on_result, config)
+            counts["ok" if result["ok"] else "failed"] += 1
+            counts["attempts"] += result["attempts"]
+
+    # Lets the multi-profile pool generate ahead for the whole batch
+    profile_pool.expect(expected)
+    try:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    finally:
+        profile_pool.expect(None)
+        if bulk_writer is not None:
+            await asyncio.to_thread(bulk_writer.close)
+    return counts
+
+
+def generations_per_profile(counts: dict) -> str:
+    """How many create_profile generations each profile cost; 1.00 means no retries."""
+    retries = counts["attempts"] - counts["ok"] - counts["failed"]
+    return f"{counts['attempts'] / max(1, counts['ok']):.2f} generaciones por perfil ({max(0, retries)} reintentos)"
+
+
+def print_batch_summaries():
+    print_summary()
+    print_rate_limit_summary()
+    print_cache_summary()
+    print_pool_summary()
+    print_parse_summary()
+
+
+async def agenerate_profiles(n: int, concurrency: int = 5, on_result: Optional[Callable] = None,
+                             bulk: bool = False):
+    """Generates n profiles running at most `concurrency` graphs at the same time.
+
+    With bulk=True inserts are buffered and written as multi-row batches.
+    """
+    if n < 0:
+        raise ValueError("n must be >= 0")
+
+    results = [None] * n
+
+    def collect(result):
+        results[result["index"]] = result
+        if on_result is not None:
+            on_result(result)
+
+    start = time.perf_counter()
+    counts = await arun_profiles(range(n), concurrency=concurrency, on_result=collect, bulk=bulk, expected=n)
+    print(
+        f"---LOTE TERMINADO: {counts['ok']}/{n} perfiles insertados, "
+        f"{counts['failed']} fallidos en {time.perf_counter() - start:.1f}s, "
+        f"{generations_per_profile(counts)}---"
+    )
+    print_batch_summaries()
+    return results
+
+
+def generate_profiles(n: int, concurrency: int = 5, on_result: Optional[Callable] = None, bulk: bool = False):
+    """Sync wrapper around agenerate_profiles."""
+    return asyncio.run(agenerate_profiles(n, concurrency=concurrency, on_result=on_result, bulk=bulk))
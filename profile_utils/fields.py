@@ -0,0 +1,46 @@
+import re
+from datetime import date
+
+# Columns of the agents table filled by the model
+PROFILE_FIELDS = (
+    "name",
+    "age",
+    "gender",
+    "biography",
+    "location",
+    "language",
+    "languages_known",
+    "occupation",
+    "education",
+    "date_of_birth",
+    "personality",
+)
+
+_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+def normalize_key(key: str) -> str:
+    # e.g. "Languages Known" -> "languages_known"
+    return key.lower().replace(" ", "_")
+
+
+def check_field(key: str, value):
+    """Cheap shape check of a single generated field; returns an error message or None."""
+    if key not in PROFILE_FIELDS:
+        return f"unknown field '{key}'"
+    if key == "date_of_birth":
+        if not isinstance(value, str) or not _DATE_RE.match(value):
+            return f"date_of_birth must be YYYY-MM-DD, got {value!r}"
+        try:
+            date.fromisoformat(value)
+        except ValueError:
+            return f"date_of_birth is not a valid date: {value!r}"
+    elif key == "age":
+        if isinstance(value, bool) or not isinstance(value, (int, float, str)) or not str(value).strip().isdigit():
+            return f"age must be a whole number, got {value!r}"
+    elif key == "languages_known":
+        if not isinstance(value, list):
+            return f"languages_known must be an array, got {type(value).__name__}"
+    elif not isinstance(value, str) or not value.strip():
+        return f"{key} must be a non-empty string"
+    return None
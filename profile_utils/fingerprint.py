@@ -0,0 +1,49 @@
+import hashlib
+import threading
+import unicodedata
+
+FINGERPRINT_FIELDS = ("name", "date_of_birth", "location")
+
+
+def normalize_text(value) -> str:
+    # "José  Pérez" and "jose perez" must produce the same fingerprint
+    text = unicodedata.normalize("NFKD", "" if value is None else str(value))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(text.casefold().split())
+
+
+def profile_fingerprint(data: dict) -> str:
+    """Stable hash of the casefolded name, date_of_birth and location."""
+    key = "|".join(normalize_text(data.get(field)) for field in FINGERPRINT_FIELDS)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+class FingerprintIndex:
+    """In-memory set of known fingerprints, so duplicates are caught without a DB round trip."""
+
+    def __init__(self, fingerprints=()):
+        self._fingerprints = set(fingerprints)
+        self._lock = threading.Lock()
+
+    def __contains__(self, fingerprint):
+        return fingerprint in self._fingerprints
+
+    def __len__(self):
+        return len(self._fingerprints)
+
+    def claim(self, fingerprint) -> bool:
+        """Reserves a fingerprint; returns False if it is already taken."""
+        with self._lock:
+            if fingerprint in self._fingerprints:
+                return False
+            self._fingerprints.add(fingerprint)
+            return True
+
+    def release(self, fingerprint):
+        """Frees a fingerprint whose insert failed for a reason other than a duplicate."""
+        with self._lock:
+            self._fingerprints.discard(fingerprint)
+
+    def update(self, fingerprints):
+        with self._lock:
+            self._fingerprints.update(fingerprints)
@@ -0,0 +1,186 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Callable, Optional
+
+from dotenv import load_dotenv
+
+from llm_utils.tracing import traced
+from supabase_utils.connection import get_db_connection
+
+load_dotenv()
+
+# max(agents.id): one primary-key index lookup, unlike count(*) which scans the table
+Fingerprint = int
+
+_POLL_SECONDS = 0.05
+
+
+@traced("db")
+def get_agents_fingerprint() -> Optional[Fingerprint]:
+    """Cheap fingerprint of the agents table: its max id."""
+    connection = None
+    try:
+        connection = get_db_connection()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT coalesce(max(id), 0) FROM agents")
+            max_id = cursor.fetchone()[0]
+        return int(max_id)
+    except Exception as e:
+        print(f"No se pudo obtener el fingerprint de agents: {e}")
+        return None
+    finally:
+        if connection:
+            connection.close()
+
+
+class InstructionsCache:
+    """Caches the AGENT_CHECK_DB analysis so a batch can reuse one run.
+
+    An entry stays valid while it is younger than `ttl_seconds` and the max id
+    of agents grew by less than `refresh_every` since it was computed. When the
+    fingerprint cannot be read, inserts recorded in-process are used instead.
+    get and aget share one in-flight guard, so a process runs at most one
+    analysis at a time.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = 3600,
+        refresh_every: int = 50,
+        disk_path: Optional[str] = None,
+        fingerprint: Callable[[], Optional[Fingerprint]] = get_agents_fingerprint,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.refresh_every = refresh_every
+        self.disk_path = disk_path
+        self.fingerprint = fingerprint
+        self._entry = None
+        self._inserts = 0
+        self._lock = threading.Lock()
+        self._compute_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _is_fresh(self, entry, fingerprint: Optional[Fingerprint]) -> bool:
+        if entry is None:
+            return False
+        if time.time() - entry["created_at"] >= self.ttl_seconds:
+            return False
+        cached = entry.get("fingerprint")
+        if fingerprint is None or cached is None:
+            return self._inserts < self.refresh_every
+        if not isinstance(cached, int):
+            # Entry written by an older version, (row count, max id)
+            return False
+        # A lower max id means the newest rows were deleted: recompute
+        if fingerprint < cached:
+            return False
+        return fingerprint - cached < self.refresh_every
+
+    def _load_from_disk(self):
+        if not self.disk_path or not os.path.exists(self.disk_path):
+            return None
+        try:
+            with open(self.disk_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Cache de instrucciones en disco inválida, se ignora: {e}")
+            return None
+
+    def _save_to_disk(self, entry):
+        if not self.disk_path:
+            return
+        # A temp file per writer, so processes sharing the path never mix their writes
+        with tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", dir=os.path.dirname(os.path.abspath(self.disk_path)),
+            prefix=os.path.basename(self.disk_path) + ".", suffix=".tmp", delete=False,
+        ) as f:
+            json.dump(entry, f, ensure_ascii=False)
+        try:
+            os.replace(f.name, self.disk_path)
+        except OSError:
+            os.remove(f.name)
+            raise
+
+    def _lookup(self, fingerprint: Optional[Fingerprint]) -> Optional[str]:
+        if self._is_fresh(self._entry, fingerprint):
+            return self._entry["instructions"]
+        disk_entry = self._load_from_disk()
+        if self._is_fresh(disk_entry, fingerprint):
+            self._entry = disk_entry
+            return disk_entry["instructions"]
+        return None
+
+    def _store(self, instructions: str, fingerprint: Optional[Fingerprint]):
+        self._entry = {
+            "instructions": instructions,
+            "fingerprint": fingerprint,
+            "created_at": time.time(),
+        }
+        self._inserts = 0
+        self._save_to_disk(self._entry)
+
+    def _hit(self, fingerprint: Optional[Fingerprint]) -> Optional[str]:
+        with self._lock:
+            instructions = self._lookup(fingerprint)
+            if instructions is not None:
+                self.hits += 1
+                print("---INSTRUCCIONES DESDE CACHÉ---")
+            return instructions
+
+    def _miss(self, instructions: str, fingerprint: Optional[Fingerprint]) -> str:
+        with self._lock:
+            self.misses += 1
+            self._store(instructions, fingerprint)
+        return instructions
+
+    def get(self, compute: Callable[[], str]) -> str:
+        """Returns cached instructions or runs `compute` to refresh them."""
+        fingerprint = self.fingerprint()
+        instructions = self._hit(fingerprint)
+        if instructions is not None:
+            return instructions
+        with self._compute_lock:
+            # Whoever held the guard may have just stored a fresh entry
+            instructions = self._hit(fingerprint)
+            if instructions is not None:
+                return instructions
+            return self._miss(compute(), fingerprint)
+
+    async def aget(self, acompute: Callable) -> str:
+        """Async version of get; concurrent callers, sync or async, share a single analysis."""
+        fingerprint = await asyncio.to_thread(self.fingerprint)
+        instructions = self._hit(fingerprint)
+        if instructions is not None:
+            return instructions
+        # Polled rather than awaited in a thread, so a cancelled caller never keeps the guard
+        while not self._compute_lock.acquire(blocking=False):
+            await asyncio.sleep(_POLL_SECONDS)
+        try:
+            instructions = self._hit(fingerprint)
+            if instructions is not None:
+                return instructions
+            return self._miss(await acompute(), fingerprint)
+        finally:
+            self._compute_lock.release()
+
+    def record_insert(self, count: int = 1):
+        """Counts inserts done by this process, used when there is no fingerprint."""
+        with self._lock:
+            self._inserts += count
+
+    def invalidate(self):
+        self._entry = None
+        if self.disk_path and os.path.exists(self.disk_path):
+            os.remove(self.disk_path)
+
+
+instructions_cache = InstructionsCache(
+    ttl_seconds=float(os.getenv("INSTRUCTIONS_CACHE_TTL", "3600")),
+    refresh_every=int(os.getenv("INSTRUCTIONS_CACHE_REFRESH_EVERY", "50")),
+    disk_path=os.getenv("INSTRUCTIONS_CACHE_PATH") or None,
+)
@@ -0,0 +1,18 @@
+"""Results the profile tools return; test2 and create_profile route on these prefixes."""
+
+PROFILE_INSERTED_MESSAGE = "Perfil insertado correctamente en la base de datos."
+DUPLICATE_PROFILE_MESSAGE = "PERFIL DUPLICADO"
+INVALID_PROFILE_MESSAGE = "PERFIL INVÁLIDO"
+PARSE_ERROR_MESSAGE = "Error al parsear el perfil JSON"
+SIMILAR_PROFILE_MESSAGE = "PERFIL DEMASIADO SIMILAR"
+
+# Rejections a new generation may fix
+REJECTED_PROFILE_PREFIXES = (
+    DUPLICATE_PROFILE_MESSAGE, SIMILAR_PROFILE_MESSAGE, INVALID_PROFILE_MESSAGE, PARSE_ERROR_MESSAGE,
+)
+MAX_PROFILE_ATTEMPTS = 3
+
+
+def is_rejected(message: str) -> bool:
+    """True when the profile was refused and a new generation may succeed."""
+    return message.startswith(REJECTED_PROFILE_PREFIXES)
@@ -0,0 +1,271 @@
+import asyncio
+import json
+import os
+import threading
+from collections import deque
+from typing import Callable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from profile_utils.fingerprint import normalize_text
+from profile_utils.novelty import NOVELTY_FIELDS, NOVELTY_THRESHOLD, vectorize
+from profile_utils.validation import parse_profile
+
+load_dotenv()
+
+# Profiles requested per create_profile call; 1 keeps the single-object prompt.
+# The system prompt and instructions are sent once per call, so input tokens
+# and requests per profile drop by about this factor. PROFILE_STREAMING only
+# applies to single-profile calls.
+PROFILES_PER_CALL = int(os.getenv("PROFILES_PER_CALL", "1"))
+
+# Fields that must differ between profiles of the same call, on top of the
+# novelty fields (biography, personality)
+DISTINCT_FIELDS = ("name",)
+
+
+def split_profiles(text: str) -> Tuple[list, List[str]]:
+    """Objects of the JSON array the model returned, plus an error for each broken element.
+
+    When the array as a whole does not parse, every top-level object that
+    still decodes is kept.
+    """
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = None
+    if isinstance(data, dict):
+        # The model answered with a single object
+        data = [data]
+    if isinstance(data, list):
+        objects = [item for item in data if isinstance(item, dict)]
+        errors = [
+            f"element {i}: expected a JSON object, got {type(item).__name__}"
+            for i, item in enumerate(data, 1) if not isinstance(item, dict)
+        ]
+        return objects, errors
+
+    decoder = json.JSONDecoder()
+    objects, errors = [], []
+    index = text.find("{")
+    while index != -1:
+        try:
+            item, end = decoder.raw_decode(text, index)
+        except ValueError as e:
+            errors.append(f"element {len(objects) + len(errors) + 1}: {e.msg}")
+            index = text.find("{", index + 1)
+            continue
+        objects.append(item)
+        index = text.find("{", end)
+    if not objects and not errors:
+        errors.append("no JSON object found in the output")
+    return objects, errors
+
+
+def _too_similar(data: dict, accepted: List[dict], threshold: float) -> Optional[str]:
+    for field in DISTINCT_FIELDS:
+        value = normalize_text(data.get(field))
+        if value and any(normalize_text(other.get(field)) == value for other in accepted):
+            return f"same {field} as another profile of the batch"
+    for field in NOVELTY_FIELDS:
+        vectors = vectorize([data.get(field) or ""] + [other.get(field) or "" for other in accepted])
+        similarity = float((vectors[1:] @ vectors[0]).max())
+        if similarity >= threshold:
+            return f"{field} {similarity:.0%} similar to another profile of the batch"
+    return None
+
+
+def validate_batch(objects: list, threshold: float = NOVELTY_THRESHOLD):
+    """Validates each profile on its own and keeps only those that differ from the rest of the batch.
+
+    Returns the accepted profiles as (JSON string, validated data) pairs, so
+    they are not parsed again before the insert, and the invalid and repeated
+    ones as error messages.
+    """
+    accepted, accepted_data, invalid, repeated = [], [], [], []
+    for i, item in enumerate(objects, 1):
+        profile_json = json.dumps(item, ensure_ascii=False)
+        try:
+            data = parse_profile(profile_json)
+        except ValueError as e:
+            invalid.append(f"profile {i}: {e}")
+            continue
+        reason = None
+        if accepted_data:
+            reason = _too_similar(data, accepted_data, threshold)
+        if reason:
+            repeated.append(f"profile {i}: {reason}")
+            continue
+        accepted.append((profile_json, data))
+        accepted_data.append(data)
+    return accepted, invalid, repeated
+
+
+class ProfilePool:
+    """Generates profiles `per_call` at a time and hands them out one per graph run.
+
+    Concurrent callers, threads or coroutines, start only as many calls as
+    needed to cover everyone waiting, or, once a batch announced its size with
+    expect(), one call per waiter until the batch is covered, so fewer calls
+    do not mean fewer parallel generations. No lock is held while the model
+    runs, and batches are validated off the event loop. A call that yields no
+    usable profile gives its error to one waiter, so graph retries stay
+    bounded. Queued profiles are served even after the instructions were
+    refreshed: like the instructions cache, a slightly older analysis is still
+    good enough.
+    """
+
+    def __init__(self, per_call: int = PROFILES_PER_CALL):
+        if per_call < 1:
+            raise ValueError("per_call must be >= 1")
+        self.per_call = per_call
+        self.stats = {"calls": 0, "generated": 0, "invalid": 0, "repeated": 0, "served": 0}
+        self._profiles = deque()
+        self._errors = deque()
+        self._in_flight = 0
+        self._waiting = 0
+        self._expected = None
+        self._lock = threading.Lock()
+        # Sync callers wait here; async ones on `_condition`, with their own counts
+        self._ready = threading.Condition(self._lock)
+        self._threads_in_flight = 0
+        self._threads_waiting = 0
+        self._condition = None
+        self._condition_loop = None
+
+    def _generate(self, instructions: str, generate: Callable[[str, int], str]):
+        """Runs one call and validates its profiles; touches no shared state."""
+        try:
+            text = generate(instructions, self.per_call)
+        except Exception as e:
+            return None, f"{type(e).__name__}: {e}"
+        return self._validate(text), None
+
+    def _validate(self, text: str):
+        # parse_profile reads information_schema on a cold cache: blocking I/O
+        objects, errors = split_profiles(text)
+        accepted, invalid, repeated = validate_batch(objects)
+        print(
+            f"---LOTE DE {self.per_call} PERFILES: {len(accepted)} válidos, "
+            f"{len(invalid) + len(errors)} inválidos, {len(repeated)} repetidos---"
+        )
+        return objects, errors, accepted, invalid, repeated
+
+    def _store(self, batch, error: Optional[str]):
+        """Queues a validated batch (or the call's error); the caller holds the lock or condition."""
+        if batch is None:
+            self._errors.append(error)
+            return
+        objects, errors, accepted, invalid, repeated = batch
+        self.stats["calls"] += 1
+        self.stats["generated"] += len(objects) + len(errors)
+        self.stats["invalid"] += len(invalid) + len(errors)
+        self.stats["repeated"] += len(repeated)
+        if accepted:
+            self._profiles.extend(accepted)
+        else:
+            self._errors.append("; ".join(errors + invalid + repeated) or "empty output")
+
+    def expect(self, count: Optional[int]):
+        """Profiles the current batch still needs; None when unknown."""
+        self._expected = count
+
+    def _should_refill(self, in_flight: int, waiting: int) -> bool:
+        if in_flight == 0:
+            return True
+        if self._expected is None:
+            return in_flight * self.per_call < waiting
+        return in_flight < waiting and in_flight * self.per_call < self._expected
+
+    def _take(self):
+        if self._profiles:
+            self.stats["served"] += 1
+            if self._expected:
+                self._expected -= 1
+            return self._profiles.popleft(), None
+        if self._errors:
+            return None, self._errors.popleft()
+        return None, None
+
+    def get(self, instructions: str, generate: Callable[[str, int], str]):
+        """((profile JSON, validated data), None) or (None, error).
+
+        `generate(instructions, count)` returns the model output.
+        """
+        while True:
+            with self._ready:
+                self._threads_waiting += 1
+                try:
+                    while True:
+                        profile, error = self._take()
+                        if profile is not None or error is not None:
+                            return profile, error
+                        if self._should_refill(self._threads_in_flight, self._threads_waiting):
+                            self._threads_in_flight += 1
+                            break
+                        self._ready.wait()
+                finally:
+                    self._threads_waiting -= 1
+            batch, error = self._generate(instructions, generate)
+            with self._ready:
+                self._threads_in_flight -= 1
+                self._store(batch, error)
+                self._ready.notify_all()
+
+    def _get_condition(self):
+        loop = asyncio.get_running_loop()
+        if self._condition_loop is not loop:
+            # asyncio primitives are bound to a loop and every asyncio.run makes a new one
+            self._condition = asyncio.Condition()
+            self._condition_loop = loop
+            self._in_flight = 0
+            self._waiting = 0
+        return self._condition
+
+    async def _arefill(self, instructions: str, agenerate: Callable):
+        condition = self._get_condition()
+        batch, error = None, None
+        try:
+            text = await agenerate(instructions, self.per_call)
+            batch = await asyncio.to_thread(self._validate, text)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        async with condition:
+            self._in_flight -= 1
+            with self._lock:
+                self._store(batch, error)
+            condition.notify_all()
+
+    async def aget(self, instructions: str, agenerate: Callable):
+        """Async version of get; `agenerate(instructions, count)` is a coroutine function."""
+        condition = self._get_condition()
+        async with condition:
+            self._waiting += 1
+            try:
+                while True:
+                    with self._lock:
+                        profile, error = self._take()
+                    if profile is not None or error is not None:
+                        return profile, error
+                    if self._should_refill(self._in_flight, self._waiting):
+                        self._in_flight += 1
+                        asyncio.get_running_loop().create_task(self._arefill(instructions, agenerate))
+                    await condition.wait()
+            finally:
+                self._waiting -= 1
+
+    def summary(self) -> str:
+        s = self.stats
+        return (
+            f"---POOL DE PERFILES ({self.per_call} por llamada): {s['calls']} llamadas, {s['generated']} generados, "
+            f"{s['served']} entregados, {s['invalid']} inválidos, {s['repeated']} repetidos, "
+            f"{len(self._profiles)} sin usar---"
+        )
+
+
+profile_pool = ProfilePool()
+
+
+def print_pool_summary():
+    if profile_pool.stats["calls"]:
+        print(profile_pool.summary())
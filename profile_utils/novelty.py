@@ -0,0 +1,214 @@
+import functools
+import os
+import threading
+import time
+import zlib
+from typing import Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from llm_utils.tracing import traced
+from profile_utils.fingerprint import normalize_text
+from profile_utils.messages import SIMILAR_PROFILE_MESSAGE
+from supabase_utils.connection import get_db_connection
+
+load_dotenv()
+
+NOVELTY_FIELDS = ("biography", "personality")
+NOVELTY_DIM = int(os.getenv("NOVELTY_DIM", "1024"))
+NOVELTY_THRESHOLD = float(os.getenv("NOVELTY_THRESHOLD", "0.9"))
+NOVELTY_ENABLED = os.getenv("NOVELTY_ENABLED", "true").lower() in ("1", "true", "yes")
+# Seconds between incremental reloads, so profiles inserted by other processes are seen
+NOVELTY_REFRESH_SECONDS = float(os.getenv("NOVELTY_REFRESH_SECONDS", "30"))
+
+
+def _features(text: str):
+    # Word unigrams/bigrams catch reworded sentences, char 4-grams catch small edits
+    text = normalize_text(text)
+    words = text.split()
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    padded = f" {text} "
+    features += [padded[i:i + 4] for i in range(len(padded) - 3)]
+    return features
+
+
+def vectorize(texts, dim: int = NOVELTY_DIM) -> np.ndarray:
+    """Signed feature-hashing vectors, L2 normalized, one row per text."""
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        hashes = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in _features(text)), dtype=np.uint32)
+        if hashes.size:
+            signs = np.where(hashes & 0x80000000, 1.0, -1.0)
+            matrix[row] = np.bincount(hashes % dim, weights=signs, minlength=dim)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class NoveltyIndex:
+    """Hashed n-gram vectors of the biography and personality of every stored profile.
+
+    Similarity against the whole table is one matrix product per field, so a
+    generated profile can be scored before it reaches the DB.
+    """
+
+    def __init__(self, dim: int = NOVELTY_DIM, threshold: float = NOVELTY_THRESHOLD, fields=NOVELTY_FIELDS):
+        self.dim = dim
+        self.threshold = threshold
+        self.fields = tuple(fields)
+        self.last_id = 0
+        self.loaded_at = None
+        self._connection_factory = get_db_connection
+        self._size = 0
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._known_ids = set()
+        self._matrices = {field: np.zeros((0, dim), dtype=np.float32) for field in self.fields}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def _grow(self, needed: int):
+        capacity = len(self._ids)
+        if self._size + needed <= capacity:
+            return
+        new_capacity = max(self._size + needed, capacity * 2, 1024)
+        ids = np.zeros(new_capacity, dtype=np.int64)
+        ids[:self._size] = self._ids[:self._size]
+        self._ids = ids
+        for field in self.fields:
+            matrix = np.zeros((new_capacity, self.dim), dtype=np.float32)
+            matrix[:self._size] = self._matrices[field][:self._size]
+            self._matrices[field] = matrix
+
+    def add_many(self, profiles, ids=None):
+        """Adds profiles (dicts with the novelty fields) to the index."""
+        if ids is not None:
+            # Rows this process inserted itself come back on the next load_from_db
+            keep = [i for i, agent_id in enumerate(ids) if agent_id not in self._known_ids]
+            profiles = [profiles[i] for i in keep]
+            ids = [ids[i] for i in keep]
+        if not profiles:
+            return
+        vectors = {field: vectorize([p.get(field) or "" for p in profiles], self.dim) for field in self.fields}
+        with self._lock:
+            self._grow(len(profiles))
+            end = self._size + len(profiles)
+            self._ids[self._size:end] = ids if ids is not None else 0
+            for field in self.fields:
+                self._matrices[field][self._size:end] = vectors[field]
+            self._size = end
+            if ids is not None:
+                self._known_ids.update(ids)
+
+    def add(self, profile: dict, agent_id: Optional[int] = None):
+        self.add_many([profile], None if agent_id is None else [agent_id])
+
+    def scores(self, profiles):
+        """For each profile returns {field: (max similarity, id of the closest row)}."""
+        results = [{} for _ in profiles]
+        with self._lock:
+            size = self._size
+            ids = self._ids[:size]
+            matrices = {field: self._matrices[field][:size] for field in self.fields}
+        if size == 0:
+            return [{field: (0.0, None) for field in self.fields} for _ in profiles]
+        for field in self.fields:
+            vectors = vectorize([p.get(field) or "" for p in profiles], self.dim)
+            similarities = vectors @ matrices[field].T
+            best = similarities.argmax(axis=1)
+            for i, j in enumerate(best):
+                agent_id = int(ids[j]) or None
+                results[i][field] = (float(similarities[i, j]), agent_id)
+        return results
+
+    def find_similar(self, profile: dict):
+        """Returns (field, similarity, id) for the first field above the threshold, else None."""
+        for field, (similarity, agent_id) in self.scores([profile])[0].items():
+            if similarity >= self.threshold:
+                return field, similarity, agent_id
+        return None
+
+    @traced("db", "novelty_load")
+    def load_from_db(self, connection_factory=None, page_size: int = 5000):
+        """Loads rows with id > last_id, so calling it again only reads new profiles.
+
+        The connection factory is remembered for later refresh() calls.
+        """
+        if connection_factory is not None:
+            self._connection_factory = connection_factory
+        connection = self._connection_factory()
+        try:
+            with connection.cursor() as cursor:
+                while True:
+                    cursor.execute(
+                        "SELECT id, biography, personality FROM agents WHERE id > %s ORDER BY id LIMIT %s",
+                        (self.last_id, page_size),
+                    )
+                    rows = cursor.fetchall()
+                    if not rows:
+                        break
+                    self.add_many(
+                        [{"biography": bio, "personality": personality} for _, bio, personality in rows],
+                        ids=[row[0] for row in rows],
+                    )
+                    self.last_id = rows[-1][0]
+                    if len(rows) < page_size:
+                        break
+            self.loaded_at = time.monotonic()
+        finally:
+            connection.close()
+
+    def refresh(self, max_age: float = NOVELTY_REFRESH_SECONDS):
+        """Incremental load_from_db when the last one is older than `max_age` seconds."""
+        if self.loaded_at is not None and time.monotonic() - self.loaded_at < max_age:
+            return
+        # One thread reloads; the others score against the rows already loaded
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            if self.loaded_at is None or time.monotonic() - self.loaded_at >= max_age:
+                self.load_from_db()
+        except Exception as e:
+            # Keep scoring against the stale index and retry after max_age
+            self.loaded_at = time.monotonic()
+            print(f"---NO SE PUDO ACTUALIZAR EL ÍNDICE DE NOVEDAD: {e}---")
+        finally:
+            self._refresh_lock.release()
+
+
+@functools.lru_cache(maxsize=None)
+def get_novelty_index():
+    """Process-wide NoveltyIndex, loaded from the agents table on first use.
+
+    check_novelty refreshes it every NOVELTY_REFRESH_SECONDS.
+    """
+    index = NoveltyIndex()
+    index.load_from_db()
+    print(f"---{len(index)} PERFILES EN EL ÍNDICE DE NOVEDAD---")
+    return index
+
+
+@traced("check")
+def check_novelty(profile: dict) -> Optional[str]:
+    """Rejection message if the profile is too close to a stored one, else None."""
+    if not NOVELTY_ENABLED:
+        return None
+    index = get_novelty_index()
+    index.refresh()
+    similar = index.find_similar(profile)
+    if similar is None:
+        return None
+    field, similarity, agent_id = similar
+    return (
+        f"{SIMILAR_PROFILE_MESSAGE}: el campo {field} se parece en un {similarity:.0%} "
+        f"al del perfil {agent_id} ya existente."
+    )
+
+
+def record_novelty(profile: dict, agent_id: Optional[int] = None):
+    """Adds a freshly inserted profile to the index."""
+    if NOVELTY_ENABLED:
+        get_novelty_index().add(profile, agent_id)
@@ -0,0 +1,121 @@
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+
+from profile_utils.batch import ProfileResult, arun_profiles, generations_per_profile, print_batch_summaries
+
+
+class ResultsLog:
+    """Append-only NDJSON file with one line per finished profile; it is also the checkpoint.
+
+    Every line is flushed and fsynced before the next profile is recorded, so
+    a crash loses at most the profiles that were still in flight. A line cut
+    short by the crash is ignored when the file is read back.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def completed(self, count: int) -> bytearray:
+        """completed[i] is 1 when profile i already has an "ok" line."""
+        done = bytearray(count)
+        if not os.path.exists(self.path):
+            return done
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                index = record.get("index")
+                if record.get("status") == "ok" and isinstance(index, int) and 0 <= index < count:
+                    done[index] = 1
+        return done
+
+    def open(self):
+        f = open(self.path, "a+b")
+        f.seek(0, os.SEEK_END)
+        if f.tell():
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                # Terminate the partial line of an interrupted run
+                f.write(b"\n")
+        return f
+
+    @staticmethod
+    def record(result: ProfileResult) -> dict:
+        try:
+            profile = json.loads(result["profile"]) if result["profile"] else None
+        except ValueError:
+            profile = result["profile"]
+        return {
+            "index": result["index"],
+            "status": "ok" if result["ok"] else "failed",
+            "profile": profile,
+            "error": result["error"],
+            "attempts": result["attempts"],
+            "elapsed": round(result["elapsed"], 3),
+            "finished_at": time.time(),
+        }
+
+    @staticmethod
+    def write(f, record: dict):
+        f.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _pending(done: bytearray):
+    for index, finished in enumerate(done):
+        if not finished:
+            yield index
+
+
+async def arun_batch(path: str, n: int, concurrency: int = 5, bulk: bool = False, quiet: bool = True) -> dict:
+    """Generates profiles 0..n-1 and appends each result to the NDJSON file at `path`.
+
+    Running it again with the same path skips the profiles that already
+    succeeded and retries only the failed or unfinished ones. With quiet=True
+    the pipeline output is discarded and one progress line per profile goes
+    to stderr.
+    """
+    if n < 0:
+        raise ValueError("n must be >= 0")
+    log = ResultsLog(path)
+    done = log.completed(n)
+    remaining = n - sum(done)
+    print(f"---LOTE {path}: {n - remaining}/{n} ya completados, {remaining} pendientes---", file=sys.stderr)
+
+    start = time.perf_counter()
+    finished = 0
+
+    with log.open() as f:
+        def on_result(result: ProfileResult):
+            nonlocal finished
+            finished += 1
+            log.write(f, log.record(result))
+            if quiet:
+                status = "OK" if result["ok"] else f"ERROR ({result['error']})"
+                print(f"---[{finished}/{remaining}] PERFIL {result['index'] + 1}: {status} "
+                      f"en {result['elapsed']:.1f}s---", file=sys.stderr)
+
+        output = open(os.devnull, "w") if quiet else contextlib.nullcontext(sys.stdout)
+        with output as stdout, contextlib.redirect_stdout(stdout):
+            counts = await arun_profiles(_pending(done), concurrency=concurrency, on_result=on_result,
+                                         bulk=bulk, expected=remaining)
+
+    print(
+        f"---LOTE TERMINADO: {counts['ok']}/{remaining} perfiles insertados, {counts['failed']} fallidos "
+        f"en {time.perf_counter() - start:.1f}s ({n - remaining + counts['ok']}/{n} en total), "
+        f"{generations_per_profile(counts)}---"
+    )
+    print_batch_summaries()
+    return counts
+
+
+def run_batch(path: str, n: int, concurrency: int = 5, bulk: bool = False, quiet: bool = True) -> dict:
+    """Sync wrapper around arun_batch."""
+    return asyncio.run(arun_batch(path, n, concurrency=concurrency, bulk=bulk, quiet=quiet))
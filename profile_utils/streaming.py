@@ -0,0 +1,199 @@
+import json
+import time
+from contextlib import aclosing, closing
+from typing import Optional, TypedDict
+
+from profile_utils.fields import PROFILE_FIELDS, check_field, normalize_key
+
+
+class ProfileStreamError(Exception):
+    """The streamed output can no longer become a valid profile."""
+
+
+class ProfileStreamParser:
+    """Incremental parser for the single JSON object create_profile must output.
+
+    Text is fed as it arrives; every field is checked as soon as its value is
+    complete, so a broken generation is detected mid-stream instead of after
+    the whole response and the insert attempt. Markdown fences or prose
+    before the opening brace and anything after the closing brace are
+    skipped, so only the object itself is checked and kept.
+    """
+
+    def __init__(self, fields=PROFILE_FIELDS):
+        self.fields = fields
+        self.profile = {}
+        self.done = False
+        self.text = []
+        self._state = "start"
+        self._key = []
+        self._value = []
+        self._current_key = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, text: str):
+        for char in text:
+            if self.done:
+                return
+            if self._state == "start" and char != "{":
+                continue
+            self.text.append(char)
+            self._feed_char(char)
+
+    def _fail(self, reason):
+        raise ProfileStreamError(reason)
+
+    def _feed_char(self, char):
+        state = self._state
+        if state == "start":
+            self._state = "key_or_end"
+        elif state in ("key_or_end", "key"):
+            if char == '"':
+                self._key = []
+                self._state = "in_key"
+            elif char == "}" and state == "key_or_end":
+                self._finish()
+            elif not char.isspace():
+                self._fail(f"expected a key, got {char!r}")
+        elif state == "in_key":
+            if self._escape:
+                self._escape = False
+                self._key.append(char)
+            elif char == "\\":
+                self._escape = True
+                self._key.append(char)
+            elif char == '"':
+                key = normalize_key(json.loads('"' + "".join(self._key) + '"'))
+                if key not in self.fields:
+                    self._fail(f"unknown field '{key}'")
+                if key in self.profile:
+                    self._fail(f"repeated field '{key}'")
+                self._current_key = key
+                self._state = "colon"
+            else:
+                self._key.append(char)
+        elif state == "colon":
+            if char == ":":
+                self._value = []
+                self._depth = 0
+                self._state = "value"
+            elif not char.isspace():
+                self._fail(f"expected ':', got {char!r}")
+        elif state == "value":
+            self._feed_value_char(char)
+
+    def _feed_value_char(self, char):
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif char == "\\":
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+            self._value.append(char)
+            return
+        if self._depth == 0 and char in ",}":
+            self._end_value()
+            if char == ",":
+                self._state = "key"
+            else:
+                self._finish()
+            return
+        if char == '"':
+            self._in_string = True
+        elif char in "[{":
+            self._depth += 1
+        elif char in "]}":
+            self._depth -= 1
+            if self._depth < 0:
+                self._fail(f"unbalanced {char!r}")
+        self._value.append(char)
+
+    def _end_value(self):
+        raw = "".join(self._value).strip()
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            self._fail(f"invalid value for '{self._current_key}': {raw[:50]!r}")
+        error = check_field(self._current_key, value)
+        if error:
+            self._fail(error)
+        self.profile[self._current_key] = value
+
+    def _finish(self):
+        missing = [f for f in self.fields if f not in self.profile]
+        if missing:
+            self._fail(f"missing fields: {', '.join(missing)}")
+        self.done = True
+        self._state = "done"
+
+
+class StreamedProfile(TypedDict):
+    profile: str
+    error: Optional[str]
+    time_to_first_token: Optional[float]
+    time_to_complete: Optional[float]
+
+
+def _result(parser, start, first_token, error):
+    result = StreamedProfile(
+        profile="".join(parser.text).strip() if error is None else "",
+        error=error,
+        time_to_first_token=None if first_token is None else first_token - start,
+        time_to_complete=time.perf_counter() - start if error is None else None,
+    )
+    if error:
+        print(f"---STREAM CANCELADO: {error}---")
+    else:
+        print(
+            f"---PERFIL EN STREAMING: ttft={result['time_to_first_token']:.2f}s "
+            f"completo={result['time_to_complete']:.2f}s---"
+        )
+    return result
+
+
+def stream_profile(llm, messages) -> StreamedProfile:
+    """Streams a profile from `llm`, cancelling as soon as it breaks the schema."""
+    parser = ProfileStreamParser()
+    first_token, error = None, None
+    start = time.perf_counter()
+    # closing() stops the HTTP stream when we bail out early
+    with closing(iter(llm.stream(messages))) as stream:
+        try:
+            for chunk in stream:
+                if not chunk.content:
+                    continue
+                if first_token is None:
+                    first_token = time.perf_counter()
+                parser.feed(chunk.content)
+                if parser.done:
+                    break
+            if not parser.done:
+                error = "stream ended before the JSON object was complete"
+        except ProfileStreamError as e:
+            error = str(e)
+    return _result(parser, start, first_token, error)
+
+
+async def astream_profile(llm, messages) -> StreamedProfile:
+    """Async version of stream_profile."""
+    parser = ProfileStreamParser()
+    first_token, error = None, None
+    start = time.perf_counter()
+    async with aclosing(aiter(llm.astream(messages))) as stream:
+        try:
+            async for chunk in stream:
+                if not chunk.content:
+                    continue
+                if first_token is None:
+                    first_token = time.perf_counter()
+                parser.feed(chunk.content)
+                if parser.done:
+                    break
+            if not parser.done:
+                error = "stream ended before the JSON object was complete"
+        except ProfileStreamError as e:
+            error = str(e)
+    return _result(parser, start, first_token, error)
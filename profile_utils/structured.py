@@ -0,0 +1,122 @@
+import json
+import os
+import re
+import threading
+from typing import List
+
+from dotenv import load_dotenv
+from pydantic import BaseModel, Field
+
+load_dotenv()
+
+# "json_schema" (OpenAI strict structured outputs) or "function_calling" makes
+# create_profile return schema-shaped JSON instead of relying on the prompt;
+# "off" keeps plain text plus the local repair pass. Takes precedence over
+# PROFILE_STREAMING.
+_MODES = {"json_schema", "function_calling"}
+_OFF = {"", "off", "false", "0", "no"}
+_mode = os.getenv("PROFILE_STRUCTURED_OUTPUT", "off").strip().lower()
+if _mode not in _MODES | _OFF:
+    raise ValueError(f"PROFILE_STRUCTURED_OUTPUT must be one of off, {', '.join(sorted(_MODES))}; got {_mode!r}")
+PROFILE_STRUCTURED_OUTPUT = None if _mode in _OFF else _mode
+
+
+class AgentProfile(BaseModel):
+    """The eleven agents columns create_profile fills (see fields.PROFILE_FIELDS)."""
+
+    name: str = Field(description="Full name matching the cultural background")
+    age: int
+    gender: str
+    biography: str = Field(description="2-3 sentences")
+    location: str = Field(description="City and country/region")
+    language: str = Field(description="Primary language")
+    languages_known: List[str]
+    occupation: str
+    education: str
+    date_of_birth: str = Field(description="YYYY-MM-DD, consistent with age")
+    personality: str
+
+
+class AgentProfiles(BaseModel):
+    """Several profiles in one call (PROFILES_PER_CALL > 1)."""
+
+    profiles: List[AgentProfile]
+
+
+# Outcomes of turning model output into a profile dict, for the batch summaries
+parse_stats = {"parsed": 0, "repaired": 0, "failed": 0, "structured": 0, "structured_failed": 0}
+_parse_stats_lock = threading.Lock()
+
+
+def count_parse(outcome: str):
+    # Graph threads and batch workers parse concurrently
+    with _parse_stats_lock:
+        parse_stats[outcome] += 1
+
+_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+
+
+def repair_json(text: str):
+    """The JSON object in `text` after cheap local fixes, or None.
+
+    Handles markdown fences, prose before or after the object and trailing
+    commas, which is how models usually break "output only JSON".
+    """
+    fence = _FENCE_RE.search(text)
+    body = (fence.group(1) if fence else text).strip().lstrip("\ufeff")
+    start = body.find("{")
+    if start == -1:
+        return None
+    decoder = json.JSONDecoder()
+    for candidate in (body, _TRAILING_COMMA_RE.sub(r"\1", body)):
+        try:
+            return decoder.raw_decode(candidate, candidate.find("{"))[0]
+        except ValueError:
+            continue
+    return None
+
+
+def _structured_model(llm, schema):
+    kwargs = {"method": PROFILE_STRUCTURED_OUTPUT, "include_raw": True}
+    if PROFILE_STRUCTURED_OUTPUT == "json_schema":
+        kwargs["strict"] = True
+    return llm.with_structured_output(schema, **kwargs)
+
+
+def _structured_result(output: dict, many: bool):
+    if output.get("parsing_error") is not None or output.get("parsed") is None:
+        count_parse("structured_failed")
+        return None, f"structured output failed: {output.get('parsing_error') or 'no parsed output'}"
+    count_parse("structured")
+    parsed = output["parsed"]
+    data = [profile.model_dump() for profile in parsed.profiles] if many else parsed.model_dump()
+    return json.dumps(data, ensure_ascii=False), None
+
+
+def generate_structured(llm, messages, many: bool = False):
+    """(profile JSON, None) or (None, error) using the model's native structured output.
+
+    With many=True the JSON is an array, as in multi-profile mode.
+    """
+    output = _structured_model(llm, AgentProfiles if many else AgentProfile).invoke(messages)
+    return _structured_result(output, many)
+
+
+async def agenerate_structured(llm, messages, many: bool = False):
+    output = await _structured_model(llm, AgentProfiles if many else AgentProfile).ainvoke(messages)
+    return _structured_result(output, many)
+
+
+def parse_summary() -> str:
+    with _parse_stats_lock:
+        s = dict(parse_stats)
+    return (
+        f"---PARSEO DE PERFILES: {s['parsed']} directos, {s['repaired']} reparados, {s['failed']} fallidos; "
+        f"salida estructurada: {s['structured']} correctos, {s['structured_failed']} fallidos---"
+    )
+
+
+def print_parse_summary():
+    if any(parse_stats.values()):
+        print(parse_summary())
@@ -0,0 +1,190 @@
+import json
+from datetime import date
+
+from psycopg2.extras import Json
+
+from llm_utils.tracing import traced
+from profile_utils.structured import count_parse, repair_json
+from supabase_utils.agents_table import sanitize_profile
+from supabase_utils.schema import get_agents_columns, refresh_agents_columns
+
+# Filled by the DB or by sanitize_profile, never by the model
+SERVER_COLUMNS = {"id", "created_at", "fingerprint"}
+
+_INTEGER_TYPES = {"smallint", "integer", "bigint"}
+_TEXT_TYPES = {"text", "character varying", "character"}
+
+
+class ProfileValidationError(ValueError):
+    """The profile does not fit the agents table; `errors` lists every problem."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("; ".join(errors))
+
+
+def _to_int(value):
+    if isinstance(value, bool):
+        raise ValueError("expected a whole number, got a boolean")
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.strip().lstrip("-").isdigit():
+        return int(value.strip())
+    raise ValueError(f"expected a whole number, got {value!r}")
+
+
+def _to_text(value):
+    if isinstance(value, (dict, list)):
+        raise ValueError(f"expected a string, got {type(value).__name__}")
+    return str(value).strip()
+
+
+def _to_date(value):
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value).strip())
+    except ValueError:
+        raise ValueError(f"expected a YYYY-MM-DD date, got {value!r}")
+
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    if str(value).strip().lower() in ("true", "yes", "1"):
+        return True
+    if str(value).strip().lower() in ("false", "no", "0"):
+        return False
+    raise ValueError(f"expected true or false, got {value!r}")
+
+
+def _to_text_array(value):
+    if isinstance(value, str):
+        # "Spanish, English" -> ["Spanish", "English"]
+        value = value.split(",")
+    if not isinstance(value, list):
+        raise ValueError(f"expected an array of strings, got {type(value).__name__}")
+    items = []
+    for item in value:
+        if isinstance(item, (dict, list)):
+            raise ValueError(f"expected an array of strings, got an element {json.dumps(item, ensure_ascii=False)}")
+        item = str(item).strip()
+        if item:
+            items.append(item)
+    return items
+
+
+def _to_json(value):
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            pass
+    return Json(value)
+
+
+def _coercer(column):
+    if column.data_type in _INTEGER_TYPES:
+        return _to_int
+    if column.data_type == "date":
+        return _to_date
+    if column.data_type == "boolean":
+        return _to_bool
+    if column.data_type in ("json", "jsonb"):
+        return _to_json
+    if column.data_type == "ARRAY" and column.udt_name in ("_text", "_varchar"):
+        return _to_text_array
+    return _to_text
+
+
+class ProfileValidator:
+    """Checks and coerces a sanitized profile against the agents columns before any DB I/O."""
+
+    def __init__(self, columns):
+        self.columns = columns
+        self._coercers = {name: _coercer(column) for name, column in columns.items()}
+        self.required = [
+            name for name, column in columns.items()
+            if not column.nullable and not column.has_default and name not in SERVER_COLUMNS
+        ]
+
+    def validate(self, data: dict) -> dict:
+        errors = []
+        clean = {}
+        for key, value in data.items():
+            column = self.columns.get(key)
+            if key == "fingerprint":
+                # Always computed by sanitize_profile, never taken from the model
+                clean[key] = value
+                continue
+            if key in SERVER_COLUMNS:
+                errors.append(f"{key}: set by the database, must not be generated")
+                continue
+            if column is None:
+                errors.append(f"{key}: unknown column, allowed columns are {', '.join(self.allowed_columns())}")
+                continue
+            if value is None:
+                if not column.nullable:
+                    errors.append(f"{key}: must not be null")
+                clean[key] = None
+                continue
+            try:
+                value = self._coercers[key](value)
+            except ValueError as e:
+                errors.append(f"{key}: {e}")
+                continue
+            if column.max_length and isinstance(value, str) and len(value) > column.max_length:
+                errors.append(f"{key}: longer than {column.max_length} characters")
+                continue
+            clean[key] = value
+        for key in self.required:
+            if key not in data:
+                errors.append(f"{key}: missing required field")
+        if errors:
+            raise ProfileValidationError(errors)
+        return clean
+
+    def allowed_columns(self):
+        return [name for name in self.columns if name not in SERVER_COLUMNS]
+
+
+_validator = None
+
+
+def get_profile_validator():
+    """Validator compiled once per version of the cached agents columns."""
+    global _validator
+    columns = get_agents_columns()
+    if _validator is None or _validator.columns is not columns:
+        _validator = ProfileValidator(columns)
+    return _validator
+
+
+def refresh_profile_validator():
+    """Re-reads information_schema, e.g. after the agents table changed."""
+    refresh_agents_columns()
+
+
+@traced("check")
+def parse_profile(profile: str) -> dict:
+    """Parses, sanitizes and validates the JSON produced by create_profile.
+
+    Raises ValueError (or ProfileValidationError) with a message precise enough
+    to be sent back to the model.
+    """
+    try:
+        profile_data = json.loads(profile)
+    except ValueError:
+        # Fences or prose around the object: fixing it here saves a generation
+        profile_data = repair_json(profile)
+        if profile_data is None:
+            count_parse("failed")
+            raise
+        count_parse("repaired")
+    else:
+        count_parse("parsed")
+    if not isinstance(profile_data, dict):
+        raise ValueError(f"expected a JSON object, got {type(profile_data).__name__}")
+    return get_profile_validator().validate(sanitize_profile(profile_data))
@@ -0,0 +1,131 @@
+import asyncio
+import os
+import socket
+import time
+import uuid
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from llm_utils.cache import print_cache_summary
+from llm_utils.ratelimit import print_rate_limit_summary
+from llm_utils.tracing import get_callbacks, print_summary
+from profile_utils.multi_profile import print_pool_summary
+from profile_utils.structured import print_parse_summary
+from supabase_utils.jobs import (
+    JOB_LEASE_SECONDS,
+    Job,
+    claim_jobs,
+    complete_job,
+    ensure_jobs_table,
+    fail_expired_jobs,
+    fail_job,
+    heartbeat,
+    next_job_delay,
+)
+from test2 import get_app, initial_state, PROFILE_INSERTED_MESSAGE
+
+load_dotenv()
+
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "2"))
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+async def _run_job(job: Job, worker_id: str, config: dict):
+    start = time.perf_counter()
+    try:
+        state = await get_app(use_async=True).ainvoke(dict(initial_state), config)
+        final_message = state.get("final_message", "")
+        error = None if final_message == PROFILE_INSERTED_MESSAGE else final_message or "sin mensaje final"
+    except Exception as e:
+        final_message, error = "", f"{type(e).__name__}: {e}"
+
+    if error is None:
+        kept = await asyncio.to_thread(complete_job, job.id, worker_id, final_message)
+        status = "OK" if kept else "OK, PERO EL LEASE SE PERDIÓ"
+    else:
+        await asyncio.to_thread(fail_job, job.id, worker_id, error)
+        retry = "reintento pendiente" if job.attempts < job.max_attempts else "sin más intentos"
+        status = f"ERROR ({error}; {retry})"
+    print(f"---JOB {job.id} (intento {job.attempts}): {status} en {time.perf_counter() - start:.1f}s---")
+    return error is None
+
+
+async def _heartbeats(worker_id: str, running: dict, lease_seconds: float, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(heartbeat, worker_id, list(running), lease_seconds)
+        except Exception as e:
+            # The next beat may succeed before the lease runs out
+            print(f"Fallo el heartbeat: {e}")
+
+
+async def arun_worker(
+    worker_id: Optional[str] = None,
+    concurrency: int = 5,
+    lease_seconds: float = JOB_LEASE_SECONDS,
+    poll_interval: float = WORKER_POLL_INTERVAL,
+    stop_when_empty: bool = False,
+):
+    """Claims generation_jobs and runs the test2 graph for each, `concurrency` at a time.
+
+    Leases are renewed every lease_seconds / 3 while a job runs, so only jobs of
+    crashed workers expire and get reclaimed. With stop_when_empty the worker
+    exits once nothing is pending or running for it.
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be >= 1")
+    worker_id = worker_id or default_worker_id()
+    await asyncio.to_thread(ensure_jobs_table)
+    config = {"recursion_limit": 10, "configurable": {}, "callbacks": get_callbacks()}
+    running = {}
+    stats = {"done": 0, "failed": 0}
+    beats = asyncio.create_task(_heartbeats(worker_id, running, lease_seconds, lease_seconds / 3))
+    print(f"---WORKER {worker_id} INICIADO---")
+
+    def finished(job_id, task):
+        running.pop(job_id, None)
+        ok = not task.cancelled() and task.exception() is None and task.result()
+        stats["done" if ok else "failed"] += 1
+
+    try:
+        while True:
+            await asyncio.to_thread(fail_expired_jobs)
+            jobs = await asyncio.to_thread(claim_jobs, worker_id, concurrency - len(running), lease_seconds)
+            for job in jobs:
+                task = asyncio.create_task(_run_job(job, worker_id, config))
+                running[job.id] = task
+                task.add_done_callback(lambda t, job_id=job.id: finished(job_id, t))
+
+            if not running and not jobs:
+                delay = await asyncio.to_thread(next_job_delay)
+                if stop_when_empty and delay is None:
+                    break
+                await asyncio.sleep(poll_interval if delay is None else min(delay, poll_interval))
+            elif len(running) >= concurrency or not jobs:
+                await asyncio.wait(list(running.values()), timeout=poll_interval,
+                                   return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        beats.cancel()
+        if running:
+            # Cancelled jobs keep their lease and are reclaimed once it expires
+            for task in running.values():
+                task.cancel()
+            await asyncio.gather(*running.values(), return_exceptions=True)
+
+    print(f"---WORKER {worker_id} TERMINADO: {stats['done']} hechos, {stats['failed']} fallidos---")
+    print_summary()
+    print_rate_limit_summary()
+    print_cache_summary()
+    print_pool_summary()
+    print_parse_summary()
+    return stats
+
+
+def run_worker(**kwargs):
+    """Sync wrapper around arun_worker."""
+    return asyncio.run(arun_worker(**kwargs))
@@ -1,19 +1,17 @@
-import os
-import openai
+"""Asks the model for a profile-creation prompt using the GENERATE_PROMPTS guide.
+
+Run it from the repository root as a module:
+
+    python -m prompts.generate_prompts
+"""
 from dotenv import load_dotenv
-from openai import OpenAI
 
-from prompt_agent import GENERATE_PROMPTS
+from llm_utils.clients import get_chat_model
+from prompts.prompt_agent import get_prompt
 
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-stream = client.chat.completions.create(
-    model="gpt-4.1",
-    messages=[
-        {"role": "system", "content": GENERATE_PROMPTS},
-        {"role": "user", "content": """
+PROFILE_PROMPT_REQUEST = """
 I need a prompt to create a profile for a social network. I need the agent to create the profile according to another instruction that will tell it how to create it. This is so that duplicate profiles are not created and better profiles are created. It should generate them as a JSON file with the following fields:
 
 name
@@ -27,11 +25,22 @@ occupation
 education
 date_of_birth
 personality
-"""}
-    ],
-    stream=True
-)
-
-for chunk in stream:
-    if chunk.choices[0].delta.content:
-        print(chunk.choices[0].delta.content, end="", flush=True)
+"""
+
+
+def generate_prompt(request: str = PROFILE_PROMPT_REQUEST, model: str = "gpt-4.1") -> str:
+    """Streams a prompt written by the selected GENERATE_PROMPTS variant for `request` and returns it."""
+    # Shared client, so the request goes through the rate limit scheduler
+    llm = get_chat_model(model, temperature=None)
+    messages = [("system", get_prompt("generate_prompts")), ("user", request)]
+
+    parts = []
+    for chunk in llm.stream(messages):
+        if chunk.content:
+            parts.append(chunk.content)
+            print(chunk.content, end="", flush=True)
+    return "".join(parts)
+
+
+if __name__ == "__main__":
+    generate_prompt()
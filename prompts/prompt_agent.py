@@ -1,3 +1,9 @@
+import functools
+import os
+from typing import Dict, NamedTuple, Optional
+
+from llm_utils.tokens import count_tokens, get_encoding
+
 GENERATE_PROMPTS = """
 You Are an AI agent designed to generate prompts for various tasks. Your goal is to create clear, concise, and effective prompts that guide users in completing their tasks successfully.
 You Must follow these guidelines:
@@ -184,9 +190,26 @@ Present your output in two clear, well-structured sections:
 - Ensure all recommendations are ethical, authentic, and sustainable for long-term profile maintenance.
 """
 
+# Appended to AGENT_CHECK_DB when the profile_stats table has data
+PROFILE_STATS_PROMPT = """
+### PRE-AGGREGATED STATISTICS ###
+Exact counts over every profile in the 'agents' table, kept up to date on each insert (values lower-cased, most common buckets only):
+{stats}
+
+Use these figures for the age, gender, location, language, occupation and education distributions instead of aggregating the 'agents' table yourself. Query 'agents' only for what they do not cover, such as biographies, personalities or a few sample rows.
+"""
+
+
+def build_analysis_prompt(stats: str = "") -> str:
+    """The selected AGENT_CHECK_DB variant followed by the profile_stats summary, when there is one."""
+    prompt = get_prompt("agent_check_db")
+    if not stats:
+        return prompt
+    return prompt + PROFILE_STATS_PROMPT.format(stats=stats)
+
 create_profile_prompt = """
 ### INSTRUCTION ###
-You are a professional social media profile architect and content strategist. Using the comprehensive guidelines provided in the [Profile Creation Instruction] section below, generate a unique, high-quality, and strategically crafted social network profile in JSON format. Your objective is to create authentic, compelling profiles that stand out while maintaining believability and internal consistency.
+You are a professional social media profile architect and content strategist. Using the comprehensive guidelines provided in the [Profile Creation Instruction] section of the user message, generate a unique, high-quality, and strategically crafted social network profile in JSON format. Your objective is to create authentic, compelling profiles that stand out while maintaining believability and internal consistency.
 
 **Core Requirements:**
 - **Absolute Uniqueness:** Do not create duplicate profiles—ensure names, biographical details, personality combinations, and other key elements are completely distinct from any previous profiles generated.
@@ -220,9 +243,6 @@ You are a professional social media profile architect and content strategist. Us
 - Language combinations are realistic and add strategic value
 - Location choice supports the overall differentiation strategy
 
-[Profile Creation Instruction]:
-{last_instruction}
-
 **Output Requirements:**
 Generate a single, complete JSON profile that exemplifies strategic differentiation while maintaining authenticity. The profile should demonstrate clear application of the provided guidelines and showcase unique positioning within the social network landscape.
 
@@ -230,6 +250,179 @@ Generate a single, complete JSON profile that exemplifies strategic differentiat
 
 """
 
+# The system prompt above never changes, so together with the static part of
+# the user prompt it forms a byte-identical prefix that providers can cache.
+# The per-call instructions always go last, and only once.
+CREATE_PROFILE_USER_PROMPT = (
+    "Create the profile as a single JSON object based on the provided schema. "
+    "The JSON keys MUST be in snake_case. "
+    "Only output the JSON object itself, with no additional text or markdown."
+)
+
+# Multi-profile mode (PROFILES_PER_CALL > 1): same prefix, `count` profiles per call
+CREATE_PROFILES_USER_PROMPT = (
+    "Create {count} profiles based on the provided schema and output them as a JSON array of exactly "
+    "{count} objects; this replaces the single-object output requirement. "
+    "Every profile must be a different person: no two may share a name, date of birth or location, "
+    "and their occupations, biographies and personalities must clearly differ. "
+    "The JSON keys MUST be in snake_case. "
+    "Only output the JSON array itself, with no additional text or markdown."
+)
+
+# Compressed variants, registered below next to the originals. They keep every
+# instruction that changes the output (fields, sections, output format) and
+# drop the narrative around it.
+GENERATE_PROMPTS_COMPACT = """
+### INSTRUCTION ###
+You write prompts for other language models. Given a task description, return one ready-to-use prompt that follows these rules:
+- Put the instruction first and separate it from context and data with markers such as "### Instruction ###".
+- Be specific and direct: state the task, the audience, the length and the style instead of vague qualifiers ("2-3 sentences", not "short").
+- Include only details that matter for the task.
+- Say what the model should do rather than what it should not do; give an explicit fallback answer for cases it cannot handle.
+- When the output must follow a format, describe it exactly (e.g. "Place: <comma_separated_list_of_places>") and add a short example if it helps.
+- Split large tasks into simpler steps the model can follow in order.
+Output only the prompt.
+"""
+
+AGENT_CHECK_DB_COMPACT = """
+### INSTRUCTION ###
+You are an expert social network analyst. Analyze the profiles in the 'agents' table (fields: name, age, gender, biography, location, language, languages_known, occupation, education, date_of_birth, personality) and write two sections:
+
+**A. Comprehensive Profile Analysis & Market Summary**
+5-8 sentences with figures: age and gender distribution, geographic clusters, languages, occupations and education, dominant personality archetypes, notable correlations, and which niches are oversaturated or missing.
+
+**B. Strategic Instructions for Distinctive Profile Creation**
+Concrete, step-by-step guidelines for one new profile that fills the gaps found in A while staying believable and internally consistent: age and location, personality traits, occupation and education, language combinations, a biography that avoids clichés, and interests. Give specific examples and list the overused choices to avoid.
+"""
+
+CREATE_PROFILE_PROMPT_COMPACT = """
+### INSTRUCTION ###
+You create social network profiles. Follow the guidelines in the [Profile Creation Instruction] section of the user message and generate one unique, believable profile that avoids common patterns and oversaturated niches. Names, cultural references, locations and languages must be consistent with each other, and occupation, education and personality must form a coherent trajectory.
+
+JSON fields:
+- name: full name matching the cultural background
+- age: integer
+- gender
+- biography: 2-3 sentences, no clichés
+- location: city and country/region
+- language: primary language
+- languages_known: array of languages
+- occupation
+- education
+- date_of_birth: YYYY-MM-DD, consistent with age
+- personality: distinctive description, no common trait combinations
+
+**CRITICAL: Output ONLY a single JSON object, no additional text, explanations, or markdown formatting.**
+"""
+
+
+class PromptVariant(NamedTuple):
+    name: str
+    version: str
+    text: str
+    description: str
+
+
+# name -> version -> variant; "v1" is always the original text
+PROMPT_REGISTRY: Dict[str, Dict[str, PromptVariant]] = {}
+
+
+def register_prompt(name: str, version: str, text: str, description: str = "") -> PromptVariant:
+    variant = PromptVariant(name, version, text, description)
+    PROMPT_REGISTRY.setdefault(name, {})[version] = variant
+    return variant
+
+
+register_prompt("generate_prompts", "v1", GENERATE_PROMPTS, "original prompt-engineering guide")
+register_prompt("generate_prompts", "v2", GENERATE_PROMPTS_COMPACT, "rules only, no anecdotes or examples")
+register_prompt("agent_check_db", "v1", AGENT_CHECK_DB, "original analysis prompt")
+register_prompt("agent_check_db", "v2", AGENT_CHECK_DB_COMPACT, "same sections and fields, compressed")
+register_prompt("create_profile", "v1", create_profile_prompt, "original system prompt")
+register_prompt("create_profile", "v2", CREATE_PROFILE_PROMPT_COMPACT, "field list and output rule only")
+
+
+def parse_prompt_variants(value: str) -> Dict[str, str]:
+    """"create_profile=v2,agent_check_db=v2" -> {"create_profile": "v2", ...}."""
+    selected = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        name, _, version = item.partition("=")
+        name, version = name.strip(), version.strip()
+        if version not in PROMPT_REGISTRY.get(name, {}):
+            raise ValueError(f"Unknown prompt variant {item.strip()!r}")
+        selected[name] = version
+    return selected
+
+
+# Variant used for each prompt; anything not listed keeps v1
+PROMPT_VARIANTS = parse_prompt_variants(os.getenv("PROMPT_VARIANTS", ""))
+
+
+def get_prompt(name: str, version: Optional[str] = None) -> str:
+    """Text of `version` of the prompt, or of the variant selected in PROMPT_VARIANTS."""
+    return PROMPT_REGISTRY[name][version or PROMPT_VARIANTS.get(name, "v1")].text
+
+
+PROFILE_INSTRUCTIONS_MAX_TOKENS = int(os.getenv("PROFILE_INSTRUCTIONS_MAX_TOKENS", "1500"))
+
+# Heading of the actionable part of the AGENT_CHECK_DB output
+_GUIDELINES_HEADING = "**B."
+
+
+@functools.lru_cache(maxsize=32)
+def _static_tokens(system_prompt: str, user_prompt: str, model: str) -> int:
+    return count_tokens(system_prompt, model) + count_tokens(user_prompt, model)
+
+
+def trim_instructions(instructions: str, max_tokens: int, model: str = "gpt-4o") -> str:
+    """Fits the DB-analysis instructions into `max_tokens`.
+
+    The strategic guidelines (section B) are kept in preference to the
+    analysis summary; whatever still does not fit is cut at a token boundary.
+    """
+    if max_tokens <= 0 or count_tokens(instructions, model) <= max_tokens:
+        return instructions
+    start = instructions.find(_GUIDELINES_HEADING)
+    if start > 0:
+        instructions = instructions[start:]
+        if count_tokens(instructions, model) <= max_tokens:
+            return instructions
+    encoding = get_encoding(model)
+    if encoding is None:
+        return instructions[:max_tokens * 4] + "\n[...]"
+    return encoding.decode(encoding.encode(instructions)[:max_tokens]) + "\n[...]"
+
+
+def build_create_profile_messages(instructions: str, model: str = "gpt-4o",
+                                  user_prompt: str = CREATE_PROFILE_USER_PROMPT,
+                                  max_instruction_tokens: int = PROFILE_INSTRUCTIONS_MAX_TOKENS,
+                                  feedback: str = ""):
+    """Messages for create_profile: static prefix first, trimmed instructions, then `feedback`.
+
+    Only the DB-analysis instructions are trimmed; the feedback on a rejected
+    previous attempt goes whole in its own message after them.
+    """
+    original_tokens = count_tokens(instructions, model)
+    instructions = trim_instructions(instructions, max_instruction_tokens, model)
+    instruction_tokens = count_tokens(instructions, model)
+    system_prompt = get_prompt("create_profile")
+    static_tokens = _static_tokens(system_prompt, user_prompt, model)
+    feedback_tokens = count_tokens(feedback, model) if feedback else 0
+    print(
+        f"---TOKENS PROMPT: estáticos={static_tokens} instrucciones={instruction_tokens}"
+        f"{f' (recortadas de {original_tokens})' if instruction_tokens < original_tokens else ''}"
+        f"{f' corrección={feedback_tokens}' if feedback else ''}"
+        f" total={static_tokens + instruction_tokens + feedback_tokens}---"
+    )
+    messages = [
+        ("system", system_prompt),
+        ("user", f"{user_prompt}\n\n[Profile Creation Instruction]:\n{instructions}"),
+    ]
+    if feedback:
+        messages.append(("user", f"[Previous Attempt]:\n{feedback}"))
+    return messages
+
 # user_prompt = "Create the profile as a single JSON object based on the provided schema. Only output the JSON object itself, with no additional text or markdown."
 
 # create_profile_prompt = ChatPromptTemplate.from_messages([
@@ -0,0 +1,122 @@
+import os
+from typing import Callable, Optional
+
+from dotenv import load_dotenv
+from langchain_core.messages import HumanMessage, RemoveMessage, SystemMessage
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
+
+from llm_utils.tokens import count_tokens
+
+load_dotenv()
+
+# "window" keeps the last RESERVATION_MEMORY_TURNS turns, "tokens" the newest
+# turns that fit RESERVATION_MEMORY_MAX_TOKENS, "summary" does the same but
+# folds dropped turns into a running summary; "none" keeps everything
+RESERVATION_MEMORY_POLICY = os.getenv("RESERVATION_MEMORY_POLICY", "window")
+RESERVATION_MEMORY_TURNS = int(os.getenv("RESERVATION_MEMORY_TURNS", "6"))
+RESERVATION_MEMORY_MAX_TOKENS = int(os.getenv("RESERVATION_MEMORY_MAX_TOKENS", "2000"))
+
+SUMMARY_MESSAGE_ID = "conversation-summary"
+
+SUMMARY_PROMPT = (
+    "Resume en pocas frases la conversación de un sistema de reservas. "
+    "Conserva los nombres, las fechas y el estado final de cada reserva mencionada; omite saludos y pasos intermedios.\n\n"
+    "Resumen anterior:\n{summary}\n\nMensajes nuevos:\n{messages}"
+)
+
+
+def message_tokens(message) -> int:
+    text = message.content if isinstance(message.content, str) else str(message.content)
+    for tool_call in getattr(message, "tool_calls", None) or []:
+        text += f" {tool_call['name']} {tool_call['args']}"
+    return count_tokens(text)
+
+
+def split_turns(messages):
+    """Splits the history at each user message so tool calls stay with their results.
+
+    Returns the messages before the first user message (e.g. the summary) and
+    the list of turns.
+    """
+    prefix, turns = [], []
+    for message in messages:
+        if isinstance(message, HumanMessage):
+            turns.append([message])
+        elif turns:
+            turns[-1].append(message)
+        else:
+            prefix.append(message)
+    return prefix, turns
+
+
+def turns_to_keep(turns, max_turns: Optional[int] = None, max_tokens: Optional[int] = None) -> int:
+    """How many of the newest turns fit the limits; the last turn is always kept."""
+    keep, tokens = 0, 0
+    for turn in reversed(turns):
+        turn_tokens = sum(message_tokens(m) for m in turn)
+        if keep and ((max_turns is not None and keep >= max_turns)
+                     or (max_tokens is not None and tokens + turn_tokens > max_tokens)):
+            break
+        keep += 1
+        tokens += turn_tokens
+    return keep
+
+
+def llm_summarizer(llm) -> Callable[[str, list], str]:
+    """Summarizer for the "summary" policy backed by a chat model."""
+    def summarize(summary: str, messages) -> str:
+        transcript = "\n".join(f"{type(m).__name__}: {m.content}" for m in messages if m.content)
+        prompt = SUMMARY_PROMPT.format(summary=summary or "(ninguno)", messages=transcript)
+        return llm.invoke([("user", prompt)]).content
+    return summarize
+
+
+class ConversationMemory:
+    """Bounds the message history a checkpointed graph resends on every turn.
+
+    compact() runs between turns and rewrites the thread state, so both the
+    prompt and the stored checkpoint stay the same size over long sessions.
+    """
+
+    def __init__(
+        self,
+        policy: str = RESERVATION_MEMORY_POLICY,
+        max_turns: int = RESERVATION_MEMORY_TURNS,
+        max_tokens: int = RESERVATION_MEMORY_MAX_TOKENS,
+        summarize: Optional[Callable[[str, list], str]] = None,
+    ):
+        if policy not in ("none", "window", "tokens", "summary"):
+            raise ValueError(f"unknown memory policy {policy!r}")
+        if policy == "summary" and summarize is None:
+            raise ValueError("the summary policy needs a summarize function")
+        self.policy = policy
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.summarize = summarize
+
+    def compact(self, graph, config, as_node: Optional[str] = None) -> dict:
+        """Drops (or summarizes) old turns of the thread; returns its size afterwards."""
+        messages = graph.get_state(config).values.get("messages", [])
+        prefix, turns = split_turns(messages)
+        if self.policy == "window":
+            keep = turns_to_keep(turns, max_turns=self.max_turns)
+        elif self.policy in ("tokens", "summary"):
+            keep = turns_to_keep(turns, max_tokens=self.max_tokens)
+        else:
+            keep = len(turns)
+
+        dropped = [m for turn in turns[:len(turns) - keep] for m in turn]
+        if dropped:
+            kept = [m for turn in turns[len(turns) - keep:] for m in turn]
+            summary = [m for m in prefix if m.id == SUMMARY_MESSAGE_ID]
+            if self.policy == "summary":
+                previous = summary[0].content if summary else ""
+                summary = [SystemMessage(
+                    content=self.summarize(previous, [m for m in prefix if m.id != SUMMARY_MESSAGE_ID] + dropped),
+                    id=SUMMARY_MESSAGE_ID,
+                )]
+            messages = summary + kept
+            graph.update_state(
+                config, {"messages": [RemoveMessage(id=REMOVE_ALL_MESSAGES), *messages]}, as_node=as_node
+            )
+        return {"messages": len(messages), "tokens": sum(message_tokens(m) for m in messages), "dropped": len(dropped)}
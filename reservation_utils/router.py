@@ -0,0 +1,139 @@
+import re
+import threading
+import time
+from datetime import date
+from typing import NamedTuple, Optional
+
+_INTENTS = (
+    ("delete", re.compile(r"\b(cancela\w*|elimina\w*|borra\w*|anula\w*|quita\w*)\b", re.IGNORECASE)),
+    ("edit", re.compile(r"\b(cambia\w*|mueve\w*|mover|modifica\w*|edita\w*|reprograma\w*)\b", re.IGNORECASE)),
+    ("add", re.compile(r"\b(reserva\w*|agrega\w*|añade\w*|crea\w*|apunta\w*)\b", re.IGNORECASE)),
+)
+_NAME_WORD = r"[A-ZÁÉÍÓÚÑÜ][a-záéíóúñü]+"
+_NAME_RE = re.compile(rf"\b(?:de|para|a nombre de)\s+({_NAME_WORD}(?:\s+{_NAME_WORD})*)")
+# Never clear commands, even with a single intent and name: negations ("No quiero
+# cancelar la reserva de Ana"), questions ("¿Puedo cancelar la reserva de Ana?")
+# and several names ("cancela las reservas de Ana y Luis")
+_AMBIGUOUS = (
+    re.compile(r"\b(no|nunca|jam[aá]s|ni)\b", re.IGNORECASE),
+    re.compile(r"[?¿]"),
+    re.compile(rf"{_NAME_WORD}\s*(?:,|\b[yeou]\b)\s*(?:(?:de|para|a)\s+)?{_NAME_WORD}"),
+)
+_ISO_DATE_RE = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+_DMY_DATE_RE = re.compile(r"\b(\d{1,2})/(\d{1,2})/(\d{4})\b")
+
+
+class Command(NamedTuple):
+    intent: str
+    nombre: str
+    fecha: Optional[str]
+
+
+def _dates(text: str):
+    found = [(y, m, d) for y, m, d in _ISO_DATE_RE.findall(text)]
+    found += [(y, m, d) for d, m, y in _DMY_DATE_RE.findall(text)]
+    dates = []
+    for y, m, d in found:
+        try:
+            dates.append(date(int(y), int(m), int(d)).isoformat())
+        except ValueError:
+            return None
+    return dates
+
+
+def parse_command(text: str) -> Optional[Command]:
+    """Intent, name and date of a clear reservation request, or None when it is ambiguous.
+
+    Only one intent keyword family, exactly one capitalized name and the right
+    number of dates (none to delete, one to add or edit) are accepted;
+    negations, questions, several names and anything else are left to the LLM
+    supervisor.
+    """
+    if any(pattern.search(text) for pattern in _AMBIGUOUS):
+        return None
+    intents = {intent for intent, pattern in _INTENTS if pattern.search(text)}
+    # "cancela la reserva" also matches "reserva": add only wins on its own
+    if len(intents) > 1:
+        intents.discard("add")
+    if len(intents) != 1:
+        return None
+    intent = intents.pop()
+
+    names = _NAME_RE.findall(text)
+    dates = _dates(text)
+    if len(names) != 1 or dates is None:
+        return None
+    if intent == "delete":
+        return Command(intent, names[0], None) if not dates else None
+    if len(dates) != 1:
+        return None
+    return Command(intent, names[0], dates[0])
+
+
+class RouterStats:
+    """Hit rate of the fast path and the supervisor latency it avoided."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.local_seconds = 0.0
+        self.llm_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, hit: bool, elapsed: float):
+        with self._lock:
+            if hit:
+                self.hits += 1
+                self.local_seconds += elapsed
+            else:
+                self.misses += 1
+                self.llm_seconds += elapsed
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def saved_seconds(self) -> Optional[float]:
+        """Hits times the average supervisor latency, minus the fast-path time; None before any fallback."""
+        if not self.misses:
+            return None
+        return self.hits * (self.llm_seconds / self.misses) - self.local_seconds
+
+    def summary(self) -> str:
+        saved = self.saved_seconds()
+        saved_text = "n/d" if saved is None else f"{saved:.1f}s"
+        return (
+            f"---ROUTER: {self.hits}/{self.hits + self.misses} solicitudes resueltas sin LLM "
+            f"({self.hit_rate:.0%}), latencia ahorrada estimada {saved_text}---"
+        )
+
+
+class IntentRouter:
+    """Calls the reservation tool directly for clear requests, else the fallback.
+
+    `on_hit(text, result)` lets the caller record fast-path exchanges, e.g. in
+    the supervisor's conversation memory.
+    """
+
+    def __init__(self, tools: dict, fallback, on_hit=None):
+        self.tools = tools
+        self.fallback = fallback
+        self.on_hit = on_hit
+        self.stats = RouterStats()
+
+    def handle(self, text: str):
+        start = time.perf_counter()
+        command = parse_command(text)
+        if command is None:
+            result = self.fallback(text)
+            self.stats.record(False, time.perf_counter() - start)
+            return result
+        if command.intent == "delete":
+            result = self.tools["delete"](command.nombre)
+        else:
+            result = self.tools[command.intent](command.nombre, command.fecha)
+        self.stats.record(True, time.perf_counter() - start)
+        if self.on_hit is not None:
+            self.on_hit(text, result)
+        return result
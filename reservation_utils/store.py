@@ -0,0 +1,132 @@
+import functools
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+RESERVATIONS_DB_PATH = os.getenv("RESERVATIONS_DB_PATH", "reservas.db")
+# Legacy store, imported once into the database and then renamed
+RESERVATIONS_JSON_PATH = os.getenv("RESERVATIONS_JSON_PATH", "reservas.json")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reservations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nombre TEXT NOT NULL,
+    nombre_key TEXT NOT NULL,
+    fecha TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reservations_nombre_key ON reservations (nombre_key, id);
+CREATE TABLE IF NOT EXISTS migrations (
+    name TEXT PRIMARY KEY,
+    applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+
+def name_key(nombre: str) -> str:
+    """Lookup key for a name: "  Ana  " and "ANA" are the same reservation."""
+    return " ".join(nombre.split()).casefold()
+
+
+class ReservationStore:
+    """Reservations in SQLite (WAL), indexed by the casefolded name.
+
+    Every operation is a single indexed statement in its own transaction, so
+    concurrent sessions, threads or processes never overwrite each other.
+    """
+
+    def __init__(self, path: str = RESERVATIONS_DB_PATH, json_path: str = RESERVATIONS_JSON_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+        if json_path:
+            self.migrate_json(json_path)
+
+    @contextmanager
+    def _transaction(self):
+        # IMMEDIATE takes the write lock up front, so other processes wait instead of failing
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._connection
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    def _write(self, query, params=()):
+        with self._transaction() as connection:
+            return connection.execute(query, params)
+
+    def migrate_json(self, json_path: str) -> int:
+        """Imports the reservations of the old JSON file once, keeping their order.
+
+        The import is recorded in the same transaction as the rows, so
+        concurrent sessions never import the file twice. The file is then
+        renamed to <name>.migrated.
+        """
+        if not os.path.exists(json_path):
+            return 0
+        migration = f"json:{os.path.abspath(json_path)}"
+        with self._transaction() as connection:
+            if connection.execute("SELECT 1 FROM migrations WHERE name = ?", (migration,)).fetchone():
+                return 0
+            with open(json_path, "r", encoding="utf-8") as f:
+                reservas = json.load(f)
+            connection.executemany(
+                "INSERT INTO reservations (nombre, nombre_key, fecha) VALUES (?, ?, ?)",
+                [(r["nombre"], name_key(r["nombre"]), r["fecha"]) for r in reservas],
+            )
+            connection.execute("INSERT INTO migrations (name) VALUES (?)", (migration,))
+        os.replace(json_path, f"{json_path}.migrated")
+        print(f"---{len(reservas)} RESERVAS MIGRADAS DESDE {json_path}---")
+        return len(reservas)
+
+    def add(self, nombre: str, fecha: str):
+        self._write(
+            "INSERT INTO reservations (nombre, nombre_key, fecha) VALUES (?, ?, ?)",
+            (nombre, name_key(nombre), fecha),
+        )
+
+    def edit(self, nombre: str, nueva_fecha: str) -> bool:
+        """Changes the date of the oldest reservation under `nombre`; False if there is none."""
+        cursor = self._write(
+            "UPDATE reservations SET fecha = ? WHERE id = "
+            "(SELECT id FROM reservations WHERE nombre_key = ? ORDER BY id LIMIT 1)",
+            (nueva_fecha, name_key(nombre)),
+        )
+        return cursor.rowcount > 0
+
+    def delete(self, nombre: str) -> int:
+        """Deletes every reservation under `nombre` and returns how many there were."""
+        cursor = self._write("DELETE FROM reservations WHERE nombre_key = ?", (name_key(nombre),))
+        return cursor.rowcount
+
+    def find(self, nombre: str):
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT nombre, fecha FROM reservations WHERE nombre_key = ? ORDER BY id", (name_key(nombre),)
+            ).fetchall()
+        return [{"nombre": n, "fecha": f} for n, f in rows]
+
+    def all(self):
+        with self._lock:
+            rows = self._connection.execute("SELECT nombre, fecha FROM reservations ORDER BY id").fetchall()
+        return [{"nombre": n, "fecha": f} for n, f in rows]
+
+    def close(self):
+        self._connection.close()
+
+
+@functools.lru_cache(maxsize=None)
+def get_reservation_store():
+    """Process-wide store, opened (and migrated) on first use."""
+    return ReservationStore()
@@ -0,0 +1,368 @@
+import atexit
+import functools
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+from dotenv import load_dotenv
+from psycopg2 import errors, sql
+from psycopg2.extras import execute_values
+
+from llm_utils.tracing import traced
+from profile_utils.fingerprint import FingerprintIndex, profile_fingerprint
+from supabase_utils.connection import get_db_connection
+from supabase_utils.profile_stats import record_profile_stats
+from supabase_utils.schema import refresh_agents_columns
+
+load_dotenv()
+
+BULK_INSERT_BATCH_SIZE = int(os.getenv("BULK_INSERT_BATCH_SIZE", "100"))
+BULK_INSERT_MAX_DELAY = float(os.getenv("BULK_INSERT_MAX_DELAY", "2"))
+
+
+class DuplicateProfileError(Exception):
+    """The profile has the same fingerprint as one already stored."""
+
+
+def sanitize_profile(profile_data: dict) -> dict:
+    # Sanitize keys from the dictionary to be valid column names
+    # e.g. "Languages Known" -> "languages_known"
+    data = {k.lower().replace(" ", "_"): v for k, v in profile_data.items()}
+    data["fingerprint"] = profile_fingerprint(data)
+    return data
+
+
+class MigrationRequiredError(RuntimeError):
+    """The agents table lacks a column or index added by `agora migrate`."""
+
+
+def migrate_fingerprint_column(connection_factory=get_db_connection) -> dict:
+    """Adds agents.fingerprint, backfills it and builds its unique index.
+
+    Run once per database through `agora migrate`, never from the insert path.
+    Writes to agents wait for the migration. When the table already holds
+    duplicates only the oldest row gets the fingerprint; the others keep NULL
+    and are listed in the result.
+    """
+    connection = connection_factory()
+    try:
+        with connection.cursor() as cursor:
+            # Blocks inserts and updates (not reads) until the index exists
+            cursor.execute("LOCK TABLE agents IN SHARE ROW EXCLUSIVE MODE")
+            cursor.execute("ALTER TABLE agents ADD COLUMN IF NOT EXISTS fingerprint text")
+            cursor.execute(
+                "SELECT id, name, date_of_birth, location FROM agents "
+                "WHERE fingerprint IS NULL ORDER BY id"
+            )
+            missing = cursor.fetchall()
+            updates, duplicates = [], []
+            if missing:
+                cursor.execute("SELECT fingerprint FROM agents WHERE fingerprint IS NOT NULL")
+                seen = {row[0] for row in cursor.fetchall()}
+                for agent_id, name, date_of_birth, location in missing:
+                    fingerprint = profile_fingerprint(
+                        {"name": name, "date_of_birth": date_of_birth, "location": location}
+                    )
+                    if fingerprint in seen:
+                        duplicates.append(agent_id)
+                    else:
+                        seen.add(fingerprint)
+                        updates.append((fingerprint, agent_id))
+                execute_values(
+                    cursor,
+                    "UPDATE agents SET fingerprint = v.fingerprint "
+                    "FROM (VALUES %s) AS v (fingerprint, id) WHERE agents.id = v.id",
+                    updates,
+                )
+            cursor.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS agents_fingerprint_key ON agents (fingerprint)"
+            )
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+    print(f"---fingerprint: {len(updates)} perfiles completados---")
+    if duplicates:
+        print(f"---{len(duplicates)} PERFILES DUPLICADOS QUEDAN SIN fingerprint (ids: "
+              f"{', '.join(map(str, duplicates[:20]))}{', ...' if len(duplicates) > 20 else ''})---")
+    return {"backfilled": len(updates), "duplicates": duplicates}
+
+
+def check_fingerprint_column(connection_factory=get_db_connection):
+    """Raises MigrationRequiredError unless agents.fingerprint and its unique index exist."""
+    connection = connection_factory()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM information_schema.columns "
+                "WHERE table_name = 'agents' AND column_name = 'fingerprint'"
+            )
+            column = cursor.fetchone() is not None
+            cursor.execute("SELECT to_regclass('agents_fingerprint_key')")
+            index = cursor.fetchone()[0] is not None
+    finally:
+        connection.close()
+    if not (column and index):
+        raise MigrationRequiredError("agents.fingerprint or its unique index is missing; run `agora migrate` first")
+
+
+@functools.lru_cache(maxsize=None)
+@traced("db", "warm_fingerprints")
+def get_fingerprint_index():
+    """Known fingerprints, warmed from the agents table on first use."""
+    check_fingerprint_column()
+    connection = get_db_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT fingerprint FROM agents WHERE fingerprint IS NOT NULL")
+            index = FingerprintIndex(row[0] for row in cursor.fetchall())
+    finally:
+        connection.close()
+    print(f"---{len(index)} FINGERPRINTS CARGADOS---")
+    return index
+
+
+# Errors that mean the cached agents columns no longer match the table
+_SCHEMA_ERRORS = (errors.UndefinedColumn, errors.DatatypeMismatch, errors.InvalidTextRepresentation)
+
+
+def refresh_schema_on_error(error):
+    """Drops the cached column metadata when an insert failed because of it."""
+    if isinstance(error, _SCHEMA_ERRORS):
+        print(f"---ESQUEMA DE agents DESACTUALIZADO ({type(error).__name__}), RECARGANDO---")
+        refresh_agents_columns()
+
+
+def build_insert_query(columns, multi_row=False):
+    """INSERT for the given columns that skips rows whose fingerprint already exists.
+
+    Returns the id of every inserted row; multi_row leaves a single %s for
+    execute_values and also returns the fingerprint to match rows back.
+    """
+    values = sql.SQL("%s") if multi_row else sql.SQL("({})").format(
+        sql.SQL(", ").join(sql.Placeholder() * len(columns))
+    )
+    query = sql.SQL("INSERT INTO agents ({}) VALUES {} ON CONFLICT (fingerprint) DO NOTHING").format(
+        sql.SQL(", ").join(map(sql.Identifier, columns)),
+        values,
+    )
+    query += sql.SQL(" RETURNING id, fingerprint" if multi_row else " RETURNING id")
+    return query
+
+
+@traced("db")
+def insert_profile(data: dict):
+    """Inserts a single sanitized profile in its own transaction and returns its id.
+
+    Raises DuplicateProfileError without touching the DB when the fingerprint
+    is already known.
+    """
+    fingerprint_index = get_fingerprint_index()
+    fingerprint = data["fingerprint"]
+    if not fingerprint_index.claim(fingerprint):
+        raise DuplicateProfileError(fingerprint)
+
+    connection = None
+    try:
+        connection = get_db_connection()
+        with connection.cursor() as cursor:
+            cursor.execute(build_insert_query(list(data.keys())), tuple(data.values()))
+            inserted = cursor.fetchone()
+            if inserted is not None:
+                record_profile_stats(cursor, [data])
+        connection.commit()
+    except Exception as e:
+        fingerprint_index.release(fingerprint)
+        refresh_schema_on_error(e)
+        if connection:
+            connection.rollback()
+        raise
+    finally:
+        if connection:
+            connection.close()
+    if inserted is None:
+        # Another process stored it first; keep it in the index
+        raise DuplicateProfileError(fingerprint)
+    return inserted[0]
+
+
+class BulkProfileWriter:
+    """Buffers profiles and writes them as multi-row INSERTs.
+
+    A batch is flushed when it reaches `max_batch_size` rows or when its oldest
+    row has waited `max_delay` seconds, using one transaction per batch. If the
+    multi-row statement fails, the batch is replayed row by row behind
+    savepoints so only the offending rows fail. add() returns a Future that
+    resolves to the new row id once it is committed.
+    """
+
+    def __init__(self, max_batch_size=BULK_INSERT_BATCH_SIZE, max_delay=BULK_INSERT_MAX_DELAY,
+                 connection_factory=get_db_connection):
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.connection_factory = connection_factory
+        self.stats = {"rows": 0, "failed": 0, "duplicates": 0, "batches": 0, "statements": 0}
+        self.fingerprint_index = get_fingerprint_index()
+        self._buffer = []
+        self._oldest = None
+        self._closed = False
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="bulk-profile-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def add(self, data: dict) -> Future:
+        future = Future()
+        with self._lock:
+            # Checked before claiming, so a closed writer never holds a fingerprint
+            if self._closed:
+                raise RuntimeError("BulkProfileWriter is closed")
+            duplicate = not self.fingerprint_index.claim(data["fingerprint"])
+            if duplicate:
+                self.stats["duplicates"] += 1
+            else:
+                self._buffer.append((data, future))
+                if self._oldest is None:
+                    self._oldest = time.monotonic()
+            full = len(self._buffer) >= self.max_batch_size
+        if duplicate:
+            future.set_exception(DuplicateProfileError(data["fingerprint"]))
+            return future
+        if full:
+            self._wakeup.set()
+        return future
+
+    def _count(self, **deltas):
+        # add() callers and the flusher thread both update the stats
+        with self._lock:
+            for key, delta in deltas.items():
+                self.stats[key] += delta
+
+    def _due(self):
+        with self._lock:
+            if not self._buffer:
+                return False
+            return (len(self._buffer) >= self.max_batch_size
+                    or time.monotonic() - self._oldest >= self.max_delay)
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(timeout=max(self.max_delay / 4, 0.05))
+            self._wakeup.clear()
+            if self._due():
+                self.flush()
+
+    def flush(self):
+        """Writes everything buffered so far."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+                self._oldest = None
+            while batch:
+                chunk, batch = batch[:self.max_batch_size], batch[self.max_batch_size:]
+                self._write(chunk)
+
+    @traced("db", "bulk_insert")
+    def _write(self, batch):
+        # execute_values needs the same column list for every row
+        groups = {}
+        for data, future in batch:
+            groups.setdefault(tuple(data.keys()), []).append((data, future))
+
+        try:
+            connection = self.connection_factory()
+        except Exception as e:
+            for data, future in batch:
+                self._fail(data, future, e)
+            return
+
+        try:
+            for columns, rows in groups.items():
+                self._write_group(connection, columns, rows)
+        finally:
+            connection.close()
+
+    def _write_group(self, connection, columns, rows):
+        query = build_insert_query(columns, multi_row=True)
+        try:
+            with connection.cursor() as cursor:
+                returned = execute_values(
+                    cursor, query, [tuple(d.values()) for d, _ in rows], page_size=len(rows), fetch=True
+                )
+                inserted = {fingerprint: agent_id for agent_id, fingerprint in returned}
+                record_profile_stats(cursor, [d for d, _ in rows if d["fingerprint"] in inserted])
+            connection.commit()
+            stored = sum(1 for data, _ in rows if data["fingerprint"] in inserted)
+            self._count(batches=1, statements=1, rows=stored, duplicates=len(rows) - stored)
+            for data, future in rows:
+                if data["fingerprint"] in inserted:
+                    future.set_result(inserted[data["fingerprint"]])
+                else:
+                    future.set_exception(DuplicateProfileError(data["fingerprint"]))
+            return
+        except Exception as e:
+            connection.rollback()
+            print(f"Fallo el lote de {len(rows)} perfiles ({e}), reintentando fila por fila")
+
+        row_query = build_insert_query(columns)
+        outcomes = []
+        try:
+            with connection.cursor() as cursor:
+                for data, future in rows:
+                    cursor.execute("SAVEPOINT bulk_row")
+                    try:
+                        cursor.execute(row_query, tuple(data.values()))
+                        inserted = cursor.fetchone()
+                        cursor.execute("RELEASE SAVEPOINT bulk_row")
+                        if inserted is None:
+                            outcomes.append((data, future, DuplicateProfileError(data["fingerprint"]), None))
+                        else:
+                            outcomes.append((data, future, None, inserted[0]))
+                    except Exception as e:
+                        cursor.execute("ROLLBACK TO SAVEPOINT bulk_row")
+                        outcomes.append((data, future, e, None))
+                    self._count(statements=1)
+                record_profile_stats(cursor, [data for data, _, error, _ in outcomes if error is None])
+            connection.commit()
+        except Exception as e:
+            connection.rollback()
+            outcomes = [(data, future, e, None) for data, future in rows]
+
+        self._count(batches=1)
+        for data, future, error, agent_id in outcomes:
+            if error is None:
+                self._count(rows=1)
+                future.set_result(agent_id)
+            elif isinstance(error, DuplicateProfileError):
+                self._count(duplicates=1)
+                future.set_exception(error)
+            else:
+                self._fail(data, future, error)
+
+    def _fail(self, data, future, error):
+        refresh_schema_on_error(error)
+        self._count(failed=1)
+        self.fingerprint_index.release(data["fingerprint"])
+        future.set_exception(error)
+
+    def close(self):
+        """Stops the background thread and flushes what is left."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._wakeup.set()
+        self._thread.join()
+        self.flush()
+        atexit.unregister(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
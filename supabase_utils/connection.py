@@ -1,14 +1,108 @@
+import functools
 import os
-import psycopg2
+import threading
+import time
+from sqlalchemy import create_engine, event
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Pool settings shared by the insert path and the SQL analysis tool
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+_metrics_lock = threading.Lock()
+_metrics = {
+    "connections_created": 0,
+    "checkouts": 0,
+    "checkins": 0,
+    "checked_out": 0,
+    "peak_checked_out": 0,
+    "checkout_wait_seconds": 0.0,
+}
+
+
+# Stand-in database set by use_backend (offline runs and benchmarks)
+_connection_factory = None
+_engine = None
+
+
+def use_backend(connection_factory, engine=None):
+    """Serves get_db_connection, and get_engine when `engine` is given, from another database.
+
+    Every connection_factory default goes through get_db_connection, so the
+    whole pipeline follows. Call it before the first query: get_db and the
+    column and fingerprint caches keep what they loaded.
+    """
+    global _connection_factory, _engine
+    _connection_factory = connection_factory
+    _engine = engine
+    get_engine.cache_clear()
+
+
+def _incr(name, amount=1):
+    with _metrics_lock:
+        _metrics[name] += amount
+        if name == "checkouts":
+            _metrics["checked_out"] += amount
+            _metrics["peak_checked_out"] = max(_metrics["peak_checked_out"], _metrics["checked_out"])
+        elif name == "checkins":
+            _metrics["checked_out"] -= amount
+
+
+def get_database_url():
+    host = os.getenv("HOST")
+    port = int(os.getenv("DBPORT"))
+    db_name = os.getenv("DBNAME")
+    user = os.getenv("USER")
+    password = os.getenv("PASSWORD")
+    return f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{db_name}"
+
+
+@functools.lru_cache(maxsize=None)
+def get_engine():
+    """Process-wide SQLAlchemy engine; its pool backs every DB access."""
+    if _engine is not None:
+        return _engine
+    engine = create_engine(
+        get_database_url(),
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+    event.listen(engine, "connect", lambda *args: _incr("connections_created"))
+    event.listen(engine, "checkout", lambda *args: _incr("checkouts"))
+    event.listen(engine, "checkin", lambda *args: _incr("checkins"))
+    return engine
+
+
 def get_db_connection():
-    return psycopg2.connect(
-        host=os.getenv("HOST"),
-        port=int(os.getenv("DBPORT")),
-        dbname=os.getenv("DBNAME"),
-        user=os.getenv("USER"),
-        password=os.getenv("PASSWORD")
-    )
\ No newline at end of file
+    """Checks a psycopg2 connection out of the shared pool.
+
+    close() returns it to the pool instead of closing the socket.
+    """
+    if _connection_factory is not None:
+        return _connection_factory()
+    start = time.perf_counter()
+    connection = get_engine().raw_connection()
+    _incr("checkout_wait_seconds", time.perf_counter() - start)
+    return connection
+
+
+def get_pool_metrics():
+    """Checkout counters plus the current state of the pool."""
+    with _metrics_lock:
+        metrics = dict(_metrics)
+    if get_engine.cache_info().currsize:
+        pool = get_engine().pool
+        metrics.update(
+            pool_size=pool.size(),
+            pool_checked_in=pool.checkedin(),
+            pool_overflow=pool.overflow(),
+        )
+    return metrics
@@ -1,27 +1,192 @@
-from sqlalchemy import create_engine
 from langchain_community.utilities.sql_database import SQLDatabase
+import functools
 import os
+import re
 from dotenv import load_dotenv
 
+from supabase_utils.connection import get_engine
+
 load_dotenv()
 
-def get_engine():
-    host = os.getenv("HOST")
-    port = int(os.getenv("DBPORT"))
-    db_name = os.getenv("DBNAME")
-    user = os.getenv("USER")
-    password = os.getenv("PASSWORD")
-
-    db_url = f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{db_name}"
-    
-    engine = create_engine(
-        db_url,
-        pool_size=10,
-        max_overflow=20,
-        pool_timeout=30,
-        pool_recycle=1800,
+# Limits applied to the SQL tool used by the analysis agent
+SQL_TOOL_TABLES = [t.strip() for t in os.getenv("SQL_TOOL_TABLES", "agents").split(",") if t.strip()]
+SQL_TOOL_MAX_ROWS = int(os.getenv("SQL_TOOL_MAX_ROWS", "50"))
+SQL_TOOL_MAX_CHARS = int(os.getenv("SQL_TOOL_MAX_CHARS", "4000"))
+# "random" (ORDER BY random() LIMIT n), "tablesample" (TABLESAMPLE BERNOULLI) or "none"
+SQL_TOOL_SAMPLING = os.getenv("SQL_TOOL_SAMPLING", "random")
+SQL_TOOL_SAMPLE_PERCENT = float(os.getenv("SQL_TOOL_SAMPLE_PERCENT", "10"))
+
+_AGGREGATE_RE = re.compile(r"\b(count|avg|sum|min|max|stddev|percentile_cont)\s*\(|\bgroup\s+by\b|\bdistinct\b", re.IGNORECASE)
+_ORDER_BY_RE = re.compile(r"\border\s+by\b", re.IGNORECASE)
+_READ_QUERY_RE = re.compile(r"^\s*(select|with)\b", re.IGNORECASE)
+# Statements that write, even inside a WITH (data-modifying CTEs)
+_WRITE_RE = re.compile(
+    r"\b(insert|update|delete|merge|drop|alter|create|truncate|grant|revoke|copy|call|do|vacuum|lock|set|reset)\b",
+    re.IGNORECASE,
+)
+# Words that can follow a table name but are not an alias
+_NOT_ALIAS = {
+    "where", "join", "inner", "left", "right", "full", "cross", "natural", "on", "using", "group", "order",
+    "limit", "offset", "union", "intersect", "except", "having", "window", "fetch", "for", "tablesample",
+}
+_TABLE_RE = r"\b(from|join)\s+{table}\b(\s+(?:as\s+)?(\w+))?"
+
+
+class ReadOnlyQueryError(ValueError):
+    """The SQL tool only runs a single SELECT or WITH query."""
+
+
+def _scan_sql(query: str):
+    """(query without comments, query without comments or string literals)."""
+    code, skeleton = [], []
+    i, length = 0, len(query)
+    while i < length:
+        char = query[i]
+        if query.startswith("--", i):
+            end = query.find("\n", i)
+            i = length if end == -1 else end
+        elif query.startswith("/*", i):
+            end = query.find("*/", i + 2)
+            i = length if end == -1 else end + 2
+            code.append(" ")
+            skeleton.append(" ")
+        elif char in "'\"":
+            end = i + 1
+            while end < length:
+                if query[end] == char:
+                    if query.startswith(char * 2, end):
+                        # Escaped quote
+                        end += 2
+                        continue
+                    break
+                end += 1
+            code.append(query[i:end + 1])
+            skeleton.append(" " if char == "'" else query[i:end + 1])
+            i = end + 1
+        else:
+            code.append(char)
+            skeleton.append(char)
+            i += 1
+    return "".join(code), "".join(skeleton)
+
+
+def check_read_query(command: str) -> str:
+    """The query without comments and trailing semicolons; raises ReadOnlyQueryError for anything but one read."""
+    query, skeleton = _scan_sql(command)
+    query, skeleton = query.strip().rstrip(";").strip(), skeleton.strip().rstrip(";").strip()
+    if not _READ_QUERY_RE.match(skeleton):
+        raise ReadOnlyQueryError("Only SELECT or WITH queries are allowed")
+    if ";" in skeleton:
+        raise ReadOnlyQueryError("Only a single statement is allowed")
+    write = _WRITE_RE.search(skeleton)
+    if write:
+        raise ReadOnlyQueryError(f"{write.group(1).upper()} is not allowed, the database is read-only")
+    return query
+
+
+def _sample_table(query: str, table: str, sample_percent: float) -> str:
+    def add_sample(match):
+        keyword, alias_part, alias = match.group(1), match.group(2) or "", match.group(3)
+        if alias and alias.lower() in _NOT_ALIAS:
+            if alias.lower() == "tablesample":
+                return match.group(0)
+            # Not an alias: sample right after the table name
+            return f"{keyword} {table} TABLESAMPLE BERNOULLI ({sample_percent:g}){alias_part}"
+        # The alias goes before TABLESAMPLE
+        return f"{keyword} {table}{alias_part} TABLESAMPLE BERNOULLI ({sample_percent:g})"
+
+    return re.sub(_TABLE_RE.format(table=re.escape(table)), add_sample, query, flags=re.IGNORECASE)
+
+
+def bound_query(command: str, max_rows: int, sampling: str = "random", tables=None, sample_percent: float = 10) -> str:
+    """Rewrites a read query so it returns at most `max_rows` rows.
+
+    Aggregations are only capped: they need every row to be correct. Plain row
+    listings are also sampled so the agent sees a spread of the table instead
+    of the first rows in physical order. Raises ReadOnlyQueryError for
+    anything but a single SELECT or WITH query.
+    """
+    query = check_read_query(command)
+
+    is_aggregate = bool(_AGGREGATE_RE.search(query))
+    if not is_aggregate and sampling == "tablesample":
+        for table in tables or []:
+            query = _sample_table(query, table, sample_percent)
+
+    order_by = ""
+    if not is_aggregate and sampling == "random" and not _ORDER_BY_RE.search(query):
+        order_by = " ORDER BY random()"
+    # Newlines keep a comment the scanner missed from swallowing the parenthesis
+    return f"SELECT * FROM (\n{query}\n) AS bounded_query{order_by} LIMIT {int(max_rows)}"
+
+
+def truncate_result(result: str, max_chars: int) -> str:
+    if max_chars <= 0 or len(result) <= max_chars:
+        return result
+    return f"{result[:max_chars]}... [truncated {len(result) - max_chars} chars]"
+
+
+class BoundedSQLDatabase(SQLDatabase):
+    """SQLDatabase whose run() caps rows and output size for the LLM."""
+
+    def __init__(self, engine, max_rows=SQL_TOOL_MAX_ROWS, max_chars=SQL_TOOL_MAX_CHARS,
+                 sampling=SQL_TOOL_SAMPLING, sample_percent=SQL_TOOL_SAMPLE_PERCENT, **kwargs):
+        if engine.dialect.name == "postgresql":
+            # Second line of defence after check_read_query: the transaction itself cannot write
+            engine = engine.execution_options(postgresql_readonly=True)
+        super().__init__(engine, **kwargs)
+        self.max_rows = max_rows
+        self.max_chars = max_chars
+        self.sampling = sampling
+        self.sample_percent = sample_percent
+
+    def run(self, command: str, fetch: str = "all", include_columns: bool = False, *, parameters=None, execution_options=None):
+        """Execute a read-only SQL query against the agents table and return the rows as text.
+
+        Row listings are sampled and limited, and long results are truncated;
+        use COUNT/GROUP BY aggregations to describe the whole table.
+        """
+        if isinstance(command, str) and fetch != "all":
+            command = check_read_query(command)
+        elif isinstance(command, str):
+            command = bound_query(
+                command,
+                self.max_rows,
+                sampling=self.sampling,
+                tables=self.get_usable_table_names(),
+                sample_percent=self.sample_percent,
+            )
+        result = super().run(
+            command,
+            fetch,
+            include_columns,
+            parameters=parameters,
+            execution_options=execution_options,
+        )
+        if isinstance(result, str):
+            return truncate_result(result, self.max_chars)
+        return result
+
+
+@functools.lru_cache(maxsize=None)
+def get_db():
+    """SQLDatabase for the analysis agent, built on first use on the shared pool.
+
+    Only the tables in SQL_TOOL_TABLES are reflected, and only when the agent
+    first needs their metadata.
+    """
+    return BoundedSQLDatabase(
+        get_engine(),
+        include_tables=SQL_TOOL_TABLES,
+        sample_rows_in_table_info=3,
+        lazy_table_reflection=True,
     )
-    return engine
 
-engine = get_engine()
-db = SQLDatabase(engine)
\ No newline at end of file
+
+def __getattr__(name):
+    # Backwards compatible `from supabase_utils.db_pool import db, engine`
+    if name == "db":
+        return get_db()
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,167 @@
+import os
+from typing import List, NamedTuple, Optional
+
+from dotenv import load_dotenv
+
+from llm_utils.tracing import traced
+from supabase_utils.connection import get_db_connection
+
+load_dotenv()
+
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# A failed job waits attempts * JOB_RETRY_DELAY seconds before it can be claimed again
+JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", "30"))
+
+JOBS_DDL = """
+CREATE TABLE IF NOT EXISTS generation_jobs (
+    id bigserial PRIMARY KEY,
+    status text NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'running', 'done', 'failed')),
+    attempts integer NOT NULL DEFAULT 0,
+    max_attempts integer NOT NULL DEFAULT 3,
+    worker_id text,
+    run_after timestamptz NOT NULL DEFAULT now(),
+    leased_until timestamptz,
+    heartbeat_at timestamptz,
+    result text,
+    last_error text,
+    created_at timestamptz NOT NULL DEFAULT now(),
+    updated_at timestamptz NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS generation_jobs_pending ON generation_jobs (run_after, id) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS generation_jobs_running ON generation_jobs (leased_until) WHERE status = 'running';
+"""
+
+
+class Job(NamedTuple):
+    id: int
+    attempts: int
+    max_attempts: int
+
+
+def _execute(query, params=(), fetch=False, connection_factory=get_db_connection):
+    connection = connection_factory()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(query, params)
+            rows = cursor.fetchall() if fetch else cursor.rowcount
+        connection.commit()
+        return rows
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+
+def ensure_jobs_table():
+    _execute(JOBS_DDL)
+
+
+@traced("db")
+def enqueue_jobs(count: int, max_attempts: int = JOB_MAX_ATTEMPTS) -> List[int]:
+    """Adds `count` pending jobs, one profile each, and returns their ids."""
+    rows = _execute(
+        "INSERT INTO generation_jobs (max_attempts) SELECT %s FROM generate_series(1, %s) RETURNING id",
+        (max_attempts, count),
+        fetch=True,
+    )
+    return [row[0] for row in rows]
+
+
+@traced("db")
+def claim_jobs(worker_id: str, limit: int, lease_seconds: float = JOB_LEASE_SECONDS) -> List[Job]:
+    """Leases up to `limit` jobs to this worker.
+
+    Takes pending jobs that are due and running jobs whose lease expired (their
+    worker stopped sending heartbeats). SKIP LOCKED lets any number of workers
+    claim concurrently without waiting on each other or taking the same row.
+    """
+    if limit <= 0:
+        return []
+    rows = _execute(
+        """
+        UPDATE generation_jobs SET
+            status = 'running',
+            worker_id = %s,
+            attempts = attempts + 1,
+            leased_until = now() + make_interval(secs => %s),
+            heartbeat_at = now(),
+            updated_at = now()
+        WHERE id IN (
+            SELECT id FROM generation_jobs
+            WHERE (status = 'pending' AND run_after <= now())
+               OR (status = 'running' AND leased_until < now() AND attempts < max_attempts)
+            ORDER BY id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, attempts, max_attempts
+        """,
+        (worker_id, lease_seconds, limit),
+        fetch=True,
+    )
+    return [Job(*row) for row in rows]
+
+
+@traced("db")
+def heartbeat(worker_id: str, job_ids, lease_seconds: float = JOB_LEASE_SECONDS) -> int:
+    """Extends the lease of the worker's running jobs; returns how many it still holds."""
+    if not job_ids:
+        return 0
+    return _execute(
+        "UPDATE generation_jobs SET leased_until = now() + make_interval(secs => %s), heartbeat_at = now() "
+        "WHERE id = ANY(%s) AND worker_id = %s AND status = 'running'",
+        (lease_seconds, list(job_ids), worker_id),
+    )
+
+
+@traced("db")
+def complete_job(job_id: int, worker_id: str, result: str) -> bool:
+    """Marks the job done; False when the lease was lost to another worker."""
+    return _execute(
+        "UPDATE generation_jobs SET status = 'done', result = %s, leased_until = NULL, updated_at = now() "
+        "WHERE id = %s AND worker_id = %s AND status = 'running'",
+        (result, job_id, worker_id),
+    ) > 0
+
+
+@traced("db")
+def fail_job(job_id: int, worker_id: str, error: str, retry_delay: float = JOB_RETRY_DELAY) -> bool:
+    """Puts the job back in the queue with a delay, or fails it after max_attempts."""
+    return _execute(
+        """
+        UPDATE generation_jobs SET
+            status = CASE WHEN attempts < max_attempts THEN 'pending' ELSE 'failed' END,
+            run_after = now() + make_interval(secs => %s * attempts),
+            last_error = %s,
+            leased_until = NULL,
+            updated_at = now()
+        WHERE id = %s AND worker_id = %s AND status = 'running'
+        """,
+        (retry_delay, error, job_id, worker_id),
+    ) > 0
+
+
+@traced("db")
+def fail_expired_jobs() -> int:
+    """Fails running jobs whose lease expired on their last allowed attempt."""
+    return _execute(
+        "UPDATE generation_jobs SET status = 'failed', leased_until = NULL, updated_at = now(), "
+        "last_error = coalesce(last_error, 'lease expired') "
+        "WHERE status = 'running' AND leased_until < now() AND attempts >= max_attempts"
+    )
+
+
+def job_counts() -> dict:
+    rows = _execute("SELECT status, count(*) FROM generation_jobs GROUP BY status", fetch=True)
+    return {status: count for status, count in rows}
+
+
+def next_job_delay() -> Optional[float]:
+    """Seconds until the next pending job is due, None when nothing is pending."""
+    rows = _execute(
+        "SELECT extract(epoch FROM min(run_after) - now()) FROM generation_jobs WHERE status = 'pending'",
+        fetch=True,
+    )
+    return None if rows[0][0] is None else max(0.0, float(rows[0][0]))
@@ -0,0 +1,215 @@
+import os
+from collections import Counter, defaultdict
+
+from dotenv import load_dotenv
+from psycopg2.extras import execute_values
+
+from llm_utils.tracing import traced
+from supabase_utils.connection import get_db_connection
+
+load_dotenv()
+
+# Keep profile_stats up to date on every insert
+PROFILE_STATS_ENABLED = os.getenv("PROFILE_STATS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Buckets per field shown to the analysis agent
+PROFILE_STATS_TOP_K = int(os.getenv("PROFILE_STATS_TOP_K", "10"))
+
+TOTAL_FIELD = "_total"
+# Categorical fields counted as-is (normalized); age goes in decades and
+# languages_known counts every language of the array
+CATEGORY_FIELDS = ("gender", "location", "language", "occupation", "education")
+STATS_FIELDS = ("age",) + CATEGORY_FIELDS + ("languages_known",)
+
+STATS_DDL = """
+CREATE TABLE IF NOT EXISTS profile_stats (
+    field text NOT NULL,
+    bucket text NOT NULL,
+    count bigint NOT NULL DEFAULT 0,
+    PRIMARY KEY (field, bucket)
+)
+"""
+
+UPSERT_QUERY = (
+    "INSERT INTO profile_stats (field, bucket, count) VALUES %s "
+    "ON CONFLICT (field, bucket) DO UPDATE SET count = profile_stats.count + EXCLUDED.count"
+)
+
+# Same buckets as stats_deltas, computed from the whole agents table in one scan
+# (plus one over the unnested languages)
+_NORMALIZE_SQL = "nullif(lower(btrim(regexp_replace({0}::text, '\\s+', ' ', 'g'))), '')"
+REBUILD_QUERY = f"""
+INSERT INTO profile_stats (field, bucket, count)
+SELECT field, bucket, count(*) FROM (
+    SELECT v.field, v.bucket
+    FROM agents CROSS JOIN LATERAL (VALUES
+        ('{TOTAL_FIELD}', 'all'),
+        ('age', CASE WHEN age >= 0 THEN (age / 10 * 10)::text || '-' || (age / 10 * 10 + 9)::text END),
+        {", ".join(f"('{field}', {_NORMALIZE_SQL.format(field)})" for field in CATEGORY_FIELDS)}
+    ) AS v (field, bucket)
+    UNION ALL
+    SELECT 'languages_known', {_NORMALIZE_SQL.format("language_known")}
+    FROM agents, unnest(languages_known) AS language_known
+) AS buckets
+WHERE bucket IS NOT NULL
+GROUP BY field, bucket
+"""
+
+
+def normalize_bucket(value):
+    text = " ".join(str(value).split()).lower()
+    return text or None
+
+
+def age_bucket(age):
+    try:
+        age = int(age)
+    except (TypeError, ValueError):
+        return None
+    if age < 0:
+        return None
+    low = age // 10 * 10
+    return f"{low}-{low + 9}"
+
+
+def stats_deltas(profiles) -> Counter:
+    """(field, bucket) -> count added by these sanitized profiles."""
+    deltas = Counter()
+    for profile in profiles:
+        deltas[(TOTAL_FIELD, "all")] += 1
+        bucket = age_bucket(profile.get("age"))
+        if bucket:
+            deltas[("age", bucket)] += 1
+        for field in CATEGORY_FIELDS:
+            value = profile.get(field)
+            bucket = normalize_bucket(value) if value is not None else None
+            if bucket:
+                deltas[(field, bucket)] += 1
+        for language in profile.get("languages_known") or []:
+            bucket = normalize_bucket(language)
+            if bucket:
+                deltas[("languages_known", bucket)] += 1
+    return deltas
+
+
+_table_exists = None
+
+
+def _stats_table_exists(cursor) -> bool:
+    # Checked once per process; the table is created by `agora migrate` or `agora stats`
+    global _table_exists
+    if _table_exists is None:
+        cursor.execute("SELECT to_regclass('profile_stats')")
+        _table_exists = cursor.fetchone()[0] is not None
+        if not _table_exists:
+            print("---NO EXISTE profile_stats, NO SE REGISTRAN ESTADÍSTICAS (ejecuta `agora migrate`)---")
+    return _table_exists
+
+
+def record_profile_stats(cursor, profiles):
+    """Adds inserted profiles to profile_stats, inside the caller's transaction.
+
+    Rows are upserted in key order so concurrent inserts lock them in the
+    same order and cannot deadlock. Does nothing when the table is missing.
+    """
+    if not PROFILE_STATS_ENABLED or not profiles or not _stats_table_exists(cursor):
+        return
+    rows = sorted((field, bucket, count) for (field, bucket), count in stats_deltas(profiles).items())
+    execute_values(cursor, UPSERT_QUERY, rows, page_size=len(rows))
+
+
+def ensure_profile_stats_table():
+    """Creates profile_stats; fills it from agents when it was just created."""
+    connection = get_db_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT to_regclass('profile_stats')")
+            created = cursor.fetchone()[0] is None
+            cursor.execute(STATS_DDL)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+    if created and PROFILE_STATS_ENABLED:
+        print("---CREANDO TABLA profile_stats---")
+        rebuild_profile_stats()
+    global _table_exists
+    _table_exists = True
+
+
+@traced("db", "profile_stats_rebuild")
+def rebuild_profile_stats() -> int:
+    """Recomputes profile_stats from agents; returns the number of profiles counted.
+
+    Concurrent inserts wait on the table lock and add their rows afterwards,
+    so nothing is counted twice or lost.
+    """
+    connection = get_db_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(STATS_DDL)
+            cursor.execute("LOCK TABLE profile_stats IN EXCLUSIVE MODE")
+            cursor.execute("DELETE FROM profile_stats")
+            cursor.execute(REBUILD_QUERY)
+            cursor.execute("SELECT count FROM profile_stats WHERE field = %s", (TOTAL_FIELD,))
+            row = cursor.fetchone()
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+    return row[0] if row else 0
+
+
+@traced("db")
+def read_profile_stats(top_k: int = PROFILE_STATS_TOP_K):
+    """Top `top_k` buckets of every field as (field, bucket, count, distinct buckets) rows."""
+    connection = get_db_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT field, bucket, count, buckets FROM ("
+                "  SELECT field, bucket, count,"
+                "         row_number() OVER (PARTITION BY field ORDER BY count DESC, bucket) AS rank,"
+                "         count(*) OVER (PARTITION BY field) AS buckets"
+                "  FROM profile_stats WHERE count > 0"
+                ") AS ranked WHERE rank <= %s ORDER BY field, rank",
+                (top_k,),
+            )
+            return cursor.fetchall()
+    finally:
+        connection.close()
+
+
+def render_profile_stats(rows) -> str:
+    """Compact text of the pre-aggregated statistics for the analysis prompt."""
+    fields = defaultdict(list)
+    distinct = {}
+    total = 0
+    for field, bucket, count, buckets in rows:
+        if field == TOTAL_FIELD:
+            total = count
+            continue
+        fields[field].append((bucket, count))
+        distinct[field] = buckets
+    if not total:
+        return ""
+    lines = [f"Total profiles: {total}"]
+    for field in STATS_FIELDS:
+        if not fields[field]:
+            continue
+        items = ", ".join(f"{bucket} {count} ({count / total:.0%})" for bucket, count in fields[field])
+        order = " by decade" if field == "age" else ""
+        lines.append(f"- {field}{order} ({distinct[field]} distinct): {items}")
+    return "\n".join(lines)
+
+
+def profile_stats_summary() -> str:
+    """Rendered statistics, or "" when the table is missing or empty."""
+    try:
+        return render_profile_stats(read_profile_stats())
+    except Exception as e:
+        print(f"No se pudieron leer las estadísticas de perfiles ({e}), el análisis consultará agents")
+        return ""
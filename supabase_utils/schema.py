@@ -0,0 +1,45 @@
+import functools
+from typing import NamedTuple, Optional
+
+from supabase_utils.connection import get_db_connection
+
+
+class Column(NamedTuple):
+    name: str
+    data_type: str
+    udt_name: str
+    nullable: bool
+    has_default: bool
+    max_length: Optional[int]
+
+
+def load_columns(table: str, connection_factory=get_db_connection):
+    """Reads the column metadata of `table` from information_schema."""
+    connection = connection_factory()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT column_name, data_type, udt_name, is_nullable = 'YES', "
+                "column_default IS NOT NULL OR is_identity = 'YES' OR is_generated = 'ALWAYS', "
+                "character_maximum_length "
+                "FROM information_schema.columns "
+                "WHERE table_name = %s AND table_schema = current_schema() "
+                "ORDER BY ordinal_position",
+                (table,),
+            )
+            return {row[0]: Column(*row) for row in cursor.fetchall()}
+    finally:
+        connection.close()
+
+
+@functools.lru_cache(maxsize=None)
+def get_agents_columns():
+    """Cached column metadata of agents; call refresh_agents_columns after a migration."""
+    columns = load_columns("agents")
+    if not columns:
+        raise RuntimeError("table agents not found in information_schema")
+    return columns
+
+
+def refresh_agents_columns():
+    get_agents_columns.cache_clear()
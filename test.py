@@ -1,25 +1,36 @@
-from langchain_openai import ChatOpenAI
-from langgraph.prebuilt import create_react_agent
-from langgraph_supervisor import create_supervisor
-import json
+from langchain_core.messages import AIMessage, HumanMessage
+from dotenv import load_dotenv
+import functools
 import os
-from langgraph.checkpoint.memory import MemorySaver
 
-memory = MemorySaver() 
+from llm_utils.clients import get_chat_model
+from reservation_utils.checkpoint import SqliteCheckpointSaver
+from reservation_utils.memory import ConversationMemory, RESERVATION_MEMORY_POLICY, llm_summarizer
+from reservation_utils.router import IntentRouter
+from reservation_utils.store import get_reservation_store
 
-thread_config = {"configurable": {"thread_id": "reserva-thread"}}
+load_dotenv()
 
-def cargar_reservas():
-    if not os.path.exists(DATA_FILE):
-        return []
-    with open(DATA_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+# Clear requests ("cancela la reserva de Ana") skip the supervisor and its agents
+RESERVATION_FAST_PATH = os.getenv("RESERVATION_FAST_PATH", "true").lower() in ("1", "true", "yes")
+
+thread_config = {"configurable": {"thread_id": os.getenv("RESERVATION_THREAD_ID", "reserva-thread")}}
 
-def guardar_reservas(reservas):
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(reservas, f, indent=2, ensure_ascii=False)
+@functools.lru_cache(maxsize=None)
+def get_checkpointer():
+    """SQLite checkpointer, opened on first use; the conversation survives restarts."""
+    return SqliteCheckpointSaver(os.getenv("RESERVATION_MEMORY_PATH", "reservas_memoria.db"))
+
+@functools.lru_cache(maxsize=None)
+def get_conversation_memory():
+    """ConversationMemory that keeps the supervisor thread bounded."""
+    return ConversationMemory(
+        summarize=llm_summarizer(get_chat_model("gpt-4o", temperature=0))
+        if RESERVATION_MEMORY_POLICY == "summary" else None
+    )
 
-DATA_FILE = "reservas.json"
+def cargar_reservas():
+    return get_reservation_store().all()
 
 # ----------------------------
 # Herramientas de reserva
@@ -27,92 +38,79 @@ DATA_FILE = "reservas.json"
 
 def add_reservation(nombre: str, fecha: str):
     """Agrega una reserva con el nombre de la persona y la fecha proporcionada."""
-    reservas = cargar_reservas()
-    reservas.append({"nombre": nombre, "fecha": fecha})
-    guardar_reservas(reservas)
+    get_reservation_store().add(nombre, fecha)
     return f"✅ Reserva agregada para {nombre} el {fecha}."
 
 def edit_reservation(nombre: str, nueva_fecha: str):
     """Edita una reserva existente, cambiando la fecha de la reserva para el nombre dado."""
-    reservas = cargar_reservas()
-    for r in reservas:
-        if r["nombre"].lower() == nombre.lower():
-            r["fecha"] = nueva_fecha
-            guardar_reservas(reservas)
-            return f"✏️ Reserva para {nombre} actualizada a {nueva_fecha}."
+    if get_reservation_store().edit(nombre, nueva_fecha):
+        return f"✏️ Reserva para {nombre} actualizada a {nueva_fecha}."
     return f"❌ No se encontró una reserva a nombre de {nombre}."
 
 def delete_reservation(nombre: str):
     """Elimina una reserva existente por nombre."""
-    reservas = cargar_reservas()
-    nuevas = [r for r in reservas if r["nombre"].lower() != nombre.lower()]
-    if len(nuevas) == len(reservas):
+    if not get_reservation_store().delete(nombre):
         return f"❌ No se encontró ninguna reserva para {nombre}."
-    guardar_reservas(nuevas)
     return f"🗑️ Reserva para {nombre} eliminada."
 
 
 # ----------------------------
-# Agentes individuales
+# Agentes y supervisor
 # ----------------------------
 
-add_agent = create_react_agent(
-    name="add_agent",
-    model=ChatOpenAI(model="gpt-4o"),
-    prompt=(
-        "Eres un asistente que maneja solicitudes para AGREGAR reservas. "
-        "Cuando tengas toda la información, llama a la herramienta 'add_reservation' directamente con el texto que te proporcionó el usuario."
-    ),
-    tools=[add_reservation],
-)
-
-edit_agent = create_react_agent(
-    name="edit_agent",
-    model=ChatOpenAI(model="gpt-4o"),
-    prompt=(
-        "Eres un asistente que maneja solicitudes para EDITAR reservas. "
-        "Cuando tengas los datos necesarios, llama a la herramienta 'edit_reservation' directamente con el texto del usuario."
-    ),
-    tools=[edit_reservation],
-)
-
-delete_agent = create_react_agent(
-    name="delete_agent",
-    model=ChatOpenAI(model="gpt-4o"),
-    prompt=(
-        "Eres un asistente que maneja solicitudes para ELIMINAR reservas. "
-        "Cuando tengas los datos necesarios, llama a la herramienta 'delete_reservation' directamente con el texto del usuario."
-    ),
-    tools=[delete_reservation],
-)
+@functools.lru_cache(maxsize=None)
+def get_supervisor():
+    """Compiled supervisor graph with its three agents, built on first use."""
+    from langgraph.prebuilt import create_react_agent
+    from langgraph_supervisor import create_supervisor
+
+    add_agent = create_react_agent(
+        name="add_agent",
+        model=get_chat_model("gpt-4o", temperature=None),
+        prompt=(
+            "Eres un asistente que maneja solicitudes para AGREGAR reservas. "
+            "Cuando tengas toda la información, llama a la herramienta 'add_reservation' directamente con el texto que te proporcionó el usuario."
+        ),
+        tools=[add_reservation],
+    )
 
-# ----------------------------
-# Supervisor
-# ----------------------------
+    edit_agent = create_react_agent(
+        name="edit_agent",
+        model=get_chat_model("gpt-4o", temperature=None),
+        prompt=(
+            "Eres un asistente que maneja solicitudes para EDITAR reservas. "
+            "Cuando tengas los datos necesarios, llama a la herramienta 'edit_reservation' directamente con el texto del usuario."
+        ),
+        tools=[edit_reservation],
+    )
 
-supervisor = create_supervisor(
-    agents=[add_agent, edit_agent, delete_agent],
-    model=ChatOpenAI(model="gpt-4o"),
-    prompt=(
-        "Eres el supervisor de un sistema de reservas. "
-        "Tienes tres asistentes: uno para agregar, uno para editar y otro para eliminar reservas. "
-        "Tu trabajo es decidir a cuál de ellos asignarle la solicitud del usuario. "
-        "Pásales la solicitud tal cual para que la procesen usando sus herramientas."
+    delete_agent = create_react_agent(
+        name="delete_agent",
+        model=get_chat_model("gpt-4o", temperature=None),
+        prompt=(
+            "Eres un asistente que maneja solicitudes para ELIMINAR reservas. "
+            "Cuando tengas los datos necesarios, llama a la herramienta 'delete_reservation' directamente con el texto del usuario."
+        ),
+        tools=[delete_reservation],
     )
-).compile(checkpointer=memory)
+
+    return create_supervisor(
+        agents=[add_agent, edit_agent, delete_agent],
+        model=get_chat_model("gpt-4o", temperature=None),
+        prompt=(
+            "Eres el supervisor de un sistema de reservas. "
+            "Tienes tres asistentes: uno para agregar, uno para editar y otro para eliminar reservas. "
+            "Tu trabajo es decidir a cuál de ellos asignarle la solicitud del usuario. "
+            "Pásales la solicitud tal cual para que la procesen usando sus herramientas."
+        )
+    ).compile(checkpointer=get_checkpointer())
 
 # ----------------------------
 # Interacción
 # ----------------------------
 
-print("\n🎯 Sistema de reservas listo. Escribe tu solicitud:\n")
-
-while True:
-    user_input = input("Tú: ")
-    if user_input.lower() in ["salir", "exit"]:
-        break
-
-    result = supervisor.invoke({
+def ask_supervisor(user_input: str):
+    result = get_supervisor().invoke({
         "messages": [{"role": "user", "content": user_input}]
     },
     
@@ -122,4 +120,42 @@ while True:
         for msg in result["messages"]:
             role = getattr(msg, "role", type(msg).__name__)
             content = getattr(msg, "content", str(msg))
-            print(f"🧠 [{role}] {content}")
\ No newline at end of file
+            print(f"🧠 [{role}] {content}")
+
+def remember_fast_path(user_input: str, result: str):
+    # Keep the supervisor's thread complete for follow-up requests that do reach it
+    get_supervisor().update_state(
+        thread_config,
+        {"messages": [HumanMessage(content=user_input), AIMessage(content=result)]},
+        as_node="supervisor",
+    )
+
+@functools.lru_cache(maxsize=None)
+def get_router():
+    """Fast path for clear requests, falling back to the supervisor."""
+    return IntentRouter(
+        tools={"add": add_reservation, "edit": edit_reservation, "delete": delete_reservation},
+        fallback=ask_supervisor,
+        on_hit=remember_fast_path,
+    )
+
+if __name__ == "__main__":
+    print("\n🎯 Sistema de reservas listo. Escribe tu solicitud:\n")
+
+    while True:
+        user_input = input("Tú: ")
+        if user_input.lower() in ["salir", "exit"]:
+            break
+
+        if RESERVATION_FAST_PATH:
+            result = get_router().handle(user_input)
+            if result is not None:
+                print(f"⚡ {result}")
+        else:
+            ask_supervisor(user_input)
+        memory = get_conversation_memory().compact(get_supervisor(), thread_config, as_node="supervisor")
+        print(f"---MEMORIA: {memory['messages']} mensajes, ~{memory['tokens']} tokens, "
+              f"{memory['dropped']} descartados---")
+
+    if RESERVATION_FAST_PATH:
+        print(get_router().stats.summary())
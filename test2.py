@@ -1,111 +1,307 @@
-from langchain_openai import ChatOpenAI
 from dotenv import load_dotenv
+import functools
 import os
-from typing import TypedDict
+import asyncio
+from typing import Optional, Tuple, TypedDict
 from langgraph.graph import StateGraph, END
 from langgraph.prebuilt import create_react_agent
-from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
-import json
 
-from supabase_utils.connection import get_db_connection
-from supabase_utils.db_pool import db as langchain_db
-from prompts.prompt_agent import create_profile_prompt, AGENT_CHECK_DB
+from supabase_utils.agents_table import insert_profile, DuplicateProfileError
+from supabase_utils.db_pool import get_db
+from supabase_utils.profile_stats import profile_stats_summary
+from prompts.prompt_agent import build_create_profile_messages, build_analysis_prompt, CREATE_PROFILES_USER_PROMPT
+from llm_utils.cache import print_cache_summary
+from llm_utils.clients import get_chat_model
+from llm_utils.tracing import get_callbacks, print_summary
+from profile_utils.instructions_cache import instructions_cache
+from profile_utils.multi_profile import profile_pool, print_pool_summary
+from profile_utils.validation import parse_profile, ProfileValidationError
+from profile_utils.messages import (
+    DUPLICATE_PROFILE_MESSAGE, INVALID_PROFILE_MESSAGE, MAX_PROFILE_ATTEMPTS, PARSE_ERROR_MESSAGE,
+    PROFILE_INSERTED_MESSAGE, SIMILAR_PROFILE_MESSAGE, is_rejected,
+)
+from profile_utils.novelty import check_novelty, record_novelty
+from profile_utils.streaming import stream_profile, astream_profile
+from profile_utils.structured import (
+    PROFILE_STRUCTURED_OUTPUT, agenerate_structured, generate_structured, print_parse_summary,
+)
 
 load_dotenv()
 
+# Stream create_profile output and cancel it as soon as it breaks the schema
+PROFILE_STREAMING = os.getenv("PROFILE_STREAMING", "false").lower() in ("1", "true", "yes")
+
 # Using a more recent and standard model
-llm = ChatOpenAI(
-    model="gpt-4.1",
-    openai_api_key=os.environ.get("OPENAI_API_KEY"),
-    temperature=0
-)
+LLM_MODEL = "gpt-4.1"
+
+def get_llm():
+    """Shared ChatOpenAI client, created on first use."""
+    return get_chat_model(LLM_MODEL, temperature=0)
+
+def get_analysis_llm():
+    """Client for the AGENT_CHECK_DB agent; its turns repeat across runs, so LLM_CACHE applies.
+
+    Profile generation keeps get_llm(): a replayed profile is always a duplicate.
+    """
+    return get_chat_model(LLM_MODEL, temperature=0, cache=True)
 
 # 1. State Definition
 class AgentState(TypedDict):
     instructions: str
     profile: str
     final_message: str
+    attempts: int
+    # Validated profile from profile_pool, so the insert does not parse it again
+    profile_data: Optional[dict]
 
 # 2. Tools
+
+def analyze_db():
+    """Runs the SQL ReAct agent over the agents table, starting from the profile_stats summary."""
+    agent_executor = create_react_agent(get_analysis_llm(), [get_db().run])
+    initial_input = build_analysis_prompt(profile_stats_summary())
+    response = agent_executor.invoke({"messages": [("user", initial_input)]})
+    return response['messages'][-1].content
+
+async def aanalyze_db():
+    agent_executor = create_react_agent(get_analysis_llm(), [get_db().run])
+    initial_input = build_analysis_prompt(await asyncio.to_thread(profile_stats_summary))
+    response = await agent_executor.ainvoke({"messages": [("user", initial_input)]})
+    return response['messages'][-1].content
+
 @tool
 def get_instructions_from_db():
     """Gets instructions from the database on how to create a distinctive profile."""
     print("---OBTENIENDO INSTRUCCIONES DE LA DB---")
-    agent_executor = create_react_agent(llm, [langchain_db.run])
-    initial_input = AGENT_CHECK_DB
-    response = agent_executor.invoke({"messages": [("user", initial_input)]})
-    instructions = response['messages'][-1].content
+    instructions = instructions_cache.get(analyze_db)
+    print(f"Instrucciones generadas (primeros 100 chars): {instructions[:100]}...")
+    return instructions
+
+async def aget_instructions_from_db():
+    """Async version of get_instructions_from_db for concurrent batches."""
+    print("---OBTENIENDO INSTRUCCIONES DE LA DB---")
+    instructions = await instructions_cache.aget(aanalyze_db)
     print(f"Instrucciones generadas (primeros 100 chars): {instructions[:100]}...")
     return instructions
 
+def build_profile_messages(instructions: str, feedback: str = ""):
+    """Builds the chat messages sent to the LLM to create a profile."""
+    return build_create_profile_messages(instructions, model=LLM_MODEL, feedback=feedback)
+
 @tool
-def create_profile(instructions: str) -> str:
+def create_profile(instructions: str, feedback: str = "") -> str:
     """Crea un perfil de usuario en formato JSON según las instrucciones"""
     print("---CREANDO PERFIL---")
-    user_prompt = (
-        "Create the profile as a single JSON object based on the provided schema. "
-        "The JSON keys MUST be in snake_case. "
-        "Only output the JSON object itself, with no additional text or markdown. "
-        "Following the next instructions: " + instructions
-    )
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", create_profile_prompt),
-        ("user", user_prompt)
-    ])
-    response = llm.invoke(prompt.format_messages(last_instruction=instructions))
-    profile_json = response.content
+    messages = build_profile_messages(instructions, feedback)
+    if PROFILE_STRUCTURED_OUTPUT:
+        profile_json, error = generate_structured(get_llm(), messages)
+        if error:
+            return f"{INVALID_PROFILE_MESSAGE}: {error}"
+    elif PROFILE_STREAMING:
+        streamed = stream_profile(get_llm(), messages)
+        if streamed["error"]:
+            return f"{INVALID_PROFILE_MESSAGE}: {streamed['error']}"
+        profile_json = streamed["profile"]
+    else:
+        profile_json = get_llm().invoke(messages).content
+    print(f"Generated profile: {profile_json}")
+    return profile_json
+
+async def acreate_profile(instructions: str, feedback: str = "") -> str:
+    """Async version of create_profile for concurrent batches."""
+    print("---CREANDO PERFIL---")
+    messages = build_profile_messages(instructions, feedback)
+    if PROFILE_STRUCTURED_OUTPUT:
+        profile_json, error = await agenerate_structured(get_llm(), messages)
+        if error:
+            return f"{INVALID_PROFILE_MESSAGE}: {error}"
+    elif PROFILE_STREAMING:
+        streamed = await astream_profile(get_llm(), messages)
+        if streamed["error"]:
+            return f"{INVALID_PROFILE_MESSAGE}: {streamed['error']}"
+        profile_json = streamed["profile"]
+    else:
+        profile_json = (await get_llm().ainvoke(messages)).content
     print(f"Generated profile: {profile_json}")
     return profile_json
 
+def build_profiles_messages(instructions: str, count: int):
+    """Same prefix as build_profile_messages, asking for `count` profiles as a JSON array."""
+    return build_create_profile_messages(
+        instructions, model=LLM_MODEL, user_prompt=CREATE_PROFILES_USER_PROMPT.format(count=count)
+    )
+
+def generate_profiles_json(instructions: str, count: int) -> str:
+    messages = build_profiles_messages(instructions, count)
+    if PROFILE_STRUCTURED_OUTPUT:
+        profiles_json, error = generate_structured(get_llm(), messages, many=True)
+        if error:
+            raise ValueError(error)
+        return profiles_json
+    return get_llm().invoke(messages).content
+
+async def agenerate_profiles_json(instructions: str, count: int) -> str:
+    messages = build_profiles_messages(instructions, count)
+    if PROFILE_STRUCTURED_OUTPUT:
+        profiles_json, error = await agenerate_structured(get_llm(), messages, many=True)
+        if error:
+            raise ValueError(error)
+        return profiles_json
+    return (await get_llm().ainvoke(messages)).content
+
+def pooled_profile(profile, error) -> Tuple[str, Optional[dict]]:
+    """(profile JSON, validated data) from the pool, or the error message and None."""
+    if error is not None:
+        return f"{INVALID_PROFILE_MESSAGE}: {error}", None
+    profile_json, data = profile
+    print(f"Generated profile: {profile_json}")
+    return profile_json, data
+
+def create_pooled_profile(instructions: str) -> Tuple[str, Optional[dict]]:
+    """create_profile when PROFILES_PER_CALL > 1: one LLM call fills profile_pool for several runs."""
+    print("---CREANDO PERFIL (LOTE)---")
+    return pooled_profile(*profile_pool.get(instructions, generate_profiles_json))
+
+async def acreate_pooled_profile(instructions: str) -> Tuple[str, Optional[dict]]:
+    print("---CREANDO PERFIL (LOTE)---")
+    return pooled_profile(*await profile_pool.aget(instructions, agenerate_profiles_json))
+
 @tool
 def add_profile_db(profile: str):
     """Inserta el perfil en la base de datos usando psycopg2."""
     print("---AÑADIENDO PERFIL A LA DB CON PSYCOPG2---")
     try:
-        profile_data = json.loads(profile)
+        sanitized_data = parse_profile(profile)
+    except ProfileValidationError as e:
+        error_message = f"{INVALID_PROFILE_MESSAGE}: {e}"
+        print(error_message)
+        return error_message
     except Exception as e:
-        error_message = f"Error al parsear el perfil JSON: {e}. Perfil recibido: {profile}"
+        error_message = f"{PARSE_ERROR_MESSAGE}: {e}. Perfil recibido: {profile}"
         print(error_message)
         return error_message
+    return store_profile(sanitized_data)
 
-    # Sanitize keys from the dictionary to be valid column names
-    # e.g. "Languages Known" -> "languages_known"
-    sanitized_data = {k.lower().replace(" ", "_"): v for k, v in profile_data.items()}
+def store_profile(sanitized_data: dict) -> str:
+    """Novelty check and insert of an already validated profile."""
+    rejection = check_novelty(sanitized_data)
+    if rejection:
+        print(rejection)
+        return rejection
 
-    connection = None
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-
-        keys = ', '.join(sanitized_data.keys())
-        placeholders = ', '.join(['%s'] * len(sanitized_data))
-        values = tuple(sanitized_data.values())
-
-        insert_query = f"INSERT INTO agents ({keys}) VALUES ({placeholders})"
-        
-        print(f"Executing query: {insert_query}")
-        print(f"With values: {values}")
-
-        cursor.execute(insert_query, values)
-        connection.commit()
-        
-        message = "Perfil insertado correctamente en la base de datos."
+        print(f"Inserting columns: {', '.join(sanitized_data.keys())}")
+        agent_id = insert_profile(sanitized_data)
+        instructions_cache.record_insert()
+        record_novelty(sanitized_data, agent_id)
+
+        message = PROFILE_INSERTED_MESSAGE
         print(message)
         return message
 
+    except DuplicateProfileError:
+        error_message = (
+            f"{DUPLICATE_PROFILE_MESSAGE}: ya existe un perfil con el mismo nombre, "
+            "fecha de nacimiento y ubicación."
+        )
+        print(error_message)
+        return error_message
+    except Exception as e:
+        error_message = f"ERROR EN BASE DE DATOS: {e}"
+        print(error_message)
+        return error_message
+
+async def aadd_profile_bulk(bulk_writer, profile: str, sanitized_data: Optional[dict] = None) -> str:
+    """Queues the profile on a BulkProfileWriter and waits for its batch to commit.
+
+    `sanitized_data` skips parsing when the profile was already validated.
+    """
+    print("---AÑADIENDO PERFIL AL LOTE DE INSERCIÓN---")
+    if sanitized_data is None:
+        try:
+            sanitized_data = await asyncio.to_thread(parse_profile, profile)
+        except ProfileValidationError as e:
+            error_message = f"{INVALID_PROFILE_MESSAGE}: {e}"
+            print(error_message)
+            return error_message
+        except Exception as e:
+            error_message = f"{PARSE_ERROR_MESSAGE}: {e}. Perfil recibido: {profile}"
+            print(error_message)
+            return error_message
+
+    rejection = await asyncio.to_thread(check_novelty, sanitized_data)
+    if rejection:
+        print(rejection)
+        return rejection
+
+    try:
+        agent_id = await asyncio.wrap_future(bulk_writer.add(sanitized_data))
+        instructions_cache.record_insert()
+        record_novelty(sanitized_data, agent_id)
+        return PROFILE_INSERTED_MESSAGE
+    except DuplicateProfileError:
+        error_message = (
+            f"{DUPLICATE_PROFILE_MESSAGE}: ya existe un perfil con el mismo nombre, "
+            "fecha de nacimiento y ubicación."
+        )
+        print(error_message)
+        return error_message
     except Exception as e:
         error_message = f"ERROR EN BASE DE DATOS: {e}"
         print(error_message)
-        if connection:
-            connection.rollback()
         return error_message
-    finally:
-        if connection:
-            cursor.close()
-            connection.close()
 
 # 3. Graph Nodes (calling tools directly)
+def profile_feedback(state: AgentState) -> str:
+    """Why the last profile was rejected, for the next attempt; "" on the first one.
+
+    Sent apart from the instructions so trimming them never drops it.
+    """
+    final_message = state.get('final_message', '')
+    if not state.get('attempts', 0):
+        return ""
+    if final_message.startswith(DUPLICATE_PROFILE_MESSAGE):
+        return (
+            "The previous profile was rejected because a profile with the same name, "
+            "date of birth and location already exists. Create a different person."
+        )
+    if final_message.startswith(SIMILAR_PROFILE_MESSAGE):
+        return (
+            f"The previous profile was rejected: {final_message} "
+            "Write a clearly different biography and personality."
+        )
+    if final_message.startswith((INVALID_PROFILE_MESSAGE, PARSE_ERROR_MESSAGE)):
+        return (
+            f"The previous output was discarded: {final_message}. "
+            "Output only the JSON object with exactly the required snake_case fields."
+        )
+    return ""
+
+def generated_profile_update(state: AgentState, profile_json: str, profile_data: Optional[dict] = None):
+    """State update after create_profile; an aborted generation leaves the profile empty."""
+    attempts = state.get('attempts', 0) + 1
+    if profile_json.startswith(INVALID_PROFILE_MESSAGE):
+        print(profile_json)
+        return {"profile": "", "profile_data": None, "final_message": profile_json, "attempts": attempts}
+    return {"profile": profile_json, "profile_data": profile_data, "attempts": attempts}
+
+def route_after_create(state: AgentState):
+    """Skips the insert when the generation was aborted, retrying while attempts remain."""
+    if state['profile']:
+        return "add_profile_to_db"
+    if state.get('attempts', 0) < MAX_PROFILE_ATTEMPTS:
+        return "create_profile"
+    return END
+
+def route_after_insert(state: AgentState):
+    """Regenerates the profile when it was rejected, up to MAX_PROFILE_ATTEMPTS."""
+    if is_rejected(state.get('final_message', '')) and state.get('attempts', 0) < MAX_PROFILE_ATTEMPTS:
+        print("---PERFIL RECHAZADO, REGENERANDO---")
+        return "create_profile"
+    return END
+
 def get_instructions_node(state: AgentState):
     print("---NODO: OBTENER INSTRUCCIONES---")
     instructions = get_instructions_from_db.invoke({})
@@ -113,46 +309,111 @@ def get_instructions_node(state: AgentState):
 
 def create_profile_node(state: AgentState):
     print("---NODO: CREAR PERFIL---")
-    profile_json = create_profile.invoke({"instructions": state['instructions']})
-    return {"profile": profile_json}
+    feedback = profile_feedback(state)
+    # A retry that carries feedback needs its own call; the pool cannot honor it
+    if profile_pool.per_call > 1 and not feedback:
+        return generated_profile_update(state, *create_pooled_profile(state['instructions']))
+    profile_json = create_profile.invoke({"instructions": state['instructions'], "feedback": feedback})
+    return generated_profile_update(state, profile_json)
 
 def add_profile_db_node(state: AgentState):
     print("---NODO: AÑADIR PERFIL A DB---")
+    if state.get('profile_data'):
+        print("---AÑADIENDO PERFIL A LA DB CON PSYCOPG2---")
+        return {"final_message": store_profile(state['profile_data'])}
     final_message = add_profile_db.invoke({"profile": state['profile']})
     return {"final_message": final_message}
 
+async def aget_instructions_node(state: AgentState):
+    print("---NODO: OBTENER INSTRUCCIONES---")
+    instructions = await aget_instructions_from_db()
+    return {"instructions": instructions}
+
+async def acreate_profile_node(state: AgentState):
+    print("---NODO: CREAR PERFIL---")
+    feedback = profile_feedback(state)
+    if profile_pool.per_call > 1 and not feedback:
+        return generated_profile_update(state, *await acreate_pooled_profile(state['instructions']))
+    profile_json = await acreate_profile(state['instructions'], feedback)
+    return generated_profile_update(state, profile_json)
+
+async def aadd_profile_db_node(state: AgentState, config: RunnableConfig):
+    print("---NODO: AÑADIR PERFIL A DB---")
+    bulk_writer = config.get("configurable", {}).get("bulk_writer")
+    if bulk_writer is not None:
+        final_message = await aadd_profile_bulk(bulk_writer, state['profile'], state.get('profile_data'))
+    elif state.get('profile_data'):
+        print("---AÑADIENDO PERFIL A LA DB CON PSYCOPG2---")
+        final_message = await asyncio.to_thread(store_profile, state['profile_data'])
+    else:
+        # psycopg2 is blocking, keep it off the event loop
+        final_message = await asyncio.to_thread(add_profile_db.invoke, {"profile": state['profile']})
+    return {"final_message": final_message}
+
 # 4. Graph Definition
-workflow = StateGraph(AgentState)
+def build_workflow(use_async: bool = False):
+    """Builds the get_instructions -> create_profile -> add_profile_to_db graph.
+
+    Aborted generations and duplicate or too similar profiles loop back to
+    create_profile.
+    """
+    workflow = StateGraph(AgentState)
+
+    if use_async:
+        workflow.add_node("get_instructions", aget_instructions_node)
+        workflow.add_node("create_profile", acreate_profile_node)
+        workflow.add_node("add_profile_to_db", aadd_profile_db_node)
+    else:
+        workflow.add_node("get_instructions", get_instructions_node)
+        workflow.add_node("create_profile", create_profile_node)
+        workflow.add_node("add_profile_to_db", add_profile_db_node)
 
-workflow.add_node("get_instructions", get_instructions_node)
-workflow.add_node("create_profile", create_profile_node)
-workflow.add_node("add_profile_to_db", add_profile_db_node)
+    workflow.set_entry_point("get_instructions")
+    workflow.add_edge("get_instructions", "create_profile")
+    workflow.add_conditional_edges("create_profile", route_after_create, ["add_profile_to_db", "create_profile", END])
+    workflow.add_conditional_edges("add_profile_to_db", route_after_insert, ["create_profile", END])
+    return workflow.compile()
 
-workflow.set_entry_point("get_instructions")
-workflow.add_edge("get_instructions", "create_profile")
-workflow.add_edge("create_profile", "add_profile_to_db")
-workflow.add_edge("add_profile_to_db", END)
+@functools.lru_cache(maxsize=None)
+def get_app(use_async: bool = False):
+    """Compiled graph, built on first use."""
+    return build_workflow(use_async=use_async)
 
-app = workflow.compile()
+def __getattr__(name):
+    # Backwards compatible `from test2 import app, async_app, llm`
+    if name == "app":
+        return get_app()
+    if name == "async_app":
+        return get_app(use_async=True)
+    if name == "llm":
+        return get_llm()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # 5. Execution
 initial_state = {
     "instructions": "",
     "profile": "",
-    "final_message": ""
+    "final_message": "",
+    "attempts": 0,
+    "profile_data": None
 }
 
-print("Iniciando el flujo de trabajo...")
-for step in app.stream(initial_state, {"recursion_limit": 10}):
-    if not step:
-        continue
-    node_name = list(step.keys())[0]
-    state = list(step.values())[0]
-    print(f"\n=== Salida del Nodo: {node_name} ===")
-    if node_name == "get_instructions":
-        print(f"   - instructions: {state.get('instructions', '')[:200]}...")
-    elif node_name == "create_profile":
-        print(f"   - profile: {state.get('profile', '')}")
-    elif node_name == "add_profile_to_db":
-        print(f"   - final_message: {state.get('final_message', '')}")
-print("\nFlujo de trabajo finalizado.")
\ No newline at end of file
+if __name__ == "__main__":
+    print("Iniciando el flujo de trabajo...")
+    for step in get_app().stream(initial_state, {"recursion_limit": 10, "callbacks": get_callbacks()}):
+        if not step:
+            continue
+        node_name = list(step.keys())[0]
+        state = list(step.values())[0]
+        print(f"\n=== Salida del Nodo: {node_name} ===")
+        if node_name == "get_instructions":
+            print(f"   - instructions: {state.get('instructions', '')[:200]}...")
+        elif node_name == "create_profile":
+            print(f"   - profile: {state.get('profile', '')}")
+        elif node_name == "add_profile_to_db":
+            print(f"   - final_message: {state.get('final_message', '')}")
+    print("\nFlujo de trabajo finalizado.")
+    print_summary()
+    print_cache_summary()
+    print_pool_summary()
+    print_parse_summary()